@@ -0,0 +1,180 @@
+# Texture atlas + lazy asset loading for the frontend
+#
+# The art under sprites/ is mostly 300dpi scans, far bigger than anything we
+# draw. Decoding and shrinking it on every start is what made startup slow, so
+# each group of assets is downsampled to its display size once, packed into a
+# single atlas png and cached under sprites/.cache/ together with a json index.
+# The index records the source files' sizes and mtimes and the target sizes,
+# so editing an image or changing a display size rebuilds that atlas.
+#
+#   python assets.py          rebuild every atlas ahead of time
+#   python assets.py --bench  time cold atlas builds against warm loads
+#
+# An asset spec is {name: (path, (width, height), fit)}, fit is "contain"
+# (keep the aspect ratio, fit inside the box) or "cover" (fill the box, crop
+# the overflow, used for backgrounds).
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+from PIL import Image, ImageOps
+
+BASE_DIR  = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, "sprites", ".cache")
+
+ATLAS_VERSION   = 1      # bump when the packing or file format changes
+ATLAS_MAX_WIDTH = 2048
+ATLAS_PADDING   = 2      # transparent pixels between images, stops filtering bleed
+
+
+def _signature(specs):
+    # anything that should invalidate the cached atlas goes in here
+    h = hashlib.sha1(str(ATLAS_VERSION).encode())
+    for name in sorted(specs):
+        path, size, fit = specs[name]
+        try:
+            st = os.stat(path)
+            stamp = (st.st_size, int(st.st_mtime))
+        except OSError:
+            stamp = None
+        h.update(repr((name, os.path.relpath(path, BASE_DIR), tuple(size), fit, stamp)).encode())
+    return h.hexdigest()
+
+
+def downsample(path, size, fit="contain"):
+    """Decode an image and shrink it to its display size (never scales up)."""
+    image = Image.open(path)
+    image.draft("RGB", size) # jpegs can decode straight at a reduced scale
+    image = image.convert("RGBA")
+    width, height = size
+    if fit == "cover":
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    image.thumbnail((width, height), Image.LANCZOS)
+    return image
+
+
+def pack(images, max_width=ATLAS_MAX_WIDTH, padding=ATLAS_PADDING):
+    """
+    Shelf packing: tallest images first, left to right in rows no wider than
+    max_width. Returns (atlas image, {name: (x, y, w, h)}).
+    """
+    order = sorted(images, key=lambda name: -images[name].height)
+    regions = {}
+    x = y = shelf = width = 0
+    for name in order:
+        w, h = images[name].size
+        if x and x + w > max_width:
+            x, y, shelf = 0, y + shelf + padding, 0
+        regions[name] = (x, y, w, h)
+        x += w + padding
+        shelf = max(shelf, h)
+        width = max(width, x)
+    atlas = Image.new("RGBA", (max(width, 1), max(y + shelf, 1)), (0, 0, 0, 0))
+    for name, (x, y, w, h) in regions.items():
+        atlas.paste(images[name], (x, y))
+    return atlas, regions
+
+
+def build_atlas(group, specs, cache_dir=CACHE_DIR):
+    """Downsample and pack every spec that exists on disk, write the atlas + index."""
+    images = {}
+    for name, (path, size, fit) in specs.items():
+        try:
+            images[name] = downsample(path, size, fit)
+        except (OSError, ValueError):
+            continue # missing art, the frontend has fallbacks
+    atlas, regions = pack(images)
+    os.makedirs(cache_dir, exist_ok=True)
+    png = os.path.join(cache_dir, f"{group}.png")
+    atlas.save(png)
+    with open(os.path.join(cache_dir, f"{group}.json"), "w") as f:
+        json.dump({"signature": _signature(specs), "regions": regions}, f)
+    return atlas, regions
+
+
+def load_atlas(group, specs, cache_dir=CACHE_DIR):
+    """
+    Cut the group's images out of its cached atlas, rebuilding the atlas
+    first if it is missing or stale. Returns {name: PIL image}, names whose
+    source file is missing are left out.
+    """
+    index = os.path.join(cache_dir, f"{group}.json")
+    atlas = regions = None
+    try:
+        with open(index) as f:
+            cached = json.load(f)
+        if cached["signature"] == _signature(specs):
+            atlas = Image.open(os.path.join(cache_dir, f"{group}.png"))
+            atlas.load()
+            regions = cached["regions"]
+    except (OSError, ValueError, KeyError):
+        pass
+    if atlas is None:
+        atlas, regions = build_atlas(group, specs, cache_dir)
+    return {name: atlas.crop((x, y, x + w, y + h)) for name, (x, y, w, h) in regions.items()}
+
+
+class AssetLoader:
+    """
+    Loads an atlas group on a background thread. Only the decode / resize /
+    crop happens off the main thread; turning an image into a texture uploads
+    to the GPU, so the window does that itself once get() returns an image.
+    """
+
+    def __init__(self, group, specs, cache_dir=CACHE_DIR):
+        self.group = group
+        self.images = {}
+        self.seconds = None # how long the load took, once done
+        self.error = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(specs, cache_dir),
+                                        name=f"assets-{group}", daemon=True)
+        self._thread.start()
+
+    def _run(self, specs, cache_dir):
+        start = time.perf_counter()
+        try:
+            self.images = load_atlas(self.group, specs, cache_dir)
+        except Exception as e: # keep the game running without the art
+            self.error = e
+        self.seconds = time.perf_counter() - start
+        self._done.set()
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def get(self, name):
+        # PIL image for name, or None while loading / when the art is missing
+        return self.images.get(name) if self.ready else None
+
+
+# ---------------------------------------------------------------------------
+# prebuild / benchmark
+# ---------------------------------------------------------------------------
+def main():
+    from frontend import ASSET_GROUPS # frontend owns the display sizes
+
+    parser = argparse.ArgumentParser(description="Build the cached texture atlases")
+    parser.add_argument("--bench", action="store_true", help="time cold builds and warm loads")
+    args = parser.parse_args()
+
+    for group, specs in ASSET_GROUPS.items():
+        start = time.perf_counter()
+        atlas, regions = build_atlas(group, specs)
+        built = time.perf_counter() - start
+        print(f"{group}: {len(regions)} images, {atlas.width}x{atlas.height} atlas, built in {built * 1000:.0f} ms")
+        if args.bench:
+            start = time.perf_counter()
+            load_atlas(group, specs)
+            print(f"  warm load {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
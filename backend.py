@@ -1,201 +1,1430 @@
 # Catan Backend File
+import json
+import math
+import os
 import random
+from array import array
+from player import (ROAD_COST, SETTLEMENT_COST, CITY_COST, CARD_FOR_RESOURCE, BUILDS, TRADE_LIMIT,
+                    affordable, resource_bits)
 '''
-TODO 
+TODO
 * start working on functions necessary to run game loop
 * add in necessary arcade architecture for creating frontend
 * work on comparison operators for checking if node/edge is able to be built on
 * player class
 '''
+
+# fixed resource order, index into this tuple is what the compact board stores
+RESOURCES = ("brick", "ore", "wheat", "sheep", "forest")
+TERRAINS  = RESOURCES + ("desert",)
+BUILDINGS = (None, "settlement", "city")
+NO_PLAYER = -1 # empty slot in the ownership arrays
+MAX_SEATS = 6 # per-seat bitsets are preallocated for up to this many players
+RESOURCE_CARDS = tuple(CARD_FOR_RESOURCE[r] for r in RESOURCES) # resource index -> Player card key
+
+# define the 6 neighbor offsets for cube coordinates
+NEIGHBOR_OFFSETS = [
+    (1, -1, 0), (1, 0, -1), (0, 1, -1),
+    (-1, 1, 0), (-1, 0, 1), (0, -1, 1)
+]
+
+# default 19 hex board layout, plus the pools make_board() shuffles over it
+STANDARD_HEXES = [(-2,  0,  2), (-2,  1,  1), (-2,  2,  0), (-1, -1,  2), (-1,  0,  1), (-1,  1,  0), (-1,  2, -1), (0, -2,  2), (0, -1,  1), (0,  0,  0), (0,  1, -1), (0,  2, -2), (1, -2,  1), (1, -1,  0), (1,  0, -1), (1,  1, -2), (2, -2,  0), (2, -1, -1), (2,  0, -2)]
+STANDARD_RESOURCES = ["sheep","sheep","sheep","sheep", "brick","brick","brick", "ore", "ore","ore","wheat","wheat","wheat","wheat", "forest","forest","forest","forest", "desert"]
+STANDARD_NUMBERS = [2, 3, 3, 4, 4, 5, 5, 6, 6, 8, 8, 9, 9, 10, 10, 11, 11, 12]
+# Port types assigned clockwise from the top around the board's coast.
+# None = 3:1 generic port, string = 2:1 specific resource port.
+STANDARD_PORTS = ["ore", None, "wheat", None, None, "brick", None, "sheep", "forest"]
+
+# node_port values: -1 no port, 0-4 a 2:1 port for RESOURCES[i], 5 a 3:1 port
+NO_PORT = -1
+GENERIC_PORT = len(RESOURCES)
+
+# cards the bank takes for one card: anywhere, at a 3:1 port, at a 2:1 port
+# for its resource
+BANK_RATE, GENERIC_PORT_RATE, PORT_RATE = 4, 3, 2
+
+# number of ways to roll each number with two dice, out of 36 (the pips on a token)
+PIPS = {2: 1, 3: 2, 4: 3, 5: 4, 6: 5, 8: 5, 9: 4, 10: 3, 11: 2, 12: 1}
+
+# custom maps, see load_map()
+MAPS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "maps")
+
+
+def bits(mask):
+    # indexes of the set bits of an int bitmask, lowest first
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(low.bit_length() - 1)
+        mask ^= low
+    return out
+
+
+class _MaskRows:
+    # a mask table for big boards: row i is the int with bits rows[i] set,
+    # built when asked for. Same indexing as the tuples of masks it replaces,
+    # linear memory instead of quadratic
+    __slots__ = ("rows",)
+
+    def __init__(self, rows):
+        self.rows = tuple(rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        mask = 0
+        for b in self.rows[i]:
+            mask |= 1 << b
+        return mask
+
+
+class BoardTopology:
+    # integer indexed graph of tiles, nodes and edges
+    # adjacency is kept in flat array tables with a fixed stride per entry,
+    # e.g. the tiles touching node n are node_tiles[n*3 : n*3+3]
+    # unused slots (nodes on the coast touch less than 3 tiles) hold -1
+    # once frozen a topology is read only and can be shared between boards
+    TILE_STRIDE = 6
+    NODE_STRIDE = 3
+    EDGE_STRIDE = 2
+    MASK_TABLE_LIMIT = 2048 # nodes, see mask_tables()
+
+    def __init__(self, hexes=()):
+        self.frozen = False
+        self.tile_ids = [] # tile index -> (x,y,z) cubic coord
+        self.node_ids = [] # node index -> (fx,fy,fz) average of surrounding tiles
+        self.edge_ids = [] # edge index -> ((x1,y1,z1),(x2,y2,z2)) sorted node ids
+        self.tile_index = {} # reverse lookups, id -> index
+        self.node_index = {}
+        self.edge_index = {}
+        self.tile_nodes = array('i') # tile -> 6 nodes
+        self.tile_edges = array('i') # tile -> 6 edges
+        self.node_tiles = array('i') # node -> up to 3 tiles
+        self.node_edges = array('i') # node -> up to 3 edges
+        self.edge_nodes = array('i') # edge -> 2 nodes
+        self._masks = None # see mask_tables()
+        self._coast = None # see coastal_edges()
+        for xyz in hexes:
+            self.add_hex(xyz)
+
+    @property
+    def num_tiles(self):
+        return len(self.tile_ids)
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.edge_ids)
+
+    # helpers returning the filled slots of a table row
+    # (frozen topologies answer from the per-row tuples made in freeze())
+    def tiles_of_node(self, n):
+        if self.frozen:
+            return self._node_tiles[n]
+        return tuple(t for t in self.node_tiles[n*3:n*3+3] if t >= 0)
+
+    def edges_of_node(self, n):
+        if self.frozen:
+            return self._node_edges[n]
+        return tuple(e for e in self.node_edges[n*3:n*3+3] if e >= 0)
+
+    def nodes_of_edge(self, e):
+        if self.frozen:
+            return self._edge_nodes[e]
+        return tuple(self.edge_nodes[e*2:e*2+2])
+
+    def nodes_of_tile(self, t):
+        if self.frozen:
+            return self._tile_nodes[t]
+        return tuple(self.tile_nodes[t*6:t*6+6])
+
+    def edges_of_tile(self, t):
+        if self.frozen:
+            return self._tile_edges[t]
+        return tuple(self.tile_edges[t*6:t*6+6])
+
+    def mask_tables(self):
+        # adjacency as int bitsets, bit i of a mask stands for node/edge i:
+        # (node -> edges touching it, node -> itself and its neighbours (the
+        #  distance rule), edge -> its 2 nodes, every node, every edge)
+        # a mask with bit i set takes i bits, so tables of them grow with the
+        # square of the board; past MASK_TABLE_LIMIT nodes the rows are made
+        # on demand instead of stored (see _MaskRows)
+        if self._masks is None:
+            full = ((1 << self.num_nodes) - 1, (1 << self.num_edges) - 1)
+            if self.num_nodes > self.MASK_TABLE_LIMIT:
+                node_edges = [self.edges_of_node(n) for n in range(self.num_nodes)]
+                node_block = [(n,) + tuple(o for e in node_edges[n] for o in self.nodes_of_edge(e) if o != n)
+                              for n in range(self.num_nodes)]
+                edge_nodes = [self.nodes_of_edge(e) for e in range(self.num_edges)]
+                self._masks = (_MaskRows(node_edges), _MaskRows(node_block), _MaskRows(edge_nodes)) + full
+                return self._masks
+            node_edges = [0] * self.num_nodes
+            node_block = [1 << n for n in range(self.num_nodes)]
+            edge_nodes = [0] * self.num_edges
+            for e in range(self.num_edges):
+                a, b = self.nodes_of_edge(e)
+                node_edges[a] |= 1 << e
+                node_edges[b] |= 1 << e
+                node_block[a] |= 1 << b
+                node_block[b] |= 1 << a
+                edge_nodes[e] = (1 << a) | (1 << b)
+            self._masks = (tuple(node_edges), tuple(node_block), tuple(edge_nodes)) + full
+        return self._masks
+
+    def freeze(self):
+        # lock the graph and cache every row as a tuple, returns self
+        if self.frozen:
+            return self
+        self._node_tiles = tuple(self.tiles_of_node(n) for n in range(self.num_nodes))
+        self._node_edges = tuple(self.edges_of_node(n) for n in range(self.num_nodes))
+        self._edge_nodes = tuple(self.nodes_of_edge(e) for e in range(self.num_edges))
+        self._tile_nodes = tuple(self.nodes_of_tile(t) for t in range(self.num_tiles))
+        self._tile_edges = tuple(self.edges_of_tile(t) for t in range(self.num_tiles))
+        self.mask_tables()
+        self.frozen = True
+        return self
+
+    def node_xy(self, n):
+        # position of a node in hex-size units, board center at (0, 0)
+        # (same projection the frontend's node_to_pixel uses)
+        fx, fy, fz = self.node_ids[n]
+        return 1.5 * fx, math.sqrt(3) / 2 * fx + math.sqrt(3) * fz
+
+    def coastal_edges(self):
+        # edges bordering only one tile, sorted clockwise starting from the top
+        # (kept once the topology is frozen, every deal places ports on them)
+        if self._coast is not None:
+            return self._coast
+        tiles_per_edge = [0] * self.num_edges
+        for e in self.tile_edges:
+            tiles_per_edge[e] += 1
+        coast = []
+        for e in range(self.num_edges):
+            if tiles_per_edge[e] != 1:
+                continue
+            (x1, y1), (x2, y2) = (self.node_xy(n) for n in self.nodes_of_edge(e))
+            angle = math.atan2((y1 + y2) / 2, (x1 + x2) / 2)
+            # atan2 goes counter-clockwise, so we negate and offset to start at top
+            coast.append(((-(angle - math.pi / 2)) % (2 * math.pi), e))
+        coast.sort()
+        coast = [e for _, e in coast]
+        if self.frozen:
+            self._coast = coast
+        return coast
+
+    def port_edges(self, count):
+        # count coastal edges spaced evenly around the board
+        coast = self.coastal_edges()
+        step = len(coast) / count
+        return [coast[round(i * step) % len(coast)] for i in range(count)]
+
+    def copy(self):
+        # unfrozen copy, for boards that want to add tiles to a shared layout
+        return BoardTopology(self.tile_ids)
+
+    def _link(self, table, stride, row, value):
+        # put value in the first free slot of a row
+        base = row * stride
+        for i in range(base, base + stride):
+            if table[i] == value:
+                return
+            if table[i] < 0:
+                table[i] = value
+                return
+
+    def add_hex(self, xyz:tuple):
+        # add a hex (and any nodes/edges it creates) and return its tile index
+        if xyz in self.tile_index:
+            return self.tile_index[xyz]
+        if self.frozen:
+            raise ValueError("topology is frozen, copy() it before adding tiles")
+        t = len(self.tile_ids)
+        self._masks = None
+        self.tile_ids.append(xyz)
+        self.tile_index[xyz] = t
+        x,y,z = xyz
+
+        # Create Nodes for the Tile
+        tile_nodes = []
+        for i in range(6):
+            # A node is at the intersection of the current tile & two neighbors
+            n1 = NEIGHBOR_OFFSETS[i]
+            n2 = NEIGHBOR_OFFSETS[(i + 1) % 6]
+
+            # Use the average of 3 tile centers as the unique Node ID
+            fx = round((x + (x+n1[0]) + (x+n2[0])) / 3.0, 3)
+            fy = round((y + (y+n1[1]) + (y+n2[1])) / 3.0, 3)
+            fz = round((z + (z+n1[2]) + (z+n2[2])) / 3.0, 3)
+            node_id = (fx, fy, fz)
+
+            # Get or Create the Node if it's not yet in the system
+            n = self.node_index.get(node_id)
+            if n is None:
+                n = len(self.node_ids)
+                self.node_ids.append(node_id)
+                self.node_index[node_id] = n
+                self.node_tiles.extend((-1, -1, -1))
+                self.node_edges.extend((-1, -1, -1))
+            self._link(self.node_tiles, 3, n, t)
+            tile_nodes.append(n)
+
+        # Create Edges for the Tile
+        tile_edges = []
+        for i in range(6):
+            # an edge connects two nodes
+            n1 = tile_nodes[i]
+            n2 = tile_nodes[(i + 1) % 6]
+
+            # use two node ids as id for edge
+            edge_id = tuple(sorted((self.node_ids[n1], self.node_ids[n2])))
+
+            # Get or Create the edge if it's not yet in the system
+            e = self.edge_index.get(edge_id)
+            if e is None:
+                e = len(self.edge_ids)
+                self.edge_ids.append(edge_id)
+                self.edge_index[edge_id] = e
+                self.edge_nodes.extend((self.node_index[edge_id[0]], self.node_index[edge_id[1]]))
+                self._link(self.node_edges, 3, n1, e)
+                self._link(self.node_edges, 3, n2, e)
+            tile_edges.append(e)
+
+        self.tile_nodes.extend(tile_nodes)
+        self.tile_edges.extend(tile_edges)
+        return t
+
+
+_standard_topology = None
+
+def standard_topology():
+    # the 19 hex layout (54 nodes, 72 edges) is built once per process
+    # and shared by reference between every board that uses it
+    global _standard_topology
+    if _standard_topology is None:
+        _standard_topology = BoardTopology(STANDARD_HEXES).freeze()
+    return _standard_topology
+
+
+# ---------------------------------------------------------------------------
+# Board maps
+# ---------------------------------------------------------------------------
+def hexagon_hexes(radius):
+    # every cube coord within radius of the center, the standard board is radius 2
+    return [(x, -x - z, z) for x in range(-radius, radius + 1)
+            for z in range(max(-radius, -x - radius), min(radius, -x + radius) + 1)]
+
+
+class BoardMap:
+    """
+    A board layout plus the pools make_board() deals over it: hexes (cube
+    coords), resources (one terrain name per hex, deserts included), numbers
+    (one per non-desert hex) and ports (resource name or None for 3:1, spread
+    evenly along the coast). Any pool left out is scaled from the standard
+    board's so maps of any size play about the same.
+
+    The topology is built and frozen once per map and shared by every board
+    dealt from it.
+    """
+
+    def __init__(self, hexes, resources=None, numbers=None, ports=None, name="custom"):
+        self.name = name
+        self.hexes = [tuple(h) for h in hexes]
+        if len(set(self.hexes)) != len(self.hexes):
+            raise ValueError(f"map {name}: duplicate hexes")
+        if any(sum(h) != 0 for h in self.hexes):
+            raise ValueError(f"map {name}: cube coords must sum to 0")
+        count = len(self.hexes)
+        if resources is None:
+            resources = self._scaled_resources(count)
+        elif isinstance(resources, dict): # {"sheep": 4, ...}
+            resources = [r for r, k in resources.items() for _ in range(k)]
+        if len(resources) != count:
+            raise ValueError(f"map {name}: {len(resources)} resources for {count} hexes")
+        unknown = set(resources) - set(TERRAINS)
+        if unknown:
+            raise ValueError(f"map {name}: unknown terrain {sorted(unknown)}")
+        self.resources = list(resources)
+        producing = count - self.resources.count("desert")
+        if numbers is None:
+            numbers = [STANDARD_NUMBERS[i % len(STANDARD_NUMBERS)] for i in range(producing)]
+        if len(numbers) != producing:
+            raise ValueError(f"map {name}: {len(numbers)} numbers for {producing} producing hexes")
+        if any(n not in PIPS for n in numbers):
+            raise ValueError(f"map {name}: numbers must be 2-6 or 8-12")
+        self.numbers = list(numbers)
+        self._ports = None if ports is None else list(ports)
+        self._topology = None
+
+    @staticmethod
+    def _scaled_resources(count):
+        # one desert per standard board's worth of hexes, the rest in the
+        # standard mix (cycling the standard pool keeps the proportions)
+        deserts = max(1, round(count / len(STANDARD_HEXES)))
+        pool = [r for r in STANDARD_RESOURCES if r != "desert"]
+        return [pool[i % len(pool)] for i in range(count - deserts)] + ["desert"] * deserts
+
+    @classmethod
+    def hexagon(cls, radius, name=None):
+        return cls(hexagon_hexes(radius), name=name or f"hexagon-{radius}")
+
+    @classmethod
+    def from_dict(cls, data, name="custom"):
+        # the data file format: {"hexes": [[x, y, z], ...]} or {"radius": r},
+        # optional "resources" (list or {terrain: count}), "numbers" and "ports"
+        if "hexes" in data:
+            hexes = data["hexes"]
+        elif "radius" in data:
+            hexes = hexagon_hexes(data["radius"])
+        else:
+            raise ValueError(f"map {name}: needs \"hexes\" or \"radius\"")
+        return cls(hexes, data.get("resources"), data.get("numbers"), data.get("ports"),
+                   data.get("name", name))
+
+    @property
+    def topology(self):
+        if self._topology is None:
+            self._topology = BoardTopology(self.hexes).freeze()
+        return self._topology
+
+    @property
+    def ports(self):
+        # standard board: 9 ports on 30 coastal edges, keep that density
+        if self._ports is None:
+            coast = len(self.topology.coastal_edges())
+            count = max(1, round(coast * len(STANDARD_PORTS) / 30))
+            self._ports = [STANDARD_PORTS[i % len(STANDARD_PORTS)] for i in range(count)]
+        return self._ports
+
+
+_maps = {}
+
+def load_map(name):
+    # a BoardMap from maps/<name>.json or from a path to a json file,
+    # loaded once per process
+    path = name if name.endswith(".json") else os.path.join(MAPS_DIR, f"{name}.json")
+    if path not in _maps:
+        with open(path) as f:
+            data = json.load(f)
+        _maps[path] = BoardMap.from_dict(data, os.path.splitext(os.path.basename(path))[0])
+    return _maps[path]
+
+
 # graph representation
+# Tile/Node/Edge are lightweight views: they only hold the board and an index,
+# everything else is read from (and written to) the board's arrays
 class Tile():
     # tiles represent the hexagonal piece that make up the full board
-    def __init__(self, id:tuple, resource:str, number:int):
-        self.id = id # e.g. (x,y,z) cubic coord
-        self.resource = resource # terrain/resource tile yields
-        self.number = number # number when dice rolled will yield resource
-        self.nodes = [] # list of node objects
-        self.edges = [] # list of edge objects
-    
+    __slots__ = ("board", "index")
+
+    def __init__(self, board, index:int):
+        self.board = board
+        self.index = index
+
+    @property
+    def id(self):
+        return self.board.topology.tile_ids[self.index] # e.g. (x,y,z) cubic coord
+
+    @property
+    def resource(self):
+        # terrain/resource tile yields
+        return TERRAINS[self.board.tile_resource[self.index]]
+
+    @resource.setter
+    def resource(self, resource:str):
+        self.board.tile_resource[self.index] = TERRAINS.index(resource)
+
+    @property
+    def number(self):
+        # number when dice rolled will yield resource
+        return self.board.tile_number[self.index]
+
+    @number.setter
+    def number(self, number:int):
+        self.board.tile_number[self.index] = number
+
+    @property
+    def nodes(self):
+        # list of node objects
+        return [self.board.node(n) for n in self.board.topology.nodes_of_tile(self.index)]
+
+    @property
+    def edges(self):
+        # list of edge objects
+        return [self.board.edge(e) for e in self.board.topology.edges_of_tile(self.index)]
+
     def __str__(self):
         rtn_str = ""
         for node in self.nodes:
             rtn_str += str(node)
 
-        return f"Tile:{self.id} | {self.resource} | {self.number}\n{rtn_str}" 
+        return f"Tile:{self.id} | {self.resource} | {self.number}\n{rtn_str}"
 
 class Node():
     # node represents the axis between tiles where settlements can be placed
-    def __init__(self, id:tuple):
-        self.id = id # e.g. tuple of the averages of the surrounding node's ids
-        self.tiles = [] # List of tile objects
-        self.edges = [] # list of edge objects
-        self.building = None # e.g., settlement/city
-        self.player = None # player who owns node/settle/city
+    __slots__ = ("board", "index")
+
+    def __init__(self, board, index:int):
+        self.board = board
+        self.index = index
+
+    @property
+    def id(self):
+        return self.board.topology.node_ids[self.index] # e.g. tuple of the averages of the surrounding node's ids
+
+    @property
+    def tiles(self):
+        # List of tile objects
+        return [self.board.tile(t) for t in self.board.topology.tiles_of_node(self.index)]
+
+    @property
+    def edges(self):
+        # list of edge objects
+        return [self.board.edge(e) for e in self.board.topology.edges_of_node(self.index)]
+
+    @property
+    def building(self):
+        # e.g., settlement/city
+        return BUILDINGS[self.board.node_building[self.index]]
+
+    @building.setter
+    def building(self, building):
+        self.board.node_building[self.index] = BUILDINGS.index(building)
+
+    @property
+    def player(self):
+        # player who owns node/settle/city
+        owner = self.board.node_owner[self.index]
+        return None if owner == NO_PLAYER else owner
+
+    @property
+    def port(self):
+        # harbour a building here trades at: a resource for 2:1, "3:1", or None
+        kind = self.board.node_port[self.index]
+        if kind == NO_PORT:
+            return None
+        return "3:1" if kind == GENERIC_PORT else RESOURCES[kind]
+
+    @player.setter
+    def player(self, player):
+        self.board.node_owner[self.index] = NO_PLAYER if player is None else player
 
     def __str__(self):
         return f"Node: {self.id}"
-    
+
     def __repr__(self):
         return self.__str__()
-    
+
     # TODO comparison function
 
     #check if node is a valid placement for settlement
     def is_valid_settlement_placement(self, player):
-        if self.building:
-            return False
-        #loop through edges for edge cases
-        flag = False
-        for edge in self.edges:
-            #determine there is an edge the player owns connected to the node
-            if edge.player == player:
-                flag = True
-            #determine there is not another settlement within one edge of the node
-            for node in edge.nodes:
-                if node.player:
-                    flag = False 
-        return flag
-    
+        return self.board.is_valid_settlement_placement(self.index, player)
+
     #after checking valid placement, actually place settlement
     def place_settlement(self, player):
-        self.player = player
-        #self.building = "settlement" 
-        # NOTE: add check for if placement breaks another players longest road here
-    
-    # TODO: determine how to represent city
+        self.board.place_settlement(self.index, player)
+
     def place_city(self, player):
-        if self.player == player:
-            pass
-            #self.building = "city" #or another way to denote city
+        self.board.place_city(self.index, player)
 
 
 class Edge():
     # edge represents the straight where 2 tiles intersect, a.k.a. roads
-    def __init__(self, id:tuple):
-        self.id = id # e.g., tuple of 2 connected nodes
-        self.nodes = [] #list of surrounding nodes
-        self.player = None # player who owns edge/road
-    
+    __slots__ = ("board", "index")
+
+    def __init__(self, board, index:int):
+        self.board = board
+        self.index = index
+
+    @property
+    def id(self):
+        return self.board.topology.edge_ids[self.index] # e.g., tuple of 2 connected nodes
+
+    @property
+    def nodes(self):
+        #list of surrounding nodes
+        return [self.board.node(n) for n in self.board.topology.nodes_of_edge(self.index)]
+
+    @property
+    def player(self):
+        # player who owns edge/road
+        owner = self.board.edge_owner[self.index]
+        return None if owner == NO_PLAYER else owner
+
+    @player.setter
+    def player(self, player):
+        self.board.edge_owner[self.index] = NO_PLAYER if player is None else player
+
     # TODO comparison function
 
     #check if edge is a valid placement for road
     def is_valid_road_placement(self, player):
-        #if road already occupied by a player
-        if self.player:
-            return False
-        #determine if an edge of the two connected nodes is occupied by player
-        flag = False
-        for node in self.nodes:
-            for edge in node.edges:
-                if edge.player == player:
-                    flag = True
-        return flag
-    
+        return self.board.is_valid_road_placement(self.index, player)
+
     #after checking valid road, place road
     def place_road(self, player):
-        self.player = player
+        self.board.place_road(self.index, player)
 
     def str(self):
         return (f"|Edge:{self.id}:{self.nodes}|")
 
 
 class CatanBoard:
-    def __init__(self):
-        self.tiles = {} # {(x,y,z): TileObjects}
-        self.nodes = {} # {(fx,fy,fz): Node Object}
-        self.edges = {} # {((x1,x2,x3),(x2,y2,z2)) : Edge Object}
-
-    def make_board(self):
-        #make default board
-        resource = ["sheep","sheep","sheep","sheep", "brick","brick","brick", "ore", "ore","ore","wheat","wheat","wheat","wheat", "forest","forest","forest","forest", "desert"]
-        number = [2, 3, 3, 4, 4, 5, 5, 6, 6, 8, 8, 9, 9, 10, 10, 11, 11, 12] 
-        xyz = [(-2,  0,  2), (-2,  1,  1), (-2,  2,  0), (-1, -1,  2), (-1,  0,  1), (-1,  1,  0), (-1,  2, -1), (0, -2,  2), (0, -1,  1), (0,  0,  0), (0,  1, -1), (0,  2, -2), (1, -2,  1), (1, -1,  0), (1,  0, -1), (1,  1, -2), (2, -2,  0), (2, -1, -1), (2,  0, -2)]
+    # the board graph lives in self.topology, the per-game state lives in flat
+    # arrays indexed the same way (players are stored as their seat index)
+    # the topology may be shared with other boards, the state arrays never are
+    # board_map picks the layout make_board() deals, None is the standard board
+    # balancer (a balance.BoardBalancer for the same layout) deals balanced
+    # boards instead of a plain shuffle
+    def __init__(self, topology=None, board_map=None, balancer=None):
+        self.topology = topology if topology is not None else BoardTopology()
+        self.board_map = board_map
+        self.balancer = balancer
+        self._views = None # (tile views, node views, edge views), built on first use
+        self._allocate_state()
+
+    def _allocate_state(self):
+        # fresh per-game state sized to the topology
+        topo = self.topology
+        self.tile_resource = array('b', bytes(topo.num_tiles)) # index into TERRAINS
+        self.tile_number   = array('b', bytes(topo.num_tiles)) # dice number, 0 for desert
+        self.node_owner    = array('b', b'\xff' * topo.num_nodes) # seat index or NO_PLAYER
+        self.node_building = array('b', bytes(topo.num_nodes)) # index into BUILDINGS
+        self.edge_owner    = array('b', b'\xff' * topo.num_edges) # seat index or NO_PLAYER
+        # production index, one slot per dice roll 0-12:
+        # production[roll] = ((node, resource, multiplier), ...) for every built node
+        # on a tile with that number, payouts[roll] = ((seat, resource, amount), ...)
+        # the same entries summed per seat and resource, and gains[roll] =
+        # ((seat, packed cards), ...) those totals as one player.ResourceVector
+        # add per seat. All are kept up to date by place_settlement/place_city
+        # so a roll never has to scan the tiles
+        self.production = [()] * 13
+        self.payouts    = [()] * 13
+        self.gains      = [()] * 13
+        # occupancy as int bitsets over node/edge indexes (see mask_tables)
+        self.blocked_nodes  = 0 # built on, or next to a building (distance rule)
+        self.occupied_edges = 0
+        # per seat: roads, settlements, cities, nodes touched by their roads,
+        # and the frontier of edges their network may extend onto
+        self.seat_roads       = [0] * MAX_SEATS
+        self.seat_settlements = [0] * MAX_SEATS
+        self.seat_cities      = [0] * MAX_SEATS
+        self.seat_reach       = [0] * MAX_SEATS
+        self.seat_frontier    = [0] * MAX_SEATS
+        # longest road cache: the seat's road network split into connected
+        # parts, ((edge mask, longest trail), ...), and the best of them
+        self.seat_road_parts  = [()] * MAX_SEATS
+        self.seat_longest     = [0] * MAX_SEATS
+        # harbours: ((edge, resource name or None for 3:1), ...) and, for
+        # each node, the port it can trade at (see NO_PORT / GENERIC_PORT),
+        # port_nodes[kind] the same as a node bitset per port kind
+        self.ports      = ()
+        self.node_port  = array('b', b'\xff' * topo.num_nodes)
+        self.port_nodes = [0] * (GENERIC_PORT + 1)
+
+    def __getstate__(self):
+        # views are rebuilt on demand, no need to pickle them
+        state = self.__dict__.copy()
+        state["_views"] = None
+        return state
+
+    # -----------------------------------------------------------------------
+    # snapshot / restore, for tree search and undo
+    # -----------------------------------------------------------------------
+    # everything per-game is either a small array or a list of immutable
+    # values, so a snapshot is a handful of shallow copies and restore copies
+    # them back in place (the same snapshot can be restored any number of times)
+    def snapshot(self):
+        return (self.node_owner[:], self.node_building[:], self.edge_owner[:],
+                self.tile_resource[:], self.tile_number[:],
+                self.blocked_nodes, self.occupied_edges,
+                self.production[:], self.payouts[:], self.gains[:],
+                self.seat_roads[:], self.seat_settlements[:], self.seat_cities[:],
+                self.seat_reach[:], self.seat_frontier[:],
+                self.seat_road_parts[:], self.seat_longest[:])
+
+    def restore(self, snap):
+        (self.node_owner[:], self.node_building[:], self.edge_owner[:],
+         self.tile_resource[:], self.tile_number[:],
+         self.blocked_nodes, self.occupied_edges,
+         self.production[:], self.payouts[:], self.gains[:],
+         self.seat_roads[:], self.seat_settlements[:], self.seat_cities[:],
+         self.seat_reach[:], self.seat_frontier[:],
+         self.seat_road_parts[:], self.seat_longest[:]) = snap
+
+    # -----------------------------------------------------------------------
+    # object views, only created when something asks for them
+    # -----------------------------------------------------------------------
+    def _build_views(self):
+        # view lists by index, then the same views keyed by id
+        topo = self.topology
+        tiles = [Tile(self, t) for t in range(topo.num_tiles)]
+        nodes = [Node(self, n) for n in range(topo.num_nodes)]
+        edges = [Edge(self, e) for e in range(topo.num_edges)]
+        self._views = (tiles, nodes, edges,
+                       dict(zip(topo.tile_ids, tiles)),
+                       dict(zip(topo.node_ids, nodes)),
+                       dict(zip(topo.edge_ids, edges)))
+        return self._views
+
+    def tile(self, t:int):
+        return (self._views or self._build_views())[0][t]
+
+    def node(self, n:int):
+        return (self._views or self._build_views())[1][n]
+
+    def edge(self, e:int):
+        return (self._views or self._build_views())[2][e]
+
+    @property
+    def tiles(self):
+        # {(x,y,z): Tile}
+        return (self._views or self._build_views())[3]
+
+    @property
+    def nodes(self):
+        # {(fx,fy,fz): Node}
+        return (self._views or self._build_views())[4]
+
+    @property
+    def edges(self):
+        # {((x1,x2,x3),(x2,y2,z2)) : Edge}
+        return (self._views or self._build_views())[5]
+
+    # -----------------------------------------------------------------------
+    # placement rules, on indexes
+    # -----------------------------------------------------------------------
+    # every legal spot of one kind comes back as a single bitmask, kept
+    # current by the place_* methods below instead of walking the graph
+    def legal_settlement_mask(self, player:int, setup=False):
+        # a free node clear of the distance rule, on one of the player's roads
+        # (during setup a settlement doesn't need to connect to a road)
+        reach = self.topology.mask_tables()[3] if setup else self.seat_reach[player]
+        return reach & ~self.blocked_nodes
+
+    def legal_road_mask(self, player:int):
+        # a free edge touching the player's network
+        return self.seat_frontier[player] & ~self.occupied_edges
+
+    def legal_city_mask(self, player:int):
+        # any of the player's settlements can be upgraded
+        return self.seat_settlements[player]
+
+    def legal_masks(self, player:int):
+        # (settlements, cities, roads)
+        return (self.legal_settlement_mask(player),
+                self.legal_city_mask(player),
+                self.legal_road_mask(player))
+
+    def is_valid_settlement_placement(self, n:int, player:int, setup=False):
+        return bool(self.legal_settlement_mask(player, setup) >> n & 1)
+
+    def _frontier(self, player:int):
+        # edges around every node the player has a road or building on,
+        # except where another player's building cuts the network
+        node_edges = self.topology.mask_tables()[0]
+        own = self.seat_settlements[player] | self.seat_cities[player]
+        nodes = self.seat_reach[player] | own
+        frontier = 0
+        while nodes:
+            low = nodes & -nodes
+            n = low.bit_length() - 1
+            nodes ^= low
+            if self.node_owner[n] == NO_PLAYER or low & own:
+                frontier |= node_edges[n]
+        return frontier
+
+    def place_settlement(self, n:int, player:int):
+        self.node_owner[n] = player
+        self.node_building[n] = 1
+        node_edges, node_block = self.topology.mask_tables()[:2]
+        bit = 1 << n
+        self.blocked_nodes |= node_block[n]
+        self.seat_settlements[player] |= bit
+        self.seat_frontier[player] |= node_edges[n]
+        # the settlement cuts any other network running through this node,
+        # only the part of that network touching the node is re-measured
+        for other in range(MAX_SEATS):
+            if other != player and self.seat_reach[other] & bit:
+                self.seat_frontier[other] = self._frontier(other)
+                self._split_road_part(other, n)
+        self._index_production(n)
+
+    def place_city(self, n:int, player:int):
+        if self.node_owner[n] == player:
+            self.node_building[n] = 2
+            self.seat_settlements[player] &= ~(1 << n)
+            self.seat_cities[player] |= 1 << n
+            self._index_production(n)
+
+    def _index_production(self, n:int):
+        # swap node n's entries in the production index for fresh ones,
+        # then re-total the payouts of the (at most 3) rolls it touches
+        tiles = self.topology.tiles_of_node(n)
+        mult = self.node_building[n]
+        for roll in {self.tile_number[t] for t in tiles}:
+            if not roll:
+                continue
+            entries = [entry for entry in self.production[roll] if entry[0] != n]
+            entries += [(n, self.tile_resource[t], mult) for t in tiles if self.tile_number[t] == roll]
+            self.production[roll] = tuple(entries)
+
+            totals = {}
+            for node, resource, amount in entries:
+                key = (self.node_owner[node], resource)
+                totals[key] = totals.get(key, 0) + amount
+            self.payouts[roll] = tuple((seat, resource, amount) for (seat, resource), amount in totals.items())
+            gains = {}
+            for (seat, resource), amount in totals.items():
+                gains[seat] = gains.get(seat, 0) + resource_bits(resource, amount)
+            self.gains[roll] = tuple(gains.items())
+
+    def is_valid_road_placement(self, e:int, player:int):
+        return bool(self.legal_road_mask(player) >> e & 1)
+
+    def place_road(self, e:int, player:int):
+        self.edge_owner[e] = player
+        node_edges, _, edge_nodes = self.topology.mask_tables()[:3]
+        self.occupied_edges |= 1 << e
+        self.seat_roads[player] |= 1 << e
+        self.seat_reach[player] |= edge_nodes[e]
+        for n in self.topology.nodes_of_edge(e):
+            # the road can't be continued through someone else's building
+            if self.node_owner[n] in (NO_PLAYER, player):
+                self.seat_frontier[player] |= node_edges[n]
+        self._join_road_part(player, e)
+
+    # -----------------------------------------------------------------------
+    # longest road, cached per connected part of each seat's network
+    # -----------------------------------------------------------------------
+    def _passable_nodes(self, player:int, edges:int):
+        # nodes of these edges a road of the player may run through
+        edge_nodes = self.topology.mask_tables()[2]
+        nodes = 0
+        for e in bits(edges):
+            nodes |= edge_nodes[e]
+        for n in bits(nodes):
+            if self.node_owner[n] not in (NO_PLAYER, player):
+                nodes &= ~(1 << n)
+        return nodes
+
+    def _join_road_part(self, player:int, e:int):
+        # a new road merges with every part it touches through a passable
+        # node, and only that merged part gets measured again
+        node_edges, _, edge_nodes = self.topology.mask_tables()[:3]
+        touching = 0
+        for n in bits(edge_nodes[e]):
+            if self.node_owner[n] in (NO_PLAYER, player):
+                touching |= node_edges[n]
+        merged = 1 << e
+        parts = []
+        for part in self.seat_road_parts[player]:
+            if part[0] & touching:
+                merged |= part[0]
+            else:
+                parts.append(part)
+        parts.append((merged, self._longest_trail(player, merged)))
+        self._store_road_parts(player, parts)
+
+    def _split_road_part(self, player:int, n:int):
+        # a building on node n may cut the part running through it in two
+        node_edges = self.topology.mask_tables()[0]
+        parts = []
+        for part in self.seat_road_parts[player]:
+            if not part[0] & node_edges[n]:
+                parts.append(part)
+                continue
+            for piece in self._road_pieces(player, part[0]):
+                parts.append((piece, self._longest_trail(player, piece)))
+        self._store_road_parts(player, parts)
+
+    def _store_road_parts(self, player:int, parts):
+        self.seat_road_parts[player] = tuple(parts)
+        self.seat_longest[player] = max((length for _, length in parts), default=0)
+
+    def _road_pieces(self, player:int, edges:int):
+        # split a set of roads into pieces connected through passable nodes
+        node_edges = self.topology.mask_tables()[0]
+        passable = self._passable_nodes(player, edges)
+        pieces = []
+        while edges:
+            piece = frontier = edges & -edges
+            while frontier:
+                grow = 0
+                for e in bits(frontier):
+                    for n in self.topology.nodes_of_edge(e):
+                        if passable >> n & 1:
+                            grow |= node_edges[n]
+                frontier = grow & edges & ~piece
+                piece |= frontier
+            pieces.append(piece)
+            edges &= ~piece
+        return pieces
+
+    def _longest_trail(self, player:int, edges:int):
+        # longest run of distinct roads within one part, a run may end at
+        # another player's building but not pass through it
+        node_edges = self.topology.mask_tables()[0]
+        nodes_of_edge = self.topology.nodes_of_edge
+        passable = self._passable_nodes(player, edges)
+        best = 0
+
+        def walk(n, used, length):
+            nonlocal best
+            if length > best:
+                best = length
+            if length and not passable >> n & 1:
+                return
+            options = node_edges[n] & edges & ~used
+            while options:
+                low = options & -options
+                options ^= low
+                a, b = nodes_of_edge(low.bit_length() - 1)
+                walk(b if a == n else a, used | low, length + 1)
+
+        start = 0
+        for e in bits(edges):
+            a, b = nodes_of_edge(e)
+            start |= (1 << a) | (1 << b)
+        for n in bits(start):
+            walk(n, 0, 0)
+        return best
+
+    # -----------------------------------------------------------------------
+    # building the board
+    # -----------------------------------------------------------------------
+    def make_board(self, rng=random):
+        #make default board on the shared standard layout
+        # (or on self.board_map's layout when one is set)
+        # only the per-game state is (re)allocated, the graph is reused
+        # pass a random.Random as rng for a reproducible board
+        board_map = self.board_map
+        topology = standard_topology() if board_map is None else board_map.topology
+        if self.topology is not topology:
+            self.topology = topology
+            self._views = None
+        self._allocate_state()
+        if board_map is None:
+            resources, numbers, ports = STANDARD_RESOURCES, STANDARD_NUMBERS, STANDARD_PORTS
+        else:
+            resources, numbers, ports = board_map.resources, board_map.numbers, board_map.ports
+        if self.balancer is not None:
+            self.balancer.deal(self, rng)
+            self.set_ports(ports)
+            return
+        resource = [TERRAINS.index(r) for r in resources]
+        number = numbers[:]
         # randomize resource and number lists
-        random.shuffle(resource)
-        random.shuffle(number)
-        #19 add tile calls
-        for i in range(19):
+        rng.shuffle(resource)
+        rng.shuffle(number)
+        desert = TERRAINS.index("desert")
+        for t in range(topology.num_tiles):
             r = resource.pop()
-            n = 0 if r == "desert" else number.pop()
-            self.add_tile(xyz[i], r, n)
-
-    def add_tile(self, xyz:tuple, resource:str, number:int):
-        # add tile to registry
-        new_tile = Tile(xyz, resource, number)
-        self.tiles[xyz] = new_tile
-        tile_nodes = []
-        x,y,z = xyz
-        # Create Nodes for the Tile
-        # define the 6 neighbor offsets for cube coordinates
-        neighbor_offsets = [
-            (1, -1, 0), (1, 0, -1), (0, 1, -1),
-            (-1, 1, 0), (-1, 0, 1), (0, -1, 1)
-        ]
-        for i in range(6):
-            # A node is at the intersection of the current tile & two neighbors
-            n1 = neighbor_offsets[i]
-            n2 = neighbor_offsets[(i + 1) % 6]
-            
-            # Use the average of 3 tile centers as the unique Node ID
-            fx = round((x + (x+n1[0]) + (x+n2[0])) / 3.0, 3)
-            fy = round((y + (y+n1[1]) + (y+n2[1])) / 3.0, 3)
-            fz = round((z + (z+n1[2]) + (z+n2[2])) / 3.0, 3)
-            node_id = (fx, fy, fz)
+            self.tile_resource[t] = r
+            self.tile_number[t] = 0 if r == desert else number.pop()
+        self.set_ports(ports)
 
-            # Get or Create the Node if it's not yet in the system
-            if node_id not in self.nodes:
-                self.nodes[node_id] = Node(node_id)
-            
-            # create a node object
-            node_obj = self.nodes[node_id]
+    def set_ports(self, port_types):
+        # spread the ports evenly along the coast and attach them to both
+        # nodes of their edge
+        self.node_port = array('b', b'\xff' * self.topology.num_nodes)
+        self.port_nodes = [0] * (GENERIC_PORT + 1)
+        edges = self.topology.port_edges(len(port_types)) if port_types else []
+        self.ports = tuple(zip(edges, port_types))
+        for e, resource in self.ports:
+            kind = GENERIC_PORT if resource is None else RESOURCES.index(resource)
+            for n in self.topology.nodes_of_edge(e):
+                self.node_port[n] = kind
+                self.port_nodes[kind] |= 1 << n
 
-            # Cross-reference them
-            tile_nodes.append(node_obj) # list of edges for edge creation
-            new_tile.nodes.append(node_obj)
-            node_obj.tiles.append(new_tile)
+    def trade_rates(self, seat:int):
+        # cards of each resource (RESOURCES order) the bank wants from the
+        # seat for one card, from the ports its buildings are on
+        own = self.seat_settlements[seat] | self.seat_cities[seat]
+        rate = GENERIC_PORT_RATE if own & self.port_nodes[GENERIC_PORT] else BANK_RATE
+        return tuple(PORT_RATE if own & nodes else rate for nodes in self.port_nodes[:GENERIC_PORT])
 
-        # Create Edges for the Tile
-        for i in range(6):
-            # an edge connects two nodes
-            n1 = tile_nodes[i]
-            n2 = tile_nodes[(i + 1) % 6]
+    def add_tile(self, xyz:tuple, resource:str, number:int):
+        # add tile to the topology, then grow the state arrays to match
+        if self.topology.frozen and xyz not in self.topology.tile_index:
+            self.topology = self.topology.copy()
+        t = self.topology.add_hex(xyz)
+        topo = self.topology
+        self.tile_resource.extend([0] * (topo.num_tiles - len(self.tile_resource)))
+        self.tile_number.extend([0] * (topo.num_tiles - len(self.tile_number)))
+        self.node_owner.extend([NO_PLAYER] * (topo.num_nodes - len(self.node_owner)))
+        self.node_building.extend([0] * (topo.num_nodes - len(self.node_building)))
+        self.node_port.extend([NO_PORT] * (topo.num_nodes - len(self.node_port)))
+        self.edge_owner.extend([NO_PLAYER] * (topo.num_edges - len(self.edge_owner)))
+        self.tile_resource[t] = TERRAINS.index(resource)
+        self.tile_number[t] = number
+        self._views = None
+        self._rebuild_masks()
 
-            # use two node ids as id for edge
-            edge_id = tuple(sorted((n1.id, n2.id)))
+    def load_state(self, topology, tile_resource, tile_number, node_owner, node_building,
+                   edge_owner, port_types):
+        # replace the whole per-game state, e.g. with one decoded by
+        # serialize.py (the arrays may be any bytes-like of signed bytes),
+        # then re-derive the bitsets, road parts and production index
+        if self.topology is not topology:
+            self.topology = topology
+            self._views = None
+        self._allocate_state()
+        self.tile_resource[:] = array('b', tile_resource)
+        self.tile_number[:]   = array('b', tile_number)
+        self.node_owner[:]    = array('b', node_owner)
+        self.node_building[:] = array('b', node_building)
+        self.edge_owner[:]    = array('b', edge_owner)
+        self.set_ports(port_types)
+        self._rebuild_masks()
+        self.production = [()] * 13
+        self.payouts    = [()] * 13
+        self.gains      = [()] * 13
+        for n, owner in enumerate(self.node_owner):
+            if owner != NO_PLAYER:
+                self._index_production(n)
 
-            # Get or Create the edge if it's not yet in the system
-            if edge_id not in self.edges:
-                self.edges[edge_id] = Edge(edge_id)
-
-            edge_obj = self.edges[edge_id]
-
-            # Cross-refrerence them 
-            # NOTE not checked! im also not sure how necessary this is
-            # just giving each node, edge, tile lists of connected ones for
-            # potential use. - Nick 
-            new_tile.edges.append(edge_obj)
-            n1.edges.append(edge_obj)
-            n2.edges.append(edge_obj)
-            edge_obj.nodes.append(n1)
-            edge_obj.nodes.append(n2)
-            
+    def _rebuild_masks(self):
+        # re-derive the occupancy bitsets from the ownership arrays
+        # (only needed when the topology itself changed)
+        node_block, edge_nodes = self.topology.mask_tables()[1:3]
+        self.blocked_nodes = 0
+        self.occupied_edges = 0
+        for seat in range(MAX_SEATS):
+            self.seat_roads[seat] = self.seat_settlements[seat] = self.seat_cities[seat] = 0
+            self.seat_reach[seat] = 0
+        for n, owner in enumerate(self.node_owner):
+            if owner != NO_PLAYER:
+                self.blocked_nodes |= node_block[n]
+                if self.node_building[n] == 2:
+                    self.seat_cities[owner] |= 1 << n
+                else:
+                    self.seat_settlements[owner] |= 1 << n
+        for e, owner in enumerate(self.edge_owner):
+            if owner != NO_PLAYER:
+                self.occupied_edges |= 1 << e
+                self.seat_roads[owner] |= 1 << e
+                self.seat_reach[owner] |= edge_nodes[e]
+        for seat in range(MAX_SEATS):
+            self.seat_frontier[seat] = self._frontier(seat)
+            pieces = self._road_pieces(seat, self.seat_roads[seat])
+            self._store_road_parts(seat, [(p, self._longest_trail(seat, p)) for p in pieces])
 
     def __str__(self):
         tile_strings = []
         for tile_obj in self.tiles.values(): # .values() gets the Tile objects
             tile_strings.append(str(tile_obj))
-        
+
         # Combine all tile strings separated by a dashed line
         divider = "\n" + "-"*30 + "\n"
         return f"=== Catan Board ===\n{divider.join(tile_strings)}"
 
 
+# game phases and move kinds used by the GameEngine
+PHASE_SETUP = "setup"
+PHASE_MAIN  = "main"
+PHASE_OVER  = "over"
+
+MOVE_SETTLEMENT = "settlement"
+MOVE_ROAD       = "road"
+MOVE_CITY       = "city"
+MOVE_END_TURN   = "end"
+# ("bank", give, get): trade with the bank at the seat's rate for one card of
+# get. apply() takes it but legal_moves() leaves it out, trades are extra
+# moves a policy makes on top of its builds (see bots.TraderBot)
+MOVE_BANK_TRADE = "bank"
+
+LONGEST_ROAD_MIN = 5 # roads needed before the longest road card is handed out
+LONGEST_ROAD_VP  = 2
+
+
+class GameEngine:
+    # headless rules core, no arcade needed
+    # owns the board, the players, the turn order and the dice. Players are
+    # addressed by seat index and board pieces by node/edge index; a move is
+    # a tuple like ("road", 12) or ("end",)
+    # board_map (a BoardMap, see load_map) and balancer (see balance.py) are
+    # used when no board is given. log (an eventlog.EventLog) records every
+    # game played on the engine
+    def __init__(self, players, board=None, seed=None, vp_to_win=10, board_map=None,
+                 balancer=None, log=None):
+        self.players = list(players)
+        if len(self.players) > MAX_SEATS:
+            raise ValueError(f"at most {MAX_SEATS} players")
+        for seat, p in enumerate(self.players):
+            p.seat = seat
+        self.rng = random.Random(seed)
+        if board is None:
+            board = CatanBoard(board_map=board_map, balancer=balancer)
+            board.make_board(self.rng)
+        self.board = board
+        self.vp_to_win = vp_to_win
+        self.log = log
+        # with auto_roll off the dice are only rolled by calling roll_dice()
+        # (replaying a log feeds it the logged dice)
+        self.auto_roll = True
+        self._reset_turn_state()
+        if log is not None:
+            log.begin_game(self)
+
+    def reset(self, seed=None):
+        # start a new game on the same engine, board and player objects
+        # (the board is re-dealt in place, nothing is reallocated). An
+        # unfinished game is logged as it stands, before anything is cleared
+        if self.log is not None:
+            self.log.end_game(self)
+        self.rng.seed(seed)
+        self.board.make_board(self.rng)
+        for p in self.players:
+            p.reset()
+        self._reset_turn_state()
+        if self.log is not None:
+            self.log.begin_game(self)
+
+    # -----------------------------------------------------------------------
+    # snapshot / restore of the whole game, for tree search
+    # -----------------------------------------------------------------------
+    def snapshot(self, with_rng=False):
+        # board, hands, pieces, VP and turn state. The dice generator is left
+        # out unless asked for (it is the slowest part to copy) so by default
+        # play after a restore rolls fresh dice
+        return (self.board.snapshot(),
+                tuple(p.snapshot() for p in self.players),
+                self.current, self.turn, self.dice, self.winner, self.longest_road,
+                self.phase, self.setup_step, self.setup_node,
+                self.rng.getstate() if with_rng else None)
+
+    def restore(self, snap):
+        board, players, self.current, self.turn, self.dice, self.winner, \
+            self.longest_road, self.phase, self.setup_step, self.setup_node, rng = snap
+        self.board.restore(board)
+        for p, state in zip(self.players, players):
+            p.restore(state)
+        self.trade_offer = None # offers are talk, not game state
+        if rng is not None:
+            self.rng.setstate(rng)
+
+    def _reset_turn_state(self):
+        self.current = 0 # seat whose turn it is
+        self.turn = 0 # number of finished turns in the main phase
+        self.dice = None # (die1, die2) of the last roll
+        self.winner = None
+        self.longest_road = None # seat holding the longest road card
+        # setup is a snake draft, each entry places one settlement then one road
+        n = len(self.players)
+        self.phase = PHASE_SETUP
+        self.setup_order = list(range(n)) + list(range(n - 1, -1, -1))
+        self.setup_step = 0
+        self.setup_node = None # settlement the next setup road must touch
+        self.trade_offer = None # open player to player TradeOffer
+
+    @property
+    def current_player(self):
+        return self.players[self.current]
+
+    # -----------------------------------------------------------------------
+    # dice and production
+    # -----------------------------------------------------------------------
+    def roll_dice(self, dice=None):
+        # dice=(die1, die2) sets the roll instead of rolling
+        self.dice = dice or (self.rng.randint(1, 6), self.rng.randint(1, 6))
+        if self.log is not None:
+            self.log.roll(self.dice)
+        roll = self.dice[0] + self.dice[1]
+        # NOTE: robber is not modelled yet, a 7 simply produces nothing
+        if roll != 7:
+            self.distribute(roll)
+        return self.dice
+
+    def distribute(self, roll):
+        # every settlement on a tile with this number gets 1 card, cities get 2
+        # the board keeps each seat's cards for every roll packed, ready to add
+        players = self.players
+        for seat, gain in self.board.gains[roll]:
+            players[seat].resource_cards += gain
+        if self.log is not None:
+            for seat, resource, amount in self.board.payouts[roll]:
+                self.log.payout(seat, resource, amount)
+
+    # -----------------------------------------------------------------------
+    # legality
+    # -----------------------------------------------------------------------
+    def setup_expects(self):
+        # which piece the setup draft wants next, None outside of setup
+        if self.phase != PHASE_SETUP:
+            return None
+        return MOVE_ROAD if self.setup_node is not None else MOVE_SETTLEMENT
+
+    def can_afford(self, seat, cost):
+        # setup placements are free
+        return self.phase == PHASE_SETUP or self.players[seat].can_afford(cost)
+
+    def affordable(self):
+        # bit seat * len(BUILDS) + i set when the seat can pay for BUILDS[i],
+        # every seat and build in one go (player.affordable)
+        if self.phase == PHASE_SETUP:
+            return (1 << len(self.players) * len(BUILDS)) - 1
+        return affordable([p.resource_cards for p in self.players])
+
+    def placeable(self, seat):
+        # BUILDS bits (for one seat) of the pieces it has a spot and a piece
+        # left for, whatever its hand. Dev cards can't be bought yet
+        board = self.board
+        p = self.players[seat]
+        if self.phase != PHASE_MAIN:
+            return 0
+        return (bool(p.total_roads and board.legal_road_mask(seat)) << BUILDS.index("road")
+                | bool(p.total_settlements and board.legal_settlement_mask(seat)) << BUILDS.index("settlement")
+                | bool(p.total_cities and board.legal_city_mask(seat)) << BUILDS.index("city"))
+
+    # legal spots as bitmasks (bit i = node/edge i), on top of the board's
+    # placement masks these check the phase, the hand and the pieces left
+    def legal_settlement_mask(self, seat):
+        board = self.board
+        p = self.players[seat]
+        if self.phase == PHASE_SETUP:
+            if seat != self.current or self.setup_node is not None:
+                return 0
+            return board.legal_settlement_mask(seat, setup=True)
+        if self.phase != PHASE_MAIN or p.total_settlements <= 0 or not p.can_afford(SETTLEMENT_COST):
+            return 0
+        return board.legal_settlement_mask(seat)
+
+    def legal_road_mask(self, seat):
+        board = self.board
+        p = self.players[seat]
+        if self.phase == PHASE_SETUP:
+            if seat != self.current or self.setup_node is None:
+                return 0
+            node_edges = board.topology.mask_tables()[0]
+            return node_edges[self.setup_node] & ~board.occupied_edges
+        if self.phase != PHASE_MAIN or p.total_roads <= 0 or not p.can_afford(ROAD_COST):
+            return 0
+        return board.legal_road_mask(seat)
+
+    def legal_city_mask(self, seat):
+        p = self.players[seat]
+        if self.phase != PHASE_MAIN or p.total_cities <= 0 or not p.can_afford(CITY_COST):
+            return 0
+        return self.board.legal_city_mask(seat)
+
+    def legal_settlements(self, seat):
+        return bits(self.legal_settlement_mask(seat))
+
+    def legal_roads(self, seat):
+        return bits(self.legal_road_mask(seat))
+
+    def legal_cities(self, seat):
+        return bits(self.legal_city_mask(seat))
+
+    def legal_moves(self):
+        # every move the current player can make right now
+        if self.phase == PHASE_OVER:
+            return []
+        seat = self.current
+        moves = [(MOVE_SETTLEMENT, n) for n in self.legal_settlements(seat)]
+        moves += [(MOVE_CITY, n) for n in self.legal_cities(seat)]
+        moves += [(MOVE_ROAD, e) for e in self.legal_roads(seat)]
+        if self.phase == PHASE_MAIN:
+            moves.append((MOVE_END_TURN,))
+        return moves
+
+    # -----------------------------------------------------------------------
+    # actions, all for the current player. Each returns whether it happened
+    # -----------------------------------------------------------------------
+    def build_settlement(self, n):
+        board = self.board
+        p = self.current_player
+        if self.phase == PHASE_SETUP:
+            if self.setup_node is not None or not board.is_valid_settlement_placement(n, p.seat, setup=True):
+                return False
+            p.build_settlement(board, n, free=True)
+            if self.log is not None:
+                self.log.settlement(p.seat, n)
+            # the second setup settlement pays out its surrounding tiles
+            if self.setup_step >= len(self.players):
+                for t in board.topology.tiles_of_node(n):
+                    resource = TERRAINS[board.tile_resource[t]]
+                    if resource != "desert":
+                        p.collect(CARD_FOR_RESOURCE[resource])
+                        if self.log is not None:
+                            self.log.payout(p.seat, board.tile_resource[t], 1)
+            self.setup_node = n
+            return True
+        if self.phase != PHASE_MAIN or not p.build_settlement(board, n):
+            return False
+        if self.log is not None:
+            self.log.settlement(p.seat, n)
+        # a settlement can cut someone else's road
+        self._update_longest_road()
+        self._check_winner()
+        return True
+
+    def build_road(self, e):
+        board = self.board
+        p = self.current_player
+        if self.phase == PHASE_SETUP:
+            if not self.legal_road_mask(p.seat) >> e & 1:
+                return False
+            p.build_road(board, e, free=True)
+            if self.log is not None:
+                self.log.road(p.seat, e)
+            self._next_setup_step()
+            return True
+        if self.phase != PHASE_MAIN or not p.build_road(board, e):
+            return False
+        if self.log is not None:
+            self.log.road(p.seat, e)
+        self._update_longest_road()
+        self._check_winner()
+        return True
+
+    def build_city(self, n):
+        if self.phase != PHASE_MAIN or not self.current_player.build_city(self.board, n):
+            return False
+        if self.log is not None:
+            self.log.city(self.current, n)
+        self._check_winner()
+        return True
+
+    # -----------------------------------------------------------------------
+    # trades, main phase only and always with the current player on one
+    # side. Resources are RESOURCES indexes, only done trades are logged
+    # -----------------------------------------------------------------------
+    def bank_trade(self, give, get, amount=1):
+        # amount cards of get for the seat's rate of give (board.trade_rates) each
+        p = self.current_player
+        if self.phase != PHASE_MAIN or give not in range(len(RESOURCES)) \
+                or get not in range(len(RESOURCES)) or give == get:
+            return False
+        give_amount = self.board.trade_rates(p.seat)[give] * amount
+        if not 0 < give_amount <= TRADE_LIMIT or p.resource_cards[give] < give_amount:
+            return False
+        p.resource_cards += resource_bits(get, amount) - resource_bits(give, give_amount)
+        if self.log is not None:
+            self.log.trade(p.seat, None, give, give_amount, get, amount)
+        return True
+
+    def offer_trade(self, partner, give, give_amount, get, get_amount):
+        # the current player offers partner give_amount of give for
+        # get_amount of get. The offer stays open (trade_offer) until it is
+        # accepted, countered, declined or the turn ends; returns it, or
+        # None if it couldn't be made
+        if self.phase != PHASE_MAIN or partner == self.current or partner not in range(len(self.players)):
+            return None
+        self.trade_offer = self.current_player.offer_trade(partner, give, give_amount, get, get_amount)
+        return self.trade_offer
+
+    def counter_trade(self, give, give_amount, get, get_amount):
+        # the open offer's partner answers with an offer of their own (in
+        # their terms: give is what they give), which replaces it
+        offer = self.trade_offer
+        if offer is None:
+            return None
+        counter = self.players[offer.partner].offer_trade(offer.seat, give, give_amount, get, get_amount)
+        if counter is not None:
+            self.trade_offer = counter
+        return counter
+
+    def accept_trade(self):
+        # the open offer's partner takes it
+        offer = self.trade_offer
+        if offer is None or not self.players[offer.partner].accept_trade(offer, self.players[offer.seat]):
+            return False
+        self.trade_offer = None
+        if self.log is not None:
+            self.log.trade(offer.seat, offer.partner, offer.give, offer.give_amount, offer.get, offer.get_amount)
+        return True
+
+    def decline_trade(self):
+        self.trade_offer = None
+
+    def end_turn(self):
+        # pass the turn on; the next player's dice are rolled straight away
+        if self.phase != PHASE_MAIN:
+            return False
+        if self.log is not None:
+            self.log.end(self.current)
+        self.trade_offer = None
+        self.current = (self.current + 1) % len(self.players)
+        self.turn += 1
+        # points picked up on someone else's turn (the longest road card
+        # changing hands) only win once it's the player's own turn
+        self._check_winner()
+        if self.phase == PHASE_OVER:
+            return True
+        if self.auto_roll:
+            self.roll_dice()
+        if self.log is not None:
+            self.log.turn_started(self)
+        return True
+
+    def apply(self, move):
+        kind = move[0]
+        if kind == MOVE_SETTLEMENT:
+            return self.build_settlement(move[1])
+        if kind == MOVE_ROAD:
+            return self.build_road(move[1])
+        if kind == MOVE_CITY:
+            return self.build_city(move[1])
+        if kind == MOVE_END_TURN:
+            return self.end_turn()
+        if kind == MOVE_BANK_TRADE:
+            return len(move) == 3 and self.bank_trade(move[1], move[2])
+        raise ValueError(f"unknown move {move!r}")
+
+    def _next_setup_step(self):
+        self.setup_node = None
+        self.setup_step += 1
+        if self.setup_step < len(self.setup_order):
+            self.current = self.setup_order[self.setup_step]
+        else:
+            # draft finished, first player starts the main phase
+            self.phase = PHASE_MAIN
+            self.current = 0
+            if self.auto_roll:
+                self.roll_dice()
+            if self.log is not None:
+                self.log.turn_started(self)
+
+    def _update_longest_road(self):
+        # the card stays with its holder until someone has a strictly longer
+        # road; if the holder's road is cut it goes to a sole new leader, or
+        # is set aside on a tie
+        lengths = [self.board.seat_longest[seat] for seat in range(len(self.players))]
+        best = max(lengths)
+        holder = self.longest_road
+        if holder is not None and lengths[holder] == best >= LONGEST_ROAD_MIN:
+            return
+        leaders = [seat for seat, length in enumerate(lengths) if length == best]
+        new = leaders[0] if best >= LONGEST_ROAD_MIN and len(leaders) == 1 else None
+        if new == holder:
+            return
+        if holder is not None:
+            self.players[holder].victory_points -= LONGEST_ROAD_VP
+        if new is not None:
+            self.players[new].victory_points += LONGEST_ROAD_VP
+        self.longest_road = new
+
+    def _check_winner(self):
+        if self.current_player.victory_points >= self.vp_to_win:
+            self.winner = self.current
+            self.phase = PHASE_OVER
+            if self.log is not None:
+                self.log.end_game(self)
+
+
 if __name__ == "__main__":
     print("testing board")
     game_board = CatanBoard()
-    # create tile at "center" of board with type dessert and of dice roll val 0
-    game_board.add_tile((0,0,0), "dessert", 0)
+    # create tile at "center" of board with type desert and of dice roll val 0
+    game_board.add_tile((0,0,0), "desert", 0)
     # add tile to the bottom left of center tile
-    game_board.add_tile((1,-1,0), "forrest", 2)
-    print(f"{game_board}")
\ No newline at end of file
+    game_board.add_tile((1,-1,0), "forest", 2)
+    print(f"{game_board}")
@@ -0,0 +1,77 @@
+# Board construction benchmark for big / custom maps
+# usage: python benchmark.py                        every map in maps/
+#        python benchmark.py --maps stress_2k --radius 40 --radius 60
+#
+# for each map: size of the graph, time to build the topology (once per map),
+# to deal a board on it (every game) and to compute the legal placements,
+# and the memory the topology and a dealt board hold (tracemalloc)
+import argparse
+import os
+import random
+import time
+import tracemalloc
+
+from backend import BoardMap, BoardTopology, CatanBoard, MAPS_DIR, load_map
+
+
+def _timed(fn, repeat):
+    # best of repeat runs, in ms
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_map(board_map, repeat=5):
+    # topology: built from scratch, memory is what the frozen graph holds
+    # (timed without tracemalloc, which slows allocation down a lot)
+    topo_ms = _timed(lambda: BoardTopology(board_map.hexes).freeze(), 1)
+    tracemalloc.start()
+    topo = board_map.topology
+    topo_kb = tracemalloc.get_traced_memory()[0] / 1024
+    tracemalloc.stop()
+
+    rng = random.Random(0)
+    board = CatanBoard(board_map=board_map)
+    tracemalloc.start()
+    board.make_board(rng)
+    board_kb = tracemalloc.get_traced_memory()[0] / 1024
+    tracemalloc.stop()
+
+    deal_ms = _timed(lambda: board.make_board(rng), repeat)
+    legal_ms = _timed(lambda: board.legal_settlement_mask(0, setup=True), repeat)
+    return {
+        "hexes": topo.num_tiles, "nodes": topo.num_nodes, "edges": topo.num_edges,
+        "ports": len(board.ports), "topology_ms": topo_ms, "deal_ms": deal_ms,
+        "legal_ms": legal_ms, "topology_kb": topo_kb, "board_kb": board_kb,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Board build time and memory per map")
+    parser.add_argument("--maps", default=None,
+                        help="comma separated map names (default: every map in maps/)")
+    parser.add_argument("--radius", type=int, action="append", default=[],
+                        help="also bench a generated hexagon map of this radius (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.maps:
+        names = args.maps.split(",")
+    else:
+        names = sorted(f[:-5] for f in os.listdir(MAPS_DIR) if f.endswith(".json"))
+    maps = [load_map(name) for name in names] + [BoardMap.hexagon(r) for r in args.radius]
+
+    print(f"{'map':<16}{'hexes':>7}{'nodes':>7}{'edges':>7}{'ports':>6}"
+          f"{'topology':>11}{'deal':>10}{'legal':>9}{'topo mem':>11}{'board mem':>11}")
+    for board_map in maps:
+        r = bench_map(board_map, args.repeat)
+        print(f"{board_map.name:<16}{r['hexes']:>7}{r['nodes']:>7}{r['edges']:>7}{r['ports']:>6}"
+              f"{r['topology_ms']:>9.1f}ms{r['deal_ms']:>8.2f}ms{r['legal_ms']:>7.3f}ms"
+              f"{r['topology_kb']:>9.0f}KB{r['board_kb']:>9.0f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+# Computer players
+# a bot is anything with choose_move(engine, moves) -> one of moves (or a
+# trade move, see MOVE_BANK_TRADE) and reset(seed) which the simulation
+# runner calls before each game
+import math
+import multiprocessing
+import random
+import time
+from backend import (MOVE_CITY, MOVE_SETTLEMENT, MOVE_ROAD, MOVE_END_TURN, MOVE_BANK_TRADE, PHASE_OVER,
+                     RESOURCES, PIPS, NO_PORT, GENERIC_PORT, bits)
+from player import (BUILDS, CARDS, FIELD, GUARDS, HAND_STRIDE, ResourceVector, affordable_packed,
+                    resource_bits)
+
+
+class RandomBot:
+    # picks a random build most of the time, otherwise ends the turn
+    def __init__(self, build_chance=0.9, seed=None):
+        self.build_chance = build_chance
+        self.rng = random.Random(seed)
+
+    def reset(self, seed=None):
+        self.rng.seed(seed)
+
+    def choose_move(self, engine, moves):
+        builds = [m for m in moves if m[0] != MOVE_END_TURN]
+        if builds and (len(builds) == len(moves) or self.rng.random() < self.build_chance):
+            return self.rng.choice(builds)
+        return moves[-1]
+
+
+class GreedyBot(RandomBot):
+    # always builds the most valuable thing it can: city, settlement, then road
+    PRIORITY = {MOVE_CITY: 0, MOVE_SETTLEMENT: 1, MOVE_ROAD: 2, MOVE_END_TURN: 3}
+
+    def choose_move(self, engine, moves):
+        best = min(self.PRIORITY[m[0]] for m in moves)
+        return self.rng.choice([m for m in moves if self.PRIORITY[m[0]] == best])
+
+
+# ---------------------------------------------------------------------------
+# Setup placement
+# ---------------------------------------------------------------------------
+class SetupEvaluator:
+    """
+    Scores nodes for the setup draft. The per-node tables are built once
+    per board (they only depend on the tiles and ports):
+
+      * pips     - expected yield, the pips of each adjacent tile per
+                   resource, with scarce resources on this board worth more
+      * diversity - resources the node adds that the seat has none of yet
+      * port     - a 3:1 port, or a 2:1 port for a resource the seat gets
+
+    score = pip_weight * yield + diversity_weight * new resources + port_weight * port
+    """
+
+    def __init__(self, board, pip_weight=1.0, diversity_weight=2.0, port_weight=1.5):
+        self.board = board
+        self.pip_weight = pip_weight
+        self.diversity_weight = diversity_weight
+        self.port_weight = port_weight
+        topo = board.topology
+        count = len(RESOURCES)
+        # node_pips[n * 5 + r] = pips of resource r touching node n
+        self.node_pips = [0] * (topo.num_nodes * count)
+        totals = [0] * count
+        for t in range(topo.num_tiles):
+            r = board.tile_resource[t]
+            pips = PIPS.get(board.tile_number[t], 0)
+            if r >= count or not pips:
+                continue
+            totals[r] += pips
+            for n in topo.nodes_of_tile(t):
+                self.node_pips[n * count + r] += pips
+        # a resource with half the average pips counts double
+        mean = sum(totals) / count or 1
+        self.weights = [mean / total if total else 0.0 for total in totals]
+        self.base = [sum(w * p for w, p in zip(self.weights, self.node_pips[n * count:(n + 1) * count]))
+                     for n in range(topo.num_nodes)]
+
+    def seat_pips(self, seat):
+        # pips per resource the seat already collects
+        count = len(RESOURCES)
+        board = self.board
+        owned = [0] * count
+        for n in bits(board.seat_settlements[seat] | board.seat_cities[seat]):
+            for r in range(count):
+                owned[r] += self.node_pips[n * count + r] * board.node_building[n]
+        return owned
+
+    def score(self, n, owned):
+        count = len(RESOURCES)
+        pips = self.node_pips[n * count:(n + 1) * count]
+        new = sum(1 for r in range(count) if pips[r] and not owned[r])
+        port = self.board.node_port[n]
+        if port == NO_PORT:
+            port_value = 0.0
+        elif port == GENERIC_PORT:
+            port_value = 0.5
+        else:
+            port_value = (pips[port] + owned[port]) / 5
+        return self.pip_weight * self.base[n] + self.diversity_weight * new + self.port_weight * port_value
+
+    def best_settlement(self, seat, mask):
+        # highest scoring node among the set bits of mask
+        owned = self.seat_pips(seat)
+        return max(bits(mask), key=lambda n: self.score(n, owned))
+
+    def best_road(self, seat, node, mask):
+        # road out of node towards the best spot still open two steps away
+        board = self.board
+        topo = board.topology
+        owned = self.seat_pips(seat)
+        open_nodes = ~board.blocked_nodes
+
+        def lookahead(e):
+            a, b = topo.nodes_of_edge(e)
+            far = b if a == node else a
+            best = 0.0
+            for e2 in topo.edges_of_node(far):
+                for n in topo.nodes_of_edge(e2):
+                    if n != far and open_nodes >> n & 1:
+                        best = max(best, self.score(n, owned))
+            return best
+
+        return max(bits(mask), key=lookahead)
+
+
+# ---------------------------------------------------------------------------
+# Trading
+# ---------------------------------------------------------------------------
+class TradeEvaluator:
+    """
+    Lists the trades that let a hand pay for a build it can't pay for yet.
+
+    A candidate gives rates[r] cards of one resource for one card of another:
+    a seat's board.trade_rates for the bank and its ports, or rates of 1 for
+    one-for-one swaps with other players. Every candidate the hand can give
+    is laid out as a hand of its own in one packed int (the hand repeated,
+    plus each trade's change, the hand itself first) and all of them are
+    checked against every build cost in a single affordable_packed() call.
+    """
+
+    def __init__(self):
+        self._rates = {}  # rates -> packed rates
+        self._tables = {} # (rates, guards of the resources the hand can give) -> candidates
+
+    def _table(self, rates, can_give):
+        # ((give, get), ...), the packed copies of a hand and each candidate's change
+        key = (rates, can_give)
+        if key not in self._tables:
+            pairs = tuple((give, get) for give in range(len(CARDS)) if can_give >> FIELD * (give + 1) - 1 & 1
+                          for get in range(len(CARDS)) if get != give)
+            copies = sum(1 << HAND_STRIDE * i for i in range(len(pairs) + 1))
+            change = sum(resource_bits(get) - resource_bits(give, rates[give]) << HAND_STRIDE * (i + 1)
+                         for i, (give, get) in enumerate(pairs))
+            self._tables[key] = (pairs, copies, change)
+        return self._tables[key]
+
+    def trades(self, hand, rates, wanted=(1 << len(BUILDS)) - 1):
+        """
+        [(give, give_amount, get, get_amount, gained), ...] for a
+        ResourceVector hand, gained the BUILDS bits (among wanted) the trade
+        affords that the hand can't.
+        """
+        packed_rates = self._rates.get(rates)
+        if packed_rates is None:
+            packed_rates = self._rates[rates] = ResourceVector(rates).bits
+        # guard bits left set where the hand has the rate
+        can_give = ((hand.bits | GUARDS) - packed_rates) & GUARDS
+        pairs, copies, change = self._table(rates, can_give)
+        if not pairs:
+            return []
+        afford = affordable_packed(hand.bits * copies + change, len(pairs) + 1)
+        wanted &= ~afford # what the hand already pays for is no gain
+        found = []
+        for i, (give, get) in enumerate(pairs):
+            gained = afford >> len(BUILDS) * (i + 1) & wanted
+            if gained:
+                found.append((give, rates[give], get, 1, gained))
+        return found
+
+
+class TraderBot(GreedyBot):
+    # GreedyBot that trades with the bank (at its ports' rates) when it
+    # can't build anything, for the most valuable build a trade makes
+    # possible that it also has a spot for. It builds that next, so trades
+    # never go round in circles
+    VALUE = {"city": 3, "settlement": 2, "road": 1, "dev_card": 0}
+
+    def __init__(self, build_chance=0.9, seed=None):
+        super().__init__(build_chance, seed)
+        self.evaluator = TradeEvaluator()
+        self._value = [self.VALUE[build] for build in BUILDS]
+
+    def choose_move(self, engine, moves):
+        if moves == [(MOVE_END_TURN,)]:
+            seat = engine.current
+            wanted = engine.placeable(seat)
+            trades = wanted and self.evaluator.trades(engine.players[seat].resource_cards,
+                                                      engine.board.trade_rates(seat), wanted)
+            if trades:
+                value = lambda trade: max(self._value[b] for b in bits(trade[4]))
+                best = max(value(trade) for trade in trades)
+                give, _, get, _, _ = self.rng.choice([t for t in trades if value(t) == best])
+                return (MOVE_BANK_TRADE, give, get)
+        return super().choose_move(engine, moves)
+
+
+# ---------------------------------------------------------------------------
+# Monte Carlo tree search
+# ---------------------------------------------------------------------------
+class _TreeNode:
+    # open loop tree: a node is a sequence of moves from the root, the state
+    # is re-played from the root snapshot every iteration so dice stay random
+    __slots__ = ("visits", "value", "children")
+
+    def __init__(self):
+        self.visits = 0
+        self.value = 0.0 # summed reward of the seat that made the move into this node
+        self.children = {} # move -> _TreeNode
+
+
+class MCTSBot:
+    """
+    UCT search over the headless GameEngine.
+
+    Every iteration restores the root snapshot, walks the tree by UCT, adds
+    one new move, then plays a fast random rollout for rollout_turns turns
+    (or to the end of the game) and scores it: 1 for a win, otherwise the
+    seat's share of the VP needed to win.
+
+    The search stops after `iterations` rollouts or `time_limit` seconds,
+    whichever comes first. With workers > 1 the budget is split over a
+    process pool and the root statistics of the independent trees are
+    summed (root parallel). Use workers=1 when the bot itself already runs
+    inside a simulate() worker.
+
+    last_stats holds the iterations, seconds and sims_per_second of the
+    last search.
+    """
+
+    def __init__(self, iterations=1000, time_limit=None, workers=1,
+                 exploration=1.4, rollout_turns=20, build_chance=0.9, seed=None):
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.workers = workers
+        self.exploration = exploration
+        self.rollout_turns = rollout_turns
+        self.build_chance = build_chance
+        self.rng = random.Random(seed)
+        self.last_stats = {"iterations": 0, "seconds": 0.0, "sims_per_second": 0.0}
+        self._pool = None
+
+    def reset(self, seed=None):
+        self.rng.seed(seed)
+
+    @property
+    def sims_per_second(self):
+        return self.last_stats["sims_per_second"]
+
+    def choose_move(self, engine, moves):
+        if len(moves) == 1:
+            return moves[0]
+        start = time.perf_counter()
+        if self.workers > 1:
+            stats, iterations = self._search_parallel(engine)
+        else:
+            stats, iterations = self.search(engine, self.iterations, self.time_limit, self.rng.getrandbits(32))
+        seconds = time.perf_counter() - start
+        self.last_stats = {"iterations": iterations, "seconds": seconds,
+                           "sims_per_second": iterations / seconds if seconds else 0.0}
+        # most visited root move, among the ones legal right now
+        return max(moves, key=lambda m: stats.get(m, (0, 0.0)))
+
+    def search(self, engine, iterations, time_limit, seed):
+        # run one tree, returns ({move: (visits, value)} at the root, iterations)
+        # the engine is left exactly as it was found
+        rng = random.Random(seed)
+        saved = engine.snapshot(with_rng=True)
+        root_snap = engine.snapshot()
+        # simulated moves aren't part of the game, keep them out of its log
+        game_log, engine.log = engine.log, None
+        root = _TreeNode()
+        deadline = time.perf_counter() + time_limit if time_limit else None
+        if iterations is None and deadline is None:
+            iterations = 1
+        done = 0
+        while (iterations is None or done < iterations) and \
+                (deadline is None or time.perf_counter() < deadline):
+            engine.restore(root_snap)
+            engine.rng.seed(rng.getrandbits(32))
+            self._iterate(engine, root, rng)
+            done += 1
+        engine.restore(saved)
+        engine.log = game_log
+        return {m: (c.visits, c.value) for m, c in root.children.items()}, done
+
+    def _iterate(self, engine, root, rng):
+        node = root
+        path = []
+        log = math.log
+        c = self.exploration
+        # selection / expansion
+        while engine.phase != PHASE_OVER:
+            moves = engine.legal_moves()
+            seat = engine.current
+            untried = [m for m in moves if m not in node.children]
+            if untried:
+                move = rng.choice(untried)
+                node.children[move] = child = _TreeNode()
+                engine.apply(move)
+                path.append((child, seat))
+                break
+            parent_log = log(node.visits or 1)
+            move = max(moves, key=lambda m: node.children[m].value / node.children[m].visits
+                       + c * math.sqrt(parent_log / node.children[m].visits))
+            node = node.children[move]
+            engine.apply(move)
+            path.append((node, seat))
+        # rollout
+        stop = engine.turn + self.rollout_turns
+        build_chance = self.build_chance
+        while engine.phase != PHASE_OVER and engine.turn < stop:
+            moves = engine.legal_moves()
+            if len(moves) > 1 and rng.random() < build_chance:
+                engine.apply(moves[rng.randrange(len(moves) - 1)])
+            else:
+                engine.apply(moves[-1])
+        # backpropagation
+        reward = self._reward(engine)
+        root.visits += 1
+        for child, seat in path:
+            child.visits += 1
+            child.value += reward[seat]
+
+    def _reward(self, engine):
+        if engine.winner is not None:
+            return [1.0 if seat == engine.winner else 0.0 for seat in range(len(engine.players))]
+        goal = engine.vp_to_win
+        return [min(p.victory_points, goal) / goal for p in engine.players]
+
+    def _search_parallel(self, engine):
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.workers)
+        per_worker = None if self.iterations is None else max(1, self.iterations // self.workers)
+        jobs = [(self, engine, per_worker, self.time_limit, self.rng.getrandbits(32))
+                for _ in range(self.workers)]
+        # the workers get a pickled copy of the engine, the game's log (and
+        # its open file) stays here
+        game_log, engine.log = engine.log, None
+        try:
+            trees = self._pool.map(_search_job, jobs)
+        finally:
+            engine.log = game_log
+        stats, total = {}, 0
+        for tree, iterations in trees:
+            total += iterations
+            for move, (visits, value) in tree.items():
+                old_visits, old_value = stats.get(move, (0, 0.0))
+                stats[move] = (old_visits + visits, old_value + value)
+        return stats, total
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def __getstate__(self):
+        # pools don't cross process boundaries
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        return state
+
+
+def _search_job(job):
+    bot, engine, iterations, time_limit, seed = job
+    return bot.search(engine, iterations, time_limit, seed)
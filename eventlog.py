@@ -0,0 +1,429 @@
+# Append-only game event log, replay and a memory-mapped reader
+#
+# A GameEngine with a log records every action as a small fixed-size event:
+# dice rolls, payouts, settlements, roads, cities, trades and turn ends.
+# Every snapshot_every turns it also records a snapshot, the full state as
+# serialize.encode() packs it, and every game starts with one.
+#
+# replay(game, turn) rebuilds the state at the end of any turn. It decodes the
+# last snapshot at or before that turn and plays the events after it back
+# through a GameEngine, so replay time is bounded by snapshot_every turns
+# whatever the length of the game.
+#
+# A game is written out as one block when it ends, so the file only ever
+# grows and a crash loses at most the game in progress:
+#
+#   file        FILE_HEADER, then one block per game
+#   block       GAME_HEADER, one SNAPSHOT_ENTRY per snapshot (the index
+#               replay uses), then the events
+#   event       kind byte + EVENTS[kind] fields, a snapshot event is
+#               followed by its encoded state
+#
+# LogReader maps a log file and walks it block by block, every game's
+# header, snapshot index and events are read straight out of the mapping,
+# so scanning millions of games never loads the file.
+#
+#   python eventlog.py --games 1000 --out games.log    log self-play, then scan it
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+
+import serialize
+from backend import (GameEngine, PHASE_OVER, RESOURCE_CARDS, MOVE_SETTLEMENT, MOVE_ROAD, MOVE_CITY,
+                     MOVE_END_TURN)
+from player import Player
+
+MAGIC   = b"CLOG"
+VERSION = 1
+
+FILE_HEADER    = struct.Struct("<4sB")
+# magic, seats, winner (-1 for none), turns played, snapshots, event bytes
+GAME_HEADER    = struct.Struct("<4sBbHHI")
+GAME_MAGIC     = b"GAME"
+# turn, offset of the snapshot event in the event bytes
+SNAPSHOT_ENTRY = struct.Struct("<HI")
+
+# event kinds
+EV_ROLL       = 1 # dice (die1 << 4 | die2)
+EV_PAYOUT     = 2 # seat, resource, amount
+EV_SETTLEMENT = 3 # seat, node
+EV_ROAD       = 4 # seat, edge
+EV_CITY       = 5 # seat, node
+EV_END        = 6 # seat
+EV_TRADE      = 7 # seat, partner (-1 for the bank), gives resource, amount, gets resource, amount
+EV_SNAPSHOT   = 8 # turn, state size, then the state
+
+EVENT_NAMES = {EV_ROLL: "roll", EV_PAYOUT: "payout", EV_SETTLEMENT: "settlement",
+               EV_ROAD: "road", EV_CITY: "city", EV_END: "end", EV_TRADE: "trade",
+               EV_SNAPSHOT: "snapshot"}
+
+# kind -> struct of the whole event, kind byte included
+EVENTS = {
+    EV_ROLL:       struct.Struct("<BB"),
+    EV_PAYOUT:     struct.Struct("<BBBB"),
+    EV_SETTLEMENT: struct.Struct("<BBH"),
+    EV_ROAD:       struct.Struct("<BBH"),
+    EV_CITY:       struct.Struct("<BBH"),
+    EV_END:        struct.Struct("<BB"),
+    EV_TRADE:      struct.Struct("<BBbBBBB"),
+    EV_SNAPSHOT:   struct.Struct("<BHI"),
+}
+
+
+class EventLog:
+    """
+    Records the games of the engines it is given to (GameEngine(log=...)).
+    With a path every finished game is appended to that file, without one
+    the log only keeps the last finished block (last_block), e.g. for
+    handing games back from simulation workers.
+    """
+
+    def __init__(self, path=None, snapshot_every=10):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.last_block = None
+        self._file = None
+        self._events = None # bytearray of the game in progress
+        self._engine = None # the engine playing it
+        self._opened = 0 # length of the events once the opening snapshot is in
+        self._snapshots = []
+        self._pending = 0 # start of the events pending() hasn't returned yet
+        self._tail = b"" # what pending() still owes from the last finished game
+        if path is not None:
+            self._file = open(path, "ab")
+            if self._file.tell() == 0:
+                self._file.write(FILE_HEADER.pack(MAGIC, VERSION))
+
+    # -----------------------------------------------------------------------
+    # engine hooks
+    # -----------------------------------------------------------------------
+    def begin_game(self, engine):
+        # a new game on the engine. An unfinished previous game is kept, closed
+        # with the state of the engine that played it (GameEngine.reset
+        # closes its own game before it clears the board)
+        if self._events is not None:
+            self.end_game(self._engine)
+        self._engine = engine
+        self._events = bytearray()
+        self._snapshots = []
+        self._pending = 0
+        self.snapshot(engine)
+        self._opened = len(self._events)
+
+    def end_game(self, engine):
+        # close the game in progress and write its block, returns the block.
+        # A game nothing happened in is dropped without a block (an engine
+        # given the log is reset before its first game is played)
+        if self._events is None:
+            return None
+        if len(self._events) == self._opened:
+            self._events = None
+            self._tail = b""
+            return None
+        header = GAME_HEADER.pack(GAME_MAGIC, len(engine.players),
+                                  -1 if engine.winner is None else engine.winner,
+                                  engine.turn, len(self._snapshots), len(self._events))
+        block = b"".join([header] + [SNAPSHOT_ENTRY.pack(*entry) for entry in self._snapshots]
+                         + [self._events])
+        self._tail = bytes(self._events[self._pending:])
+        self._events = None
+        self.last_block = block
+        if self._file is not None:
+            self._file.write(block)
+        return block
+
+    def snapshot(self, engine):
+        state = serialize.encode(engine)
+        self._snapshots.append((engine.turn, len(self._events)))
+        self._events += EVENTS[EV_SNAPSHOT].pack(EV_SNAPSHOT, engine.turn, len(state))
+        self._events += state
+
+    def turn_started(self, engine):
+        # snapshot_every=0 keeps only the opening snapshot
+        if self.snapshot_every and engine.turn % self.snapshot_every == 0:
+            self.snapshot(engine)
+
+    def roll(self, dice):
+        self._events += EVENTS[EV_ROLL].pack(EV_ROLL, dice[0] << 4 | dice[1])
+
+    def payout(self, seat, resource, amount):
+        self._events += EVENTS[EV_PAYOUT].pack(EV_PAYOUT, seat, resource, amount)
+
+    def settlement(self, seat, node):
+        self._events += EVENTS[EV_SETTLEMENT].pack(EV_SETTLEMENT, seat, node)
+
+    def road(self, seat, edge):
+        self._events += EVENTS[EV_ROAD].pack(EV_ROAD, seat, edge)
+
+    def city(self, seat, node):
+        self._events += EVENTS[EV_CITY].pack(EV_CITY, seat, node)
+
+    def end(self, seat):
+        self._events += EVENTS[EV_END].pack(EV_END, seat)
+
+    def trade(self, seat, partner, give, give_amount, get, get_amount):
+        # resources as RESOURCES indexes, partner None for the bank
+        self._events += EVENTS[EV_TRADE].pack(EV_TRADE, seat, -1 if partner is None else partner,
+                                              give, give_amount, get, get_amount)
+
+    def pending(self):
+        # the events of the game in progress recorded since the last call,
+        # for streaming a game to other machines as it's played (server.py)
+        if self._events is None:
+            events, self._tail = self._tail, b""
+            return events
+        events = bytes(self._events[self._pending:])
+        self._pending = len(self._events)
+        return events
+
+    # -----------------------------------------------------------------------
+    def write_block(self, block):
+        # append a block finished elsewhere (another process's log)
+        self._file.write(block)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------------------------------------------------------
+# reading
+# ---------------------------------------------------------------------------
+def iter_events(buf, start=0):
+    # yields (kind, fields, offset after the event) for a run of events; for
+    # a snapshot the fields are (turn, state), state a view of the encoded state
+    buf = memoryview(buf)
+    offset = start
+    while offset < len(buf):
+        kind = buf[offset]
+        event = EVENTS[kind]
+        fields = event.unpack_from(buf, offset)[1:]
+        offset += event.size
+        if kind == EV_SNAPSHOT:
+            turn, size = fields
+            fields = (turn, buf[offset:offset + size])
+            offset += size
+        yield kind, fields, offset
+
+
+class LoggedGame:
+    """One game's block, read in place from a bytes-like buffer."""
+
+    def __init__(self, buf, offset=0):
+        buf = memoryview(buf)
+        magic, self.seats, winner, self.turns, snapshots, size = GAME_HEADER.unpack_from(buf, offset)
+        if magic != GAME_MAGIC:
+            raise ValueError(f"no game block at offset {offset}")
+        self.winner = None if winner < 0 else winner
+        index = offset + GAME_HEADER.size
+        self.snapshots = [SNAPSHOT_ENTRY.unpack_from(buf, index + i * SNAPSHOT_ENTRY.size)
+                          for i in range(snapshots)]
+        start = index + snapshots * SNAPSHOT_ENTRY.size
+        self.events_bytes = buf[start:start + size]
+        self.end = start + size # offset of the next block
+        if len(self.events_bytes) != size:
+            raise ValueError("truncated game block")
+
+    def events(self, start=0):
+        return iter_events(self.events_bytes, start)
+
+    def initial(self):
+        # StateView of the state the game started from
+        return serialize.StateView(self._state_at(0))
+
+    def _state_at(self, offset):
+        event = EVENTS[EV_SNAPSHOT]
+        _, _, size = event.unpack_from(self.events_bytes, offset)
+        return self.events_bytes[offset + event.size:offset + event.size + size]
+
+
+def replay(game, turn=None):
+    """
+    GameEngine holding the state at the end of `turn` (every action of that
+    turn played, its end not yet), or at the end of the game when turn is
+    None or past it. game is a LoggedGame or a block's bytes.
+    """
+    if not isinstance(game, LoggedGame):
+        game = LoggedGame(game)
+    target = game.turns if turn is None else turn
+    # the last snapshot at or before the turn (the first one is turn 0)
+    start = game.snapshots[0][1]
+    for snap_turn, offset in game.snapshots:
+        if snap_turn > target:
+            break
+        start = offset
+    engine = serialize.decode(game._state_at(start))
+    engine.auto_roll = False
+
+    events = game.events(start)
+    next(events) # the snapshot itself
+    for kind, fields, _ in events:
+        if kind == EV_END and engine.turn == target:
+            break
+        apply_event(engine, kind, fields)
+    return engine
+
+
+def apply_events(engine, buf):
+    """
+    Play a run of events (e.g. what EventLog.pending() returned on another
+    machine) onto an engine with auto_roll off that is at the point they
+    start from.
+    """
+    for kind, fields, _ in iter_events(buf):
+        apply_event(engine, kind, fields)
+
+
+def apply_event(engine, kind, fields):
+    if kind == EV_END:
+        engine.end_turn()
+    elif kind == EV_ROLL:
+        engine.roll_dice((fields[0] >> 4, fields[0] & 15))
+    elif kind == EV_SETTLEMENT:
+        engine.build_settlement(fields[1])
+    elif kind == EV_ROAD:
+        engine.build_road(fields[1])
+    elif kind == EV_CITY:
+        engine.build_city(fields[1])
+    elif kind == EV_TRADE:
+        _move_cards(engine, *fields)
+    # payouts follow from the rolls and settlements, snapshots from
+    # everything else
+
+
+def event_move(kind, fields):
+    # (seat, move) for an event a player's move logs (the move as
+    # GameEngine.apply() takes it), None for the rest
+    if kind == EV_END:
+        return fields[0], (MOVE_END_TURN,)
+    if kind in _MOVE_EVENTS:
+        return fields[0], (_MOVE_EVENTS[kind], fields[1])
+    return None
+
+
+_MOVE_EVENTS = {EV_SETTLEMENT: MOVE_SETTLEMENT, EV_ROAD: MOVE_ROAD, EV_CITY: MOVE_CITY}
+
+
+def _move_cards(engine, seat, partner, give, give_amount, get, get_amount):
+    give_card = RESOURCE_CARDS[give]
+    get_card = RESOURCE_CARDS[get]
+    player = engine.players[seat]
+    player.collect(give_card, -give_amount)
+    player.collect(get_card, get_amount)
+    if partner >= 0:
+        other = engine.players[partner]
+        other.collect(give_card, give_amount)
+        other.collect(get_card, -get_amount)
+
+
+class LogReader:
+    """
+    Memory-mapped log file. Iterating yields a LoggedGame per block, each
+    reading from the mapping, nothing is copied until asked for.
+    """
+
+    def __init__(self, path):
+        self._fileobj = open(path, "rb")
+        self._map = mmap.mmap(self._fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = FILE_HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a game log")
+        if version != VERSION:
+            raise ValueError(f"unsupported log version {version}")
+
+    def __iter__(self):
+        # the games read from the mapping, don't keep them past close()
+        buf = memoryview(self._map)
+        offset = FILE_HEADER.size
+        while offset < len(buf):
+            game = LoggedGame(buf, offset)
+            offset = game.end
+            yield game
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            pass # games still read from the mapping, it goes away with them
+        self._fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------------------------------------------------------
+# benchmark / example scan
+# ---------------------------------------------------------------------------
+def main():
+    from bots import RandomBot, GreedyBot
+    from main import setup
+
+    parser = argparse.ArgumentParser(description="Log self-play games, then scan and replay them")
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--out", default="games.log")
+    parser.add_argument("--snapshot-every", type=int, default=10)
+    parser.add_argument("--max-turns", type=int, default=500)
+    args = parser.parse_args()
+
+    policies = [GreedyBot(), GreedyBot(), RandomBot(), RandomBot()]
+    with EventLog(args.out, args.snapshot_every) as log:
+        engine = GameEngine([Player(None, f"Bot {i + 1}") for i in range(len(policies))])
+        engine.log = log
+        start = time.perf_counter()
+        for game in range(args.games):
+            engine.reset(game)
+            for i, policy in enumerate(policies):
+                policy.reset(game + i)
+            setup(engine)
+            while engine.phase != PHASE_OVER and engine.turn < args.max_turns:
+                engine.apply(policies[engine.current].choose_move(engine, engine.legal_moves()))
+            log.end_game(engine)
+        print(f"played and logged {args.games} games in {time.perf_counter() - start:.2f}s")
+
+    # the kind of scan an analysis would do: dice and builds over every game
+    start = time.perf_counter()
+    rolls = [0] * 13
+    builds = {EV_SETTLEMENT: 0, EV_ROAD: 0, EV_CITY: 0}
+    wins = [0] * len(policies)
+    games = events = 0
+    with LogReader(args.out) as reader:
+        for game in reader:
+            games += 1
+            if game.winner is not None:
+                wins[game.winner] += 1
+            for kind, fields, _ in game.events():
+                events += 1
+                if kind == EV_ROLL:
+                    rolls[(fields[0] >> 4) + (fields[0] & 15)] += 1
+                elif kind in builds:
+                    builds[kind] += 1
+        scan = time.perf_counter() - start
+        print(f"scanned {games} games, {events} events in {scan:.2f}s ({events / scan:,.0f} events/s)")
+        print(f"  rolls 2-12: {rolls[2:]}")
+        print(f"  builds: " + ", ".join(f"{EVENT_NAMES[k]} {v}" for k, v in builds.items()))
+        print(f"  wins per seat: {wins}")
+
+        # replay a random turn of every game
+        rng = random.Random(0)
+        start = time.perf_counter()
+        for game in reader:
+            replay(game, rng.randint(0, game.turns))
+        print(f"replayed a random turn of each game in {(time.perf_counter() - start) / games * 1000:.2f} ms/game")
+    print(f"{os.path.getsize(args.out) / games:.0f} bytes per game")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+# Fixed-shape feature arrays for training policy / value networks
+#
+# FeatureExtractor turns a batch of game states into float32 arrays with the
+# same shape for every state of a layout and player count:
+#
+#   tiles    (B, tiles, 7)            terrain one-hot (TERRAINS order), pips / 36
+#   nodes    (B, nodes, 2P + 11)      per seat a settlement and a city plane,
+#                                     port one-hot (RESOURCES then 3:1), pips
+#                                     / 36 of each resource around the node
+#   edges    (B, edges, P)            per seat a road plane
+#   players  (B, P, 10)               cards (RESOURCES order), victory points,
+#                                     roads, settlements, cities left, dev cards
+#   globals  (B, 5 + P)               phase one-hot, turn / max_turns, dice
+#                                     total / 12 (0 before the first roll),
+#                                     longest road one-hot per seat
+#
+# pips / 36 is the chance a tile pays out on a roll. With perspective on
+# (the default) seats are counted from the player to move, so seat 0 is
+# always "me" whoever's turn it is. max_turns should be the turn cap the
+# training games were played with (simulate's default is 500).
+#
+# It reads serialize.encode() states, the form training positions are stored
+# in, not GameEngines. A batch is stacked into one uint8 array and every
+# section is unpacked for all states at once: nibbles are split with shifts,
+# planes are rows of lookup tables built once per extractor and the per-node
+# production is a matmul with the layout's node x tile incidence matrix.
+# The only python loop is over seats (a player's dev cards move the next
+# player's section along).
+#
+#   python features.py --batch 4096     states per second
+import argparse
+import time
+
+import numpy as np
+
+import serialize
+from backend import RESOURCES, TERRAINS, PIPS, PHASE_OVER, GameEngine, standard_topology
+from player import Player, CARDS
+
+CHANNELS_TILE   = len(TERRAINS) + 1
+CHANNELS_PLAYER = len(RESOURCES) + 5
+PORT_KINDS      = len(RESOURCES) + 1
+
+# serialize.HEADER as a numpy record, to read every state's header in one view
+HEADER_DTYPE = np.dtype([("magic", "S2"), ("version", "u1"), ("flags", "u1"), ("seats", "u1"),
+                         ("phase", "u1"), ("current", "u1"), ("turn", "<u2"), ("dice", "u1"),
+                         ("winner", "i1"), ("longest", "i1"), ("setup_step", "u1"),
+                         ("setup_node", "<u2"), ("vp_to_win", "u1"), ("tiles", "<u2"),
+                         ("nodes", "<u2"), ("edges", "<u2"), ("ports", "<u2")])
+assert HEADER_DTYPE.itemsize == serialize.HEADER.size
+PLAYER_DTYPE = np.dtype([("vp", "u1"), ("cards", "<u2", len(RESOURCES)), ("roads", "u1"),
+                         ("settlements", "u1"), ("cities", "u1"), ("devs", "u1")])
+assert PLAYER_DTYPE.itemsize == serialize.PLAYER.size
+# stored cards (serialize.WIRE_CARDS) -> RESOURCES order
+_FROM_WIRE = [serialize.WIRE_CARDS.index(card) for card in CARDS]
+
+# tile byte (resource << 4 | number) -> its tile features, and -> the pips / 36
+# it adds to each resource on the nodes around it
+_TILE_FEATURES = np.zeros((256, CHANNELS_TILE), dtype=np.float32)
+_TILE_YIELD    = np.zeros((256, len(RESOURCES)), dtype=np.float32)
+for _b in range(256):
+    _terrain, _weight = _b >> 4, PIPS.get(_b & 15, 0) / 36
+    if _terrain < len(TERRAINS):
+        _TILE_FEATURES[_b, _terrain] = 1
+        _TILE_FEATURES[_b, -1] = _weight
+    if _terrain < len(RESOURCES):
+        _TILE_YIELD[_b, _terrain] = _weight
+
+
+def stack(states):
+    """
+    Encoded states (bytes-likes) as one (B, longest) uint8 array, shorter
+    ones padded with zeros.
+    """
+    sizes = np.fromiter((len(s) for s in states), dtype=np.intp, count=len(states))
+    if len(sizes) and (sizes == sizes[0]).all():
+        return np.frombuffer(b"".join(states), dtype=np.uint8).reshape(len(states), sizes[0])
+    out = np.zeros((len(states), sizes.max(initial=0)), dtype=np.uint8)
+    for row, s in zip(out, states):
+        row[:len(s)] = np.frombuffer(s, dtype=np.uint8)
+    return out
+
+
+class Features:
+    """The arrays of one batch, see the layout at the top."""
+    __slots__ = ("tiles", "nodes", "edges", "players", "globals")
+
+    def __init__(self, tiles, nodes, edges, players, globals):
+        self.tiles = tiles
+        self.nodes = nodes
+        self.edges = edges
+        self.players = players
+        self.globals = globals
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def flat(self):
+        # everything as one (B, features) array, for networks without structure
+        return np.concatenate([a.reshape(len(a), -1) for a in
+                               (self.tiles, self.nodes, self.edges, self.players, self.globals)], axis=1)
+
+
+class FeatureExtractor:
+    """
+    Features for states of one layout (a BoardTopology, the standard board
+    when None) and player count. Raises ValueError for states that aren't
+    of that layout or player count.
+    """
+
+    def __init__(self, seats=4, topology=None, perspective=True, max_turns=500):
+        topo = standard_topology() if topology is None else topology
+        self.topology = topo
+        self.seats = seats
+        self.perspective = perspective
+        self.max_turns = max_turns
+        self.num_tiles, self.num_nodes, self.num_edges = topo.num_tiles, topo.num_nodes, topo.num_edges
+
+        # index maps: node x tile incidence, so the production around every
+        # node of a batch is one matmul
+        self.node_tiles = np.zeros((topo.num_nodes, topo.num_tiles), dtype=np.float32)
+        for n in range(topo.num_nodes):
+            self.node_tiles[n, list(topo.tiles_of_node(n))] = 1
+
+        # lookup tables, one row per (player to move, nibble) for edges, per
+        # (player to move, nibble, port) for nodes: the planes the code lights
+        # up, for a node its ownership and port planes together. Without
+        # perspective only the player to move 0 rows (seats as they are) are used
+        ports = PORT_KINDS + 1 # the last one for no port
+        self._node_planes = np.zeros((seats, 16, ports, 2 * seats + PORT_KINDS), dtype=np.float32)
+        self._edge_planes = np.zeros((seats, 16, seats), dtype=np.float32)
+        for current in range(seats):
+            for seat in range(seats):
+                plane = (seat - current) % seats
+                self._node_planes[current, 1 + seat * 2, :, plane * 2]     = 1 # settlement
+                self._node_planes[current, 2 + seat * 2, :, plane * 2 + 1] = 1 # city
+                self._edge_planes[current, 1 + seat, plane] = 1
+        for kind in range(PORT_KINDS):
+            self._node_planes[:, :, kind, 2 * seats + kind] = 1
+        self._node_planes = self._node_planes.reshape(-1, 2 * seats + PORT_KINDS)
+        self._edge_planes = self._edge_planes.reshape(-1, seats)
+
+        # state sections, as serialize lays them out
+        standard = serialize._is_standard(topo)
+        self.flags = 0 if standard else serialize.FLAG_LAYOUT
+        self.layout = b"" if standard else b"".join(serialize.COORD.pack(*xyz) for xyz in topo.tile_ids)
+        self._tiles = serialize.HEADER.size + len(self.layout)
+        self._nodes = self._tiles + topo.num_tiles
+        self._edges = self._nodes + (topo.num_nodes + 1) // 2
+        self._ports = self._edges + (topo.num_edges + 1) // 2
+        self._port_nodes = {} # port count -> (ports, 2) nodes each port is on
+
+    def port_nodes(self, count):
+        if count not in self._port_nodes:
+            edges = self.topology.port_edges(count) if count else []
+            self._port_nodes[count] = np.array([self.topology.nodes_of_edge(e) for e in edges],
+                                               dtype=np.intp).reshape(count, 2)
+        return self._port_nodes[count]
+
+    # -----------------------------------------------------------------------
+    def extract(self, states):
+        """Features of a batch: a list of encoded states, or stack()'s array of them."""
+        data = states if isinstance(states, np.ndarray) else stack(states)
+        batch = len(data)
+        header = self._check(data)
+        seats = self.seats
+        num_ports = int(header["ports"][0]) if batch else 0
+        mover = header["current"].astype(np.intp) if self.perspective else np.zeros(batch, dtype=np.intp)
+
+        # tiles: one row of the tile table per byte
+        tile_bytes = data[:, self._tiles:self._nodes]
+        tiles = np.take(_TILE_FEATURES, tile_bytes, axis=0)
+
+        # nodes: ownership and port planes from the nibbles (1 + seat * 2 +
+        # building - 1, 0 when empty) and the port kinds, then the production
+        # of the tiles around
+        port = np.full((batch, self.num_nodes), PORT_KINDS, dtype=np.intp)
+        if num_ports:
+            kinds = data[:, self._ports:self._ports + num_ports]
+            port_nodes = self.port_nodes(num_ports)
+            port[:, port_nodes[:, 0]] = kinds
+            port[:, port_nodes[:, 1]] = kinds
+        codes = _nibbles(data[:, self._nodes:self._edges], self.num_nodes)
+        planes = (mover[:, None] * 16 + codes) * (PORT_KINDS + 1) + port
+        nodes = np.empty((batch, self.num_nodes, 2 * seats + PORT_KINDS + len(RESOURCES)), dtype=np.float32)
+        nodes[..., :-len(RESOURCES)] = np.take(self._node_planes, planes, axis=0)
+        nodes[..., -len(RESOURCES):] = np.matmul(self.node_tiles, np.take(_TILE_YIELD, tile_bytes, axis=0))
+
+        # edges: seat + 1 per nibble, 0 when empty
+        codes = _nibbles(data[:, self._edges:self._ports], self.num_edges)
+        edges = np.take(self._edge_planes, mover[:, None] * 16 + codes, axis=0)
+
+        # players: a section each, moved along by the dev cards before it
+        offset = np.full(batch, self._ports + num_ports, dtype=np.intp)
+        columns = offset[:, None] + np.arange(PLAYER_DTYPE.itemsize)
+        players = np.empty((batch, seats, CHANNELS_PLAYER), dtype=np.float32)
+        for seat in range(seats):
+            record = np.take_along_axis(data, columns, axis=1).copy().view(PLAYER_DTYPE)[:, 0]
+            players[:, seat, :len(RESOURCES)] = record["cards"][:, _FROM_WIRE]
+            players[:, seat, len(RESOURCES):] = np.stack(
+                [record["vp"], record["roads"], record["settlements"], record["cities"], record["devs"]], axis=1)
+            columns += PLAYER_DTYPE.itemsize + record["devs"][:, None]
+        if self.perspective:
+            order = (mover[:, None] + np.arange(seats)) % seats
+            players = np.take_along_axis(players, order[..., None], axis=1)
+
+        # globals
+        dice = header["dice"]
+        longest = header["longest"].astype(np.intp)
+        longest = np.where(longest >= 0, (longest - mover) % seats, -1)
+        globals_ = np.concatenate([
+            header["phase"][:, None] == np.arange(len(serialize.PHASES)),
+            header["turn"][:, None] / np.float32(self.max_turns),
+            ((dice >> 4) + (dice & 15))[:, None] / np.float32(12),
+            longest[:, None] == np.arange(seats),
+        ], axis=1, dtype=np.float32)
+        return Features(tiles, nodes, edges, players, globals_)
+
+    __call__ = extract
+
+    def from_engines(self, engines):
+        return self.extract([serialize.encode(engine) for engine in engines])
+
+    def _check(self, data):
+        header = data[:, :serialize.HEADER.size].copy().view(HEADER_DTYPE)[:, 0]
+        if not len(data):
+            return header
+        if (header["magic"] != serialize.MAGIC).any() or (header["version"] != serialize.VERSION).any():
+            raise ValueError("not a batch of encoded game states")
+        expected = {"flags": self.flags, "seats": self.seats, "tiles": self.num_tiles,
+                    "nodes": self.num_nodes, "edges": self.num_edges, "ports": header["ports"][0]}
+        for field, value in expected.items():
+            if (header[field] != value).any():
+                raise ValueError(f"states don't match the extractor's layout and seats ({field})")
+        if self.layout and (data[:, serialize.HEADER.size:self._tiles] != np.frombuffer(self.layout, np.uint8)).any():
+            raise ValueError("states are of a different board layout")
+        return header
+
+
+def _nibbles(packed, count):
+    # (B, bytes) packed low nibble first -> (B, count) values
+    out = np.empty((len(packed), packed.shape[1] * 2), dtype=np.uint8)
+    out[:, 0::2] = packed & 15
+    out[:, 1::2] = packed >> 4
+    return out[:, :count]
+
+
+# ---------------------------------------------------------------------------
+# speed report
+# ---------------------------------------------------------------------------
+def main():
+    from bots import RandomBot
+    from main import setup
+
+    parser = argparse.ArgumentParser(description="Feature extraction speed")
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--games", type=int, default=20, help="self-play games the positions come from")
+    parser.add_argument("--batch", type=int, default=4096)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    states = []
+    for game in range(args.games):
+        engine = GameEngine([Player(None, f"Bot {i + 1}") for i in range(args.players)], seed=game)
+        setup(engine)
+        bot = RandomBot(seed=game)
+        while engine.phase != PHASE_OVER and engine.turn < 200:
+            engine.apply(bot.choose_move(engine, engine.legal_moves()))
+            states.append(serialize.encode(engine))
+    rng = np.random.default_rng(0)
+    batch = [states[i] for i in rng.integers(len(states), size=args.batch)]
+
+    extractor = FeatureExtractor(args.players)
+    data = stack(batch)
+    for name, arg in (("from bytes", batch), ("from a stacked array", data)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            features = extractor(arg)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        print(f"{name}: {args.batch / elapsed:,.0f} states/s ({elapsed * 1000:.1f} ms a batch)")
+    print(f"{features.flat().shape[1]} features a state: tiles {features.tiles.shape[1:]}, "
+          f"nodes {features.nodes.shape[1:]}, edges {features.edges.shape[1:]}, "
+          f"players {features.players.shape[1:]}, globals {features.globals.shape[1:]}")
+
+
+if __name__ == "__main__":
+    main()
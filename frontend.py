@@ -1,13 +1,29 @@
+import time
+START_TIME = time.perf_counter()   # before the heavy imports, for the cold start measurement
+
+import argparse
 import arcade
+import arcade.shape_list
 import math
 import os
+from collections import OrderedDict
+import numpy as np
 import pyglet
-from backend import CatanBoard
+import assets
+import serialize
+from eventlog import EventLog, EV_PAYOUT, EV_SNAPSHOT, iter_events, apply_event, event_move
+from backend import (GameEngine, PHASE_OVER, PIPS, MOVE_SETTLEMENT, MOVE_ROAD,
+                     MOVE_END_TURN, load_map)
+from netclient import NetClient, LocalServer, MSG_CLOSED
+from server import ACK, MSG_START, MSG_DELTA, MSG_ACK
+from player import Player, BUILDS
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # ---------------------------------------------------------------------------
 # Window Size  -  Trying to make it wider not taller for laptops
+# This is the design size: the window can be resized, the board is fitted
+# to it (then zoomed/panned by the player) and the HUD scaled with it
 # ---------------------------------------------------------------------------
 SCREEN_WIDTH  = 1280
 SCREEN_HEIGHT = 680
@@ -39,7 +55,6 @@ DICE_AREA_HEIGHT  = 110
 # Sprite / icon settings
 # ---------------------------------------------------------------------------
 ICON_SIZE    = 22           # smaller icons to fit single-column panel (22)
-SPRITE_SCALE = ICON_SIZE / 512
 
 RESOURCE_SPRITES = {
     "brick":  os.path.join(BASE_DIR, "sprites", "BW_icons", "brick-pile.png"),
@@ -50,6 +65,39 @@ RESOURCE_SPRITES = {
 }
 
 PORT_SHIP_SPRITE = os.path.join(BASE_DIR, "sprites", "ports", "galley_ship.png")
+PORT_SHIP_SIZE   = 36       # 512px art at the old 0.07 sprite scale
+
+# Big art we're moving to (tile faces, cards) — not needed for the first frame,
+# so it loads in the background and is ready by the time anything draws it
+HEX_ART = {
+    "brick":  os.path.join(BASE_DIR, "sprites", "hexes", "300dpi", "hill.png"),
+    "ore":    os.path.join(BASE_DIR, "sprites", "hexes", "300dpi", "mountain.png"),
+    "wheat":  os.path.join(BASE_DIR, "sprites", "hexes", "300dpi", "field.png"),
+    "sheep":  os.path.join(BASE_DIR, "sprites", "hexes", "300dpi", "pasture.png"),
+    "forest": os.path.join(BASE_DIR, "sprites", "hexes", "300dpi", "forest.png"),
+    "desert": os.path.join(BASE_DIR, "sprites", "hexes", "300dpi", "desert.png"),
+}
+BUILDING_COST_CARD = os.path.join(BASE_DIR, "sprites", "special_cards", "300dpi_masked", "building_cost-- 5.png")
+CARD_SIZE = (160, 198)
+
+# ---------------------------------------------------------------------------
+# Texture atlases (see assets.py) — every image at the size it is drawn at.
+# "first_frame" loads before the window opens, "art" on a background thread
+# ---------------------------------------------------------------------------
+ASSET_GROUPS = {
+    "first_frame": {
+        "background": (BACKGROUND_IMAGE, (SCREEN_WIDTH, SCREEN_HEIGHT), "cover"),
+        "ship":       (PORT_SHIP_SPRITE, (PORT_SHIP_SIZE, PORT_SHIP_SIZE), "contain"),
+        **{f"icon_{res}": (path, (ICON_SIZE, ICON_SIZE), "contain") for res, path in RESOURCE_SPRITES.items()},
+    },
+    "art": {
+        **{f"hex_{res}": (path, (2 * HEX_SIZE, 2 * HEX_SIZE), "contain") for res, path in HEX_ART.items()},
+        "building_cost": (BUILDING_COST_CARD, CARD_SIZE, "contain"),
+    },
+}
+
+# Cold start (process start -> first frame drawn) should stay under this
+STARTUP_BUDGET = 1.5   # seconds
 
 # ---------------------------------------------------------------------------
 # Colors in HUD
@@ -92,92 +140,140 @@ RESOURCE_ABBR = {
 NUMBER_POOL = [2, 3, 3, 4, 4, 5, 5, 6, 6, 8, 8, 9, 9, 10, 10, 11, 11, 12]
 
 # ---------------------------------------------------------------------------
-# Port types assigned clockwise from the top around the board perimeter.
-# None = 3:1 generic port, string = 2:1 specific resource port.
-# The 9 slots are spaced evenly among the ~18 outer edges automatically.
-PORT_TYPES = ["ore", None, "wheat", None, None, "brick", None, "sheep", "forest"]
-
-# ---------------------------------------------------------------------------
-# Build choices
+# Build choices  (same strings as the backend's move kinds)
+# Costs live in player.py
 # ---------------------------------------------------------------------------
 BUILD_NONE       = None
 BUILD_SETTLEMENT = "settlement"
 BUILD_ROAD       = "road"
 
-# ---------------------------------------------------------------------------
-# Costs
-# ---------------------------------------------------------------------------
-SETTLEMENT_COST = {"brick": 1, "forest": 1, "wheat": 1, "sheep": 1}
-ROAD_COST       = {"brick": 1, "forest": 1}
-
 # Snap radii (pixels)
 NODE_SNAP_RADIUS = 18
 EDGE_SNAP_RADIUS = 14
 
+# Zoom / pan — scroll wheel zooms about the cursor, right or middle drag pans
+ZOOM_MIN  = 0.5
+ZOOM_MAX  = 3.0
+ZOOM_STEP = 1.15      # per wheel click
+UI_SCALE_MIN = 0.5    # HUD never shrinks below half size on small screens
+
 # ---------------------------------------------------------------------------
-# Placeholder players
+# Draw layers, back to front. Each one is rebuilt only after it is invalidated
+# ---------------------------------------------------------------------------
+LAYER_BOARD      = "board"        # hexes, tokens, ports
+LAYER_PIECES     = "pieces"       # roads, settlements, cities
+LAYER_HIGHLIGHTS = "highlights"   # legal build spots, hover
+LAYER_HUD        = "hud"          # panels, buttons, menus, popup
+LAYERS = (LAYER_BOARD, LAYER_PIECES, LAYER_HIGHLIGHTS, LAYER_HUD)
+
+# ---------------------------------------------------------------------------
+# Seats — display info only, the game state lives in the GameEngine
 # ---------------------------------------------------------------------------
 PLAYERS = [
-    {"name": "Player 1", "color": (231, 76,  60),  "resources": {"brick": 2, "ore": 0, "wheat": 1, "sheep": 1, "forest": 2}, "vp": 0},
-    {"name": "Player 2", "color": (39,  174, 96),  "resources": {"brick": 2, "ore": 0, "wheat": 1, "sheep": 1, "forest": 2}, "vp": 0},
-    {"name": "Player 3", "color": (219, 118, 51),  "resources": {"brick": 2, "ore": 0, "wheat": 1, "sheep": 1, "forest": 2}, "vp": 0},
-    {"name": "Player 4", "color": (142, 68,  173), "resources": {"brick": 2, "ore": 0, "wheat": 1, "sheep": 1, "forest": 2}, "vp": 0},
+    {"name": "Player 1", "color": (231, 76,  60)},
+    {"name": "Player 2", "color": (39,  174, 96)},
+    {"name": "Player 3", "color": (219, 118, 51)},
+    {"name": "Player 4", "color": (142, 68,  173)},
 ]
 
 
 # ===========================================================================
-# Coordinate helpers
+# Board geometry
 # ===========================================================================
-def cubic_to_pixel(cx, cz, hex_size=HEX_SIZE, origin_x=BOARD_CENTER_X, origin_y=BOARD_CENTER_Y):
-    px = origin_x + hex_size * (3 / 2) * cx
-    py = origin_y + hex_size * (math.sqrt(3) / 2 * cx + math.sqrt(3) * cz)
-    return px, py
-
-def node_to_pixel(node_id, hex_size=HEX_SIZE, origin_x=BOARD_CENTER_X, origin_y=BOARD_CENTER_Y):
-    fx, fy, fz = node_id
-    px = origin_x + hex_size * (3 / 2) * fx
-    py = origin_y + hex_size * (math.sqrt(3) / 2 * fx + math.sqrt(3) * fz)
-    return px, py
-
-def get_hex_corners(center_x, center_y, size):
-    corners = []
-    for i in range(6):
-        angle_rad = math.radians(60 * i)
-        corners.append((center_x + size * math.cos(angle_rad),
-                         center_y + size * math.sin(angle_rad)))
-    return corners
+# cube (x, y, z) -> 2D in hex sizes, the same projection as BoardTopology.node_xy
+CUBE_TO_XY = np.array([[1.5, math.sqrt(3) / 2],
+                       [0.0, 0.0],
+                       [0.0, math.sqrt(3)]])
+
+# flat-top hex corners around (0, 0) for a hex of size 1
+HEX_CORNERS = np.array([(math.cos(math.radians(60 * i)), math.sin(math.radians(60 * i))) for i in range(6)])
+
+
+class BoardGeometry:
+    """
+    World-space positions of everything on the board, indexed like the
+    topology (tile / node / edge index), worked out in one vectorized pass
+    over the coordinate arrays.  World space is the design-size window
+    (SCREEN_WIDTH x SCREEN_HEIGHT); resizing, zoom and pan are camera
+    transforms on the GPU, so none of this is recomputed for them.
+
+      tile_xy     (tiles, 2)     hex centers
+      hex_corners (tiles, 6, 2)  hex outlines
+      node_xy     (nodes, 2)
+      edge_ends   (edges, 2, 2)  both end points of each edge
+      edge_mid    (edges, 2)
+      port_ship, port_label (ports, 2), port_angle (ports,)  in board.ports order
+    """
+
+    def __init__(self, topology, ports=(), hex_size=HEX_SIZE, origin=(BOARD_CENTER_X, BOARD_CENTER_Y)):
+        origin = np.asarray(origin, dtype=float)
+        to_xy  = CUBE_TO_XY * hex_size
+
+        self.tile_xy     = np.asarray(topology.tile_ids, dtype=float).reshape(-1, 3) @ to_xy + origin
+        self.hex_corners = self.tile_xy[:, None, :] + HEX_CORNERS * hex_size
+        self.node_xy     = np.asarray(topology.node_ids, dtype=float).reshape(-1, 3) @ to_xy + origin
+        self.edge_ends   = self.node_xy[np.asarray(topology.edge_nodes, dtype=np.intp).reshape(-1, 2)]
+        self.edge_mid    = self.edge_ends.mean(axis=1)
+
+        # Ports: ship pushed outward into the water past the tile edge,
+        # label a bit further out, ship facing inward toward the board center
+        mid = self.edge_mid[np.array([e for e, _ in ports], dtype=np.intp)]
+        out = mid - origin
+        out /= np.maximum(np.hypot(out[:, 0], out[:, 1]), 1e-9)[:, None]
+        self.port_ship  = mid + out * (hex_size * 0.75)
+        self.port_label = mid + out * (hex_size * 1.3)
+        self.port_angle = np.degrees(np.arctan2(out[:, 1], out[:, 0])) + 90
+
+        # World rectangle to show: the design-size window, or for maps that
+        # don't fit in it the board's bounds (with room for the port labels)
+        lo = self.hex_corners.reshape(-1, 2).min(axis=0) - hex_size * 1.3
+        hi = self.hex_corners.reshape(-1, 2).max(axis=0) + hex_size * 1.3
+        design = np.array([SCREEN_WIDTH, SCREEN_HEIGHT], dtype=float)
+        if (lo >= 0).all() and (hi <= design).all():
+            self.view_center, self.view_size = tuple((design / 2).tolist()), tuple(design.tolist())
+        else:
+            self.view_center = tuple(((lo + hi) / 2).tolist())
+            self.view_size   = tuple(np.maximum(hi - lo, design).tolist())
 
 
 # ===========================================================================
 # Shape / drawing helpers
 # ===========================================================================
-def draw_settlement(cx, cy, size, color):
+def add_settlement(shapes, cx, cy, size, color):
     half = size / 2
     pts  = [(cx-half, cy-half), (cx+half, cy-half),
             (cx+half, cy+half), (cx-half, cy+half)]
-    arcade.draw_polygon_filled(pts, color)
-    arcade.draw_polygon_outline(pts, arcade.color.BLACK, 2)
-
-def draw_road(x1, y1, x2, y2, color, width=6):
-    arcade.draw_line(x1, y1, x2, y2, arcade.color.WHITE, width + 4)
-    arcade.draw_line(x1, y1, x2, y2, arcade.color.BLACK, width + 2)
-    arcade.draw_line(x1, y1, x2, y2, color, width)
-
-def draw_number_token(cx, cy, number):
-    """Draw a classic Catan number token — cream circle with number inside.
-    6 and 8 are drawn in red (high-probability numbers)."""
+    shapes.append(arcade.shape_list.create_polygon(pts, color))
+    shapes.append(arcade.shape_list.create_line_loop(pts, arcade.color.BLACK, 2))
+
+def add_road(shapes, x1, y1, x2, y2, color, width=6):
+    shapes.append(arcade.shape_list.create_line(x1, y1, x2, y2, arcade.color.WHITE, width + 4))
+    shapes.append(arcade.shape_list.create_line(x1, y1, x2, y2, arcade.color.BLACK, width + 2))
+    shapes.append(arcade.shape_list.create_line(x1, y1, x2, y2, color, width))
+
+def add_circle(shapes, cx, cy, radius, color, border=0):
+    # border=0 is a filled circle, otherwise an outline that wide
+    if border:
+        shapes.append(arcade.shape_list.create_ellipse_outline(cx, cy, radius*2, radius*2, color, border, num_segments=24))
+    else:
+        shapes.append(arcade.shape_list.create_ellipse_filled(cx, cy, radius*2, radius*2, color, num_segments=24))
+
+def add_number_token(shapes, batch, cx, cy, number):
+    """Add a classic Catan number token — cream circle with number inside —
+    to a ShapeElementList, with its label in a text batch.
+    6 and 8 are drawn in red (high-probability numbers).
+    Returns the Text so the caller can keep it alive."""
     is_hot   = number in (6, 8)
     bg_color = (240, 220, 170)          # cream
     txt_col  = TOKEN_RED if is_hot else (20, 20, 20)
     radius   = 14
 
-    arcade.draw_circle_filled(cx, cy, radius, bg_color)
-    arcade.draw_circle_outline(cx, cy, radius, (100, 80, 40), 2)
+    shapes.append(arcade.shape_list.create_ellipse_filled(cx, cy, radius*2, radius*2, bg_color, num_segments=32))
+    shapes.append(arcade.shape_list.create_ellipse_outline(cx, cy, radius*2, radius*2, (100, 80, 40), 2, num_segments=32))
 
     # Probability dots below the number (pips)
     # Standard Catan pip counts: 2→1, 3→2, 4→3, 5→4, 6→5, 8→5, 9→4, 10→3, 11→2, 12→1
-    pip_map = {2:1, 3:2, 4:3, 5:4, 6:5, 8:5, 9:4, 10:3, 11:2, 12:1}
-    pips    = pip_map.get(number, 0)
+    pips    = PIPS.get(number, 0)
     pip_r   = 1.5
     pip_gap = 4
     pip_total_w = pips * (pip_r * 2) + (pips - 1) * (pip_gap - pip_r * 2)
@@ -185,17 +281,92 @@ def draw_number_token(cx, cy, number):
 
     for i in range(pips):
         px = pip_start_x + i * pip_gap
-        arcade.draw_circle_filled(px, cy - 7, pip_r, txt_col)
+        shapes.append(arcade.shape_list.create_ellipse_filled(px, cy - 7, pip_r*2, pip_r*2, txt_col, num_segments=8))
 
-    arcade.draw_text(
+    return arcade.Text(
         str(number),
         cx, cy + 2,
         txt_col, 11,
         bold=True,
         anchor_x="center", anchor_y="center",
-        font_name="MedievalSharp"
+        font_name="MedievalSharp",
+        batch=batch
     )
 
+class TextCache:
+    """
+    arcade.draw_text lays the string out again on every call, which made text
+    the most expensive part of on_draw.  This keeps the laid-out arcade.Text
+    objects around, keyed by (string, size, colour, anchor, bold), and only
+    moves them when the position changes.  Least recently used entries are
+    dropped once there are more than max_size.
+    """
+
+    def __init__(self, max_size=128, font_name="MedievalSharp"):
+        self.max_size  = max_size
+        self.font_name = font_name
+        self._texts    = OrderedDict()
+
+    def get(self, text, x, y, color, size, bold=False, anchor_x="left", anchor_y="baseline"):
+        key = (text, size, color, anchor_x, anchor_y, bold)
+        obj = self._texts.get(key)
+        if obj is None:
+            obj = arcade.Text(text, x, y, color, size, bold=bold,
+                              anchor_x=anchor_x, anchor_y=anchor_y, font_name=self.font_name)
+            self._texts[key] = obj
+            if len(self._texts) > self.max_size:
+                self._texts.popitem(last=False)
+        else:
+            self._texts.move_to_end(key)
+            if obj.x != x or obj.y != y:
+                obj.position = (x, y)
+        return obj
+
+    def draw(self, text, x, y, color, size, bold=False, anchor_x="left", anchor_y="baseline"):
+        self.get(text, x, y, color, size, bold, anchor_x, anchor_y).draw()
+
+    def __len__(self):
+        return len(self._texts)
+
+class SpatialGrid:
+    """
+    Uniform grid over points for hover / click hit-testing.  With the cell
+    size at least the snap radius, anything within the radius of (x, y) is in
+    the 3x3 block of cells around it, so a lookup looks at a handful of
+    points however big the board is.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self._cells    = {}     # (col, row) -> list of (x, y, item)
+
+    def _cell(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def insert(self, x, y, item):
+        self._cells.setdefault(self._cell(x, y), []).append((x, y, item))
+
+    @classmethod
+    def from_points(cls, points, cell_size):
+        """Grid over an (n, 2) array of points, item i being the point's row index."""
+        grid  = cls(cell_size)
+        cells = np.floor_divide(points, cell_size).astype(int).tolist()
+        for i, ((x, y), cell) in enumerate(zip(points.tolist(), cells)):
+            grid._cells.setdefault(tuple(cell), []).append((x, y, i))
+        return grid
+
+    def nearest(self, x, y, radius, accept=None):
+        """Closest item within radius of (x, y) for which accept(item) is true, or None."""
+        col, row = self._cell(x, y)
+        best, best_d2 = None, radius * radius
+        for c in (col - 1, col, col + 1):
+            for r in (row - 1, row, row + 1):
+                for px, py, item in self._cells.get((c, r), ()):
+                    d2 = (x - px) ** 2 + (y - py) ** 2
+                    if d2 < best_d2 and (accept is None or accept(item)):
+                        best, best_d2 = item, d2
+        return best
+
 def fill_rect(left, bottom, width, height, color):
     arcade.draw_lrbt_rectangle_filled(left, left + width, bottom, bottom + height, color)
 
@@ -207,12 +378,41 @@ def outline_rect(left, bottom, width, height, color, border=2):
 # Main Window
 # ===========================================================================
 class CatanWindow(arcade.Window):
-
-    def __init__(self):
-        super().__init__(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
+    """
+    With redraw_on_change=True the window only repaints after something
+    called invalidate() (a hover change, a placement, a new turn, a menu or
+    popup toggle, or the OS exposing the window), so an idle client does no
+    drawing at all.  Either way a frame is composed from per-layer caches and
+    only the invalidated layers are rebuilt.
+
+    With a net (a netclient.NetClient that has joined a game) the window
+    plays one seat of a server's game. Its own moves are applied to the
+    local engine at once and sent, and the server's deltas are played onto
+    a replica of the confirmed state (self.confirmed). While the server
+    agrees, a delta only touches the pieces and texts it changed; when it
+    doesn't (a rejected move, a different outcome) the local engine is
+    reset to the confirmed state and the moves still in flight are played
+    again on top.
+    """
+
+    def __init__(self, redraw_on_change=False, board_map=None, log=None, net=None):
+        super().__init__(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE, resizable=True)
         pyglet.font.add_file('fonts/MedievalSharp-Regular.ttf')
 
-        self.current_player_index = 0
+        # Cameras: the board lives in world space (design-size coordinates),
+        # the HUD in its own space scaled with the window
+        self.world_camera = arcade.Camera2D()
+        self.hud_camera   = arcade.Camera2D()
+        self.zoom         = 1.0           # player zoom on top of fitting the window
+        self.pan          = (0.0, 0.0)    # world offset of the view center
+        self.ui_scale     = 1.0
+        self.hud_w        = SCREEN_WIDTH
+        self.hud_h        = SCREEN_HEIGHT
+
+        # Redraw bookkeeping
+        self.redraw_on_change = redraw_on_change
+        self._dirty           = set(LAYERS)
+        self.frames_drawn     = 0
 
         # Build mode state
         self.build_mode    = False
@@ -222,12 +422,39 @@ class CatanWindow(arcade.Window):
         self.selected_node = None
         self.selected_edge = None
         self.show_confirm  = False
+        self._legal_targets_cache = None   # legal nodes/edges for build_choice
 
-        # Pixel caches (populated after make_board)
+        # Pixel caches (populated after make_board, world space)
+        self.geometry          = None
         self._node_pixel_cache = {}
         self._edge_pixel_cache = {}
+        self._node_grid = SpatialGrid(NODE_SNAP_RADIUS)   # node index by pixel
+        self._edge_grid = SpatialGrid(EDGE_SNAP_RADIUS)   # edge index by midpoint pixel
         self._port_render_data = []   # list of (ship_x, ship_y, angle, label)
 
+        # Static board layer (tiles, tokens) — built once into GPU batches
+        self.board_shapes      = None
+        self.board_text_batch  = None
+        self._board_texts      = []     # Text objects must outlive the batch draw
+        self._board_layer_key  = None   # tile layout the layer was built from
+
+        # Dynamic layers, rebuilt when invalidated. Pieces also update one
+        # at a time, roads and buildings are separate lists so a road placed
+        # later still goes under a settlement
+        self.road_shapes      = None
+        self.building_shapes  = None
+        self._piece_shapes    = {}      # ("node" | "edge", index) -> its shapes
+        self.highlight_shapes = None
+
+        # Laid-out labels for the menus and popups that come and go
+        self.text_cache = TextCache()
+
+        # First-frame art comes out of the cached atlas, the rest loads behind it
+        self._textures    = {}
+        self._first_frame = assets.load_atlas("first_frame", ASSET_GROUPS["first_frame"])
+        self.art_loader   = assets.AssetLoader("art", ASSET_GROUPS["art"])
+        self.startup_seconds = None
+
         # Load background
         self._load_background()
 
@@ -235,35 +462,154 @@ class CatanWindow(arcade.Window):
         self._load_resource_icons()
         self._load_port_sprite()
 
-        # Build the board (number tokens assigned inside)
-        self.board = CatanBoard()
-        self.board.make_board()
+        # The engine builds the board (number tokens assigned inside) and
+        # runs all the rules, the window only draws it and forwards input
+        self.engine = GameEngine([Player(p["color"], p["name"]) for p in PLAYERS],
+                                 board_map=board_map, log=None if net else log)
+        self.board  = self.engine.board
+
+        # Networked: the server's board and turn, the log records what it confirms
+        self.net       = net
+        self.seat      = None
+        self.confirmed = None
+        self.in_flight = []       # (sequence number, move) sent but not in a delta yet
+        self.started   = False    # the server takes moves once every seat is taken
+        self._move_seq = 0
+        if net is not None:
+            self.seat = net.seat
+            serialize.decode(net.state, self.engine)
+            self.engine.auto_roll = False
+            self.confirmed = serialize.decode(net.state)
+            self.confirmed.auto_roll = False
+            if log is not None:
+                self.confirmed.log = log
+                log.begin_game(self.confirmed)
         self._assign_number_tokens()
 
         # Build pixel caches
-        self._build_node_pixel_cache()
-        self._build_edge_pixel_cache()
+        self._build_geometry()
         self._build_port_render_data()
 
+        # Cameras and HUD for the current window size
+        self._update_layout(self.width, self.height)
+
         # Build HUD text objects last (needs board to be ready)
         self._build_text_objects()
 
+        # Game opens in the setup draft
+        self._sync_setup()
+
+    @property
+    def current_player_index(self):
+        return self.engine.current
+
+    @property
+    def my_turn(self):
+        # a local game is hot seat, every turn is the window's
+        return self.net is None or (self.started and self.engine.current == self.seat)
+
+    # -----------------------------------------------------------------------
+    # Invalidation
+    # -----------------------------------------------------------------------
+    def invalidate(self, *layers):
+        """Mark layers (default: all of them) as needing a rebuild and the window a repaint."""
+        self._dirty.update(layers or LAYERS)
+
+    def draw(self, dt):
+        # pyglet's per-frame entry point (on_draw + flip). Skipping it when
+        # nothing changed leaves the last frame on screen and the GPU idle
+        if self.redraw_on_change and not self._dirty:
+            return
+        super().draw(dt)
+
+    def on_expose(self):
+        self.invalidate()
+
+    def on_resize(self, width, height):
+        super().on_resize(width, height)
+        self._update_layout(width, height)
+        self._build_text_objects()
+        self.invalidate()
+
+    # -----------------------------------------------------------------------
+    # Cameras / layout
+    # -----------------------------------------------------------------------
+    def _update_layout(self, width, height):
+        """
+        Fit the design-size board into the window (then apply the player's
+        zoom and pan) and scale the HUD so it keeps its proportions from a
+        4K monitor down to a tablet.  Only camera transforms change, the
+        world geometry and the cached layers stay as they are.
+        """
+        ui_fit = min(width / SCREEN_WIDTH, height / SCREEN_HEIGHT)
+        self.ui_scale = max(UI_SCALE_MIN, ui_fit)
+        self.hud_w    = width  / self.ui_scale
+        self.hud_h    = height / self.ui_scale
+
+        self.hud_camera.match_window()
+        self.hud_camera.position = (self.hud_w / 2, self.hud_h / 2)
+        self.hud_camera.zoom     = self.ui_scale
+
+        view_w, view_h = self.geometry.view_size
+        fit    = min(width / view_w, height / view_h)
+        center = (self.geometry.view_center[0] + self.pan[0], self.geometry.view_center[1] + self.pan[1])
+        self.world_camera.match_window()
+        self.world_camera.position = center
+        self.world_camera.zoom     = fit * self.zoom
+        # the same transform for hit-testing on the CPU, cheaper than Camera2D.unproject
+        self._view = (center[0], center[1], fit * self.zoom, width / 2, height / 2)
+
+        # Background covers the window
+        if self.bg_sprite:
+            self.bg_sprite.scale    = max(width / SCREEN_WIDTH, height / SCREEN_HEIGHT)
+            self.bg_sprite.center_x = width  / 2
+            self.bg_sprite.center_y = height / 2
+
+    def screen_to_world(self, x, y):
+        cx, cy, zoom, half_w, half_h = self._view
+        return (x - half_w) / zoom + cx, (y - half_h) / zoom + cy
+
+    def screen_to_hud(self, x, y):
+        return x / self.ui_scale, y / self.ui_scale
+
+    def world_to_hud(self, points):
+        """(n, 2) array of world points -> HUD coordinates, in one pass."""
+        cx, cy, zoom, half_w, half_h = self._view
+        screen = (points - (cx, cy)) * zoom + (half_w, half_h)
+        return screen / self.ui_scale
+
+    def on_mouse_scroll(self, x, y, scroll_x, scroll_y):
+        # Zoom about the cursor: the world point under it stays put
+        before = self.screen_to_world(x, y)
+        # big maps start zoomed out to fit, so they may zoom in further
+        zoom_max  = ZOOM_MAX * max(self.geometry.view_size[0] / SCREEN_WIDTH, self.geometry.view_size[1] / SCREEN_HEIGHT)
+        self.zoom = min(zoom_max, max(ZOOM_MIN, self.zoom * ZOOM_STEP ** scroll_y))
+        self._update_layout(self.width, self.height)
+        after = self.screen_to_world(x, y)
+        self.pan = (self.pan[0] + before[0] - after[0], self.pan[1] + before[1] - after[1])
+        self._update_layout(self.width, self.height)
+        self.invalidate(LAYER_HIGHLIGHTS)
+
+    def on_mouse_drag(self, x, y, dx, dy, buttons, modifiers):
+        if not buttons & (arcade.MOUSE_BUTTON_RIGHT | arcade.MOUSE_BUTTON_MIDDLE):
+            return
+        zoom = self._view[2]
+        self.pan = (self.pan[0] - dx / zoom, self.pan[1] - dy / zoom)
+        self._update_layout(self.width, self.height)
+        self.invalidate(LAYER_HIGHLIGHTS)
+
     # -----------------------------------------------------------------------
     # Background
     # -----------------------------------------------------------------------
     def _load_background(self):
         """Load the background image, or fall back to a solid color."""
-        try:
-            self.bg_sprite = arcade.Sprite(BACKGROUND_IMAGE)
-            self.bg_sprite.center_x = SCREEN_WIDTH  / 2
-            self.bg_sprite.center_y = SCREEN_HEIGHT / 2
-            # Scale to fill the window exactly
-            scale_x = SCREEN_WIDTH  / self.bg_sprite.width
-            scale_y = SCREEN_HEIGHT / self.bg_sprite.height
-            self.bg_sprite.scale = max(scale_x, scale_y)
+        # Already cropped to the design size, _update_layout() scales it to the window
+        texture = self._texture("first_frame", "background")
+        if texture is not None:
+            self.bg_sprite = arcade.Sprite(texture)
             self.bg_list = arcade.SpriteList()
             self.bg_list.append(self.bg_sprite)
-        except Exception:
+        else:
             self.bg_sprite = None
             self.bg_list   = None
             arcade.set_background_color(arcade.color.OCEAN_BOAT_BLUE)
@@ -290,79 +636,96 @@ class CatanWindow(arcade.Window):
     # -----------------------------------------------------------------------
     def _build_port_render_data(self):
         """
-        Find all outer edges (edges where at least one endpoint node touches
-        only 1 tile — meaning it's on the board boundary), sort them
-        clockwise by angle from board center, pick 9 evenly-spaced ones,
-        and assign port types to them.
+        The backend places the ports (evenly spaced coastal edges, clockwise
+        from the top, attached to both nodes of the edge); here we only work
+        out where the ship and label go for each one.
         """
         self._port_render_data = []
+        geo = self.geometry
 
-        # --- Step 1: find all outer edges ---
-        outer_edges = []
-        for edge_id, edge_obj in self.board.edges.items():
-            # An outer edge has at least one node that touches only 1 tile
-            if any(len(n.tiles) < 3 for n in edge_obj.nodes):
-                mx, my, x1, y1, x2, y2 = self._edge_pixel_cache[edge_id]
-                # Compute angle of midpoint from board center
-                dx = mx - BOARD_CENTER_X
-                dy = my - BOARD_CENTER_Y
-                angle_from_center = math.atan2(dy, dx)
-                outer_edges.append((angle_from_center, mx, my, x1, y1, x2, y2))
-
-        # --- Step 2: sort clockwise from top (top = angle pi/2, going clockwise) ---
-        # atan2 goes counter-clockwise, so we negate and offset to start at top
-        outer_edges.sort(key=lambda e: (-(e[0] - math.pi/2)) % (2 * math.pi))
-
-        # --- Step 3: pick 9 evenly-spaced edges from the sorted outer ring ---
-        total      = len(outer_edges)
-        step       = total / 9
-        port_edges = [outer_edges[round(i * step) % total] for i in range(9)]
-
-        # --- Step 4: build render data ---
-        for i, (angle_from_center, mx, my, x1, y1, x2, y2) in enumerate(port_edges):
-            resource = PORT_TYPES[i]
-            label    = f"2:1 {RESOURCE_ABBR[resource]}" if resource else "3:1"
-
-            # Push ship outward into the water past the tile edge
-            dx   = mx - BOARD_CENTER_X
-            dy   = my - BOARD_CENTER_Y
-            dist = math.hypot(dx, dy) or 1
-            ship_x = mx + dx / dist * (HEX_SIZE * 0.75)
-            ship_y = my + dy / dist * (HEX_SIZE * 0.75)
-
-            # Label pushed a bit further out than the ship
-            label_x = mx + dx / dist * (HEX_SIZE * 1.3)
-            label_y = my + dy / dist * (HEX_SIZE * 1.3)
-
-            # Sprite angle: face inward toward the board center
-            sprite_angle = math.degrees(math.atan2(dy, dx)) + 90
+        for (edge_index, resource), (ship_x, ship_y), (label_x, label_y), sprite_angle in zip(
+                self.board.ports, geo.port_ship.tolist(), geo.port_label.tolist(), geo.port_angle.tolist()):
+            label = f"2:1 {RESOURCE_ABBR[resource]}" if resource else "3:1"
 
             self._port_render_data.append((ship_x, ship_y, sprite_angle, label, label_x, label_y))
 
             # Add sprite to SpriteList once at init (Arcade 3.x requirement)
             if self._ship_ok:
-                ship = arcade.Sprite(PORT_SHIP_SPRITE, scale=0.07)
+                ship = arcade.Sprite(self.ship_texture)
                 ship.center_x = ship_x
                 ship.center_y = ship_y
                 ship.angle    = sprite_angle
                 self.port_sprite_list.append(ship)
 
+    # -----------------------------------------------------------------------
+    # Static board layer
+    # -----------------------------------------------------------------------
+    def _board_key(self):
+        return (self.board.topology, self.board.tile_resource.tobytes(), self.board.tile_number.tobytes())
+
+    def _build_board_layer(self):
+        """
+        Nothing about the hexes, number tokens or port markers and labels
+        changes after make_board(), so they go into one ShapeElementList
+        (a single GPU draw) and one text batch.  Rebuilt only when the tiles change.
+        """
+        shapes = arcade.shape_list.ShapeElementList()
+        batch  = pyglet.graphics.Batch()
+        texts  = []
+
+        tile_xy = self.geometry.tile_xy.tolist()
+        corners_all = self.geometry.hex_corners.tolist()
+        for t, tile in enumerate(self.board.tiles.values()):
+            px, py  = tile_xy[t]
+            corners = corners_all[t]
+            shapes.append(arcade.shape_list.create_polygon(corners, RESOURCE_COLORS[tile.resource]))
+            shapes.append(arcade.shape_list.create_line_loop(corners, arcade.color.BLACK, 2))
+
+            # Number token (skip desert, which has number=0)
+            if tile.number > 0:
+                texts.append(add_number_token(shapes, batch, px, py, tile.number))
+
+        for (ship_x, ship_y, angle, label, label_x, label_y) in self._port_render_data:
+            # Fallback port markers when the ship image is missing
+            if not self._ship_ok:
+                shapes.append(arcade.shape_list.create_ellipse_filled(ship_x, ship_y, 20, 20, (80, 60, 30)))
+                shapes.append(arcade.shape_list.create_ellipse_outline(ship_x, ship_y, 20, 20, TEXT_GOLD, 2))
+
+            # Labels are pushed outward so they're never covered by the tile
+            texts.append(arcade.Text(
+                label,
+                label_x, label_y,
+                TEXT_GOLD, 8, bold=True,
+                anchor_x="center", anchor_y="center",
+                font_name="MedievalSharp",
+                batch=batch
+            ))
+
+        self.board_shapes     = shapes
+        self.board_text_batch = batch
+        self._board_texts     = texts
+        self._board_layer_key = self._board_key()
+
+    def _draw_board_layer(self):
+        if self._board_layer_key != self._board_key():
+            self._build_board_layer()
+        self.board_shapes.draw()
+        self.board_text_batch.draw()
+
     # -----------------------------------------------------------------------
     # Caches
     # -----------------------------------------------------------------------
-    def _build_node_pixel_cache(self):
-        for node_id in self.board.nodes:
-            px, py = node_to_pixel(node_id)
-            self._node_pixel_cache[node_id] = (px, py)
+    def _build_geometry(self):
+        """World positions for the whole board in one pass, then the id-keyed caches and hit grids."""
+        topo = self.board.topology
+        geo  = self.geometry = BoardGeometry(topo, self.board.ports)
+
+        self._node_pixel_cache = dict(zip(topo.node_ids, map(tuple, geo.node_xy.tolist())))
+        edge_rows = np.hstack([geo.edge_mid, geo.edge_ends.reshape(-1, 4)])   # mx, my, x1, y1, x2, y2
+        self._edge_pixel_cache = dict(zip(topo.edge_ids, map(tuple, edge_rows.tolist())))
 
-    def _build_edge_pixel_cache(self):
-        for edge_id in self.board.edges:
-            n1_id, n2_id = edge_id
-            x1, y1 = self._node_pixel_cache[n1_id]
-            x2, y2 = self._node_pixel_cache[n2_id]
-            mx = (x1 + x2) / 2
-            my = (y1 + y2) / 2
-            self._edge_pixel_cache[edge_id] = (mx, my, x1, y1, x2, y2)
+        self._node_grid = SpatialGrid.from_points(geo.node_xy, NODE_SNAP_RADIUS)
+        self._edge_grid = SpatialGrid.from_points(geo.edge_mid, EDGE_SNAP_RADIUS)
 
     # -----------------------------------------------------------------------
     # Sprites
@@ -371,7 +734,7 @@ class CatanWindow(arcade.Window):
         self.resource_icons   = {}
         self.icon_sprite_list = arcade.SpriteList()
         for res in ["brick", "ore", "wheat", "sheep", "forest"]:
-            sprite = arcade.Sprite(RESOURCE_SPRITES[res], scale=SPRITE_SCALE)
+            sprite = arcade.Sprite(self._texture("first_frame", f"icon_{res}"))
             self.resource_icons[res] = sprite
             self.icon_sprite_list.append(sprite)
 
@@ -381,11 +744,25 @@ class CatanWindow(arcade.Window):
         SpriteList in _build_port_render_data() once port positions are known.
         """
         self.port_sprite_list = arcade.SpriteList()
-        try:
-            _test = arcade.Sprite(PORT_SHIP_SPRITE, scale=0.07)
-            self._ship_ok = True
-        except Exception:
-            self._ship_ok = False
+        self.ship_texture     = self._texture("first_frame", "ship")
+        self._ship_ok         = self.ship_texture is not None
+
+    def _texture(self, group, name):
+        """
+        arcade.Texture for an atlas image, made on first use (this uploads to
+        the GPU so it has to happen on the main thread).  None if the image is
+        missing or, for the background "art" group, not loaded yet.
+        """
+        key = f"{group}:{name}"
+        if key not in self._textures:
+            if group == "first_frame":
+                image = self._first_frame.get(name)
+            else:
+                image = self.art_loader.get(name)
+                if image is None and not self.art_loader.ready:
+                    return None   # try again next time
+            self._textures[key] = None if image is None else arcade.Texture(image, hash=key)
+        return self._textures[key]
 
     # -----------------------------------------------------------------------
     # Text objects
@@ -395,15 +772,15 @@ class CatanWindow(arcade.Window):
         btn_w   = 130
         gap     = 15
         total_w = 3 * btn_w + 2 * gap
-        sx      = (SCREEN_WIDTH - total_w) / 2
+        sx      = (self.hud_w - total_w) / 2
 
         self.txt_trade = arcade.Text("Trade",     sx+btn_w*0.5,           bar_cy, TEXT_WHITE, 12, bold=True, anchor_x="center", anchor_y="center", font_name="MedievalSharp")
         self.txt_build = arcade.Text("Build",     sx+btn_w*1.5+gap,       bar_cy, TEXT_WHITE, 12, bold=True, anchor_x="center", anchor_y="center", font_name="MedievalSharp")
         self.txt_card  = arcade.Text("Play Card", sx+btn_w*2.5+gap*2,     bar_cy, TEXT_WHITE, 12, bold=True, anchor_x="center", anchor_y="center", font_name="MedievalSharp")
-        self.txt_end   = arcade.Text("End Turn",  SCREEN_WIDTH-btn_w*0.5-15, bar_cy, TEXT_WHITE, 12, bold=True, anchor_x="center", anchor_y="center", font_name="MedievalSharp")
+        self.txt_end   = arcade.Text("End Turn",  self.hud_w-btn_w*0.5-15, bar_cy, TEXT_WHITE, 12, bold=True, anchor_x="center", anchor_y="center", font_name="MedievalSharp")
 
-        dx = SCREEN_WIDTH - DICE_AREA_WIDTH - 10
-        dy = SCREEN_HEIGHT - DICE_AREA_HEIGHT - 10
+        dx = self.hud_w - DICE_AREA_WIDTH - 10
+        dy = self.hud_h - DICE_AREA_HEIGHT - 10
         self.txt_dice_label = arcade.Text("Dice Roll",               dx+DICE_AREA_WIDTH/2, dy+DICE_AREA_HEIGHT-16, TEXT_GOLD,      11, bold=True, anchor_x="center", font_name="MedievalSharp")
         self.txt_dice_hint  = arcade.Text("Auto-rolls on turn start",dx+DICE_AREA_WIDTH/2, dy+7,                  TEXT_LIGHT_GRAY, 8,             anchor_x="center", font_name="MedievalSharp")
         self.txt_die1       = arcade.Text("?", dx+(DICE_AREA_WIDTH-2*40-12)/2+20,     dy+22+20, TEXT_WHITE, 18, bold=True, anchor_x="center", anchor_y="center", font_name="MedievalSharp")
@@ -414,8 +791,9 @@ class CatanWindow(arcade.Window):
     def _build_player_texts(self):
         """Single-column player info panel."""
         player    = PLAYERS[self.current_player_index]
+        state     = self.engine.current_player
         panel_x   = 8
-        panel_top = SCREEN_HEIGHT - 8   # top of panel in screen coords
+        panel_top = self.hud_h - 8   # top of panel in screen coords
         row_h     = 24                  # vertical spacing per row
 
         # Name
@@ -429,7 +807,7 @@ class CatanWindow(arcade.Window):
         )
         # VP
         self.txt_player_vp = arcade.Text(
-            f"Victory Points: {player['vp']}",
+            f"Victory Points: {state.victory_points}",
             panel_x + HUD_PANEL_WIDTH // 2,
             panel_top - 18 - row_h,
             TEXT_LIGHT_GRAY, 10,
@@ -446,7 +824,7 @@ class CatanWindow(arcade.Window):
             ry = panel_top - 18 - row_h * 2 - i * (ICON_SIZE + 4) - ICON_SIZE // 2
             self.txt_resources.append(
                 arcade.Text(
-                    f"{labels[res]}: {player['resources'][res]}",
+                    f"{labels[res]}: {state.resource_cards[res]}",
                     panel_x + ICON_SIZE + 25, ry,
                     TEXT_WHITE, 9,
                     anchor_y="center",
@@ -454,24 +832,60 @@ class CatanWindow(arcade.Window):
                 )
             )
 
+        self._update_player_texts()
+
+    def _update_player_texts(self):
+        """
+        Point the panel and dice texts at the current state. Text objects
+        only lay themselves out again when their string actually changes,
+        so this is cheap enough to run on every HUD invalidation.
+        """
+        player = PLAYERS[self.current_player_index]
+        state  = self.engine.current_player
+        self.txt_player_name.text = player["name"]
+        self.txt_player_vp.text   = f"Victory Points: {state.victory_points}"
+
+        order  = ["brick", "ore", "wheat", "sheep", "forest"]
+        labels = {"brick":"Brick","ore":"Ore","wheat":"Wheat","sheep":"Sheep","forest":"Wood"}
+        for txt, res in zip(self.txt_resources, order):
+            txt.text = f"{labels[res]}: {state.resource_cards[res]}"
+
+        # Dice from the engine's last roll
+        if self.engine.dice:
+            self.txt_die1.text = str(self.engine.dice[0])
+            self.txt_die2.text = str(self.engine.dice[1])
+
     # -----------------------------------------------------------------------
-    # Affordability
+    # Affordability / legality  (asks the engine)
     # -----------------------------------------------------------------------
-    def _can_afford(self, cost_dict):
-        res = PLAYERS[self.current_player_index]["resources"]
-        return all(res.get(r, 0) >= amt for r, amt in cost_dict.items())
+    def _can_afford(self, build):
+        # build is one of player.BUILDS, the engine answers for every seat at once
+        bit = self.current_player_index * len(BUILDS) + BUILDS.index(build)
+        return bool(self.engine.affordable() >> bit & 1)
+
+    def _legal_targets(self):
+        """Node or edge indexes the current player may build on right now."""
+        if self._legal_targets_cache is None:
+            seat = self.current_player_index
+            if self.build_choice == BUILD_SETTLEMENT:
+                self._legal_targets_cache = set(self.engine.legal_settlements(seat))
+            elif self.build_choice == BUILD_ROAD:
+                self._legal_targets_cache = set(self.engine.legal_roads(seat))
+            else:
+                self._legal_targets_cache = set()
+        return self._legal_targets_cache
 
     # -----------------------------------------------------------------------
     # HUD draw helpers
     # -----------------------------------------------------------------------
     def _draw_bottom_bar(self):
-        fill_rect(0, 0, SCREEN_WIDTH, HUD_BOTTOM_HEIGHT, HUD_BG)
+        fill_rect(0, 0, self.hud_w, HUD_BOTTOM_HEIGHT, HUD_BG)
 
         btn_w   = 130
         btn_h   = 46
         gap     = 15
         total_w = 3 * btn_w + 2 * gap
-        sx      = (SCREEN_WIDTH - total_w) / 2
+        sx      = (self.hud_w - total_w) / 2
         btn_bot = (HUD_BOTTOM_HEIGHT - btn_h) / 2
 
         build_col = BTN_BUILD_ACTIVE if self.build_mode else BTN_BUILD
@@ -479,7 +893,7 @@ class CatanWindow(arcade.Window):
         fill_rect(sx,                    btn_bot, btn_w, btn_h, BTN_TRADE)
         fill_rect(sx+btn_w+gap,          btn_bot, btn_w, btn_h, build_col)
         fill_rect(sx+2*(btn_w+gap),      btn_bot, btn_w, btn_h, BTN_CARD)
-        fill_rect(SCREEN_WIDTH-btn_w-15, btn_bot, btn_w, btn_h, BTN_ENDTURN)
+        fill_rect(self.hud_w-btn_w-15, btn_bot, btn_w, btn_h, BTN_ENDTURN)
 
         self.txt_trade.draw()
         self.txt_build.draw()
@@ -492,7 +906,7 @@ class CatanWindow(arcade.Window):
 
         btn_w  = 130
         gap    = 15
-        sx     = (SCREEN_WIDTH - 3*btn_w - 2*gap) / 2
+        sx     = (self.hud_w - 3*btn_w - 2*gap) / 2
         bx     = sx + btn_w + gap
         by     = HUD_BOTTOM_HEIGHT
         menu_w = btn_w
@@ -500,21 +914,21 @@ class CatanWindow(arcade.Window):
         fill_rect(bx, by, menu_w, 80, HUD_PANEL_BG)
         outline_rect(bx, by, menu_w, 80, TEXT_GOLD, 2)
 
-        s_col = (39, 174, 96) if self._can_afford(SETTLEMENT_COST) else (70, 70, 70)
+        s_col = (39, 174, 96) if self._can_afford(BUILD_SETTLEMENT) else (70, 70, 70)
         fill_rect(bx+8, by+44, menu_w-16, 28, s_col)
-        arcade.draw_text("Settlement", bx+menu_w/2, by+58, TEXT_WHITE, 9, bold=True,
-                         anchor_x="center", anchor_y="center", font_name="MedievalSharp")
+        self.text_cache.draw("Settlement", bx+menu_w/2, by+58, TEXT_WHITE, 9, bold=True,
+                             anchor_x="center", anchor_y="center")
 
-        r_col = (52, 152, 219) if self._can_afford(ROAD_COST) else (70, 70, 70)
+        r_col = (52, 152, 219) if self._can_afford(BUILD_ROAD) else (70, 70, 70)
         fill_rect(bx+8, by+8, menu_w-16, 28, r_col)
-        arcade.draw_text("Road", bx+menu_w/2, by+22, TEXT_WHITE, 9, bold=True,
-                         anchor_x="center", anchor_y="center", font_name="MedievalSharp")
+        self.text_cache.draw("Road", bx+menu_w/2, by+22, TEXT_WHITE, 9, bold=True,
+                             anchor_x="center", anchor_y="center")
 
     def _draw_player_panel(self):
         """Slim single-column panel in top-left."""
         player  = PLAYERS[self.current_player_index]
         panel_x = 8
-        panel_y = SCREEN_HEIGHT - HUD_PANEL_HEIGHT - 8
+        panel_y = self.hud_h - HUD_PANEL_HEIGHT - 8
 
         fill_rect(panel_x, panel_y, HUD_PANEL_WIDTH, HUD_PANEL_HEIGHT, HUD_PANEL_BG)
         outline_rect(panel_x, panel_y, HUD_PANEL_WIDTH, HUD_PANEL_HEIGHT, player["color"])
@@ -527,7 +941,7 @@ class CatanWindow(arcade.Window):
 
         # Resource icons + labels, single column
         order    = ["brick", "ore", "wheat", "sheep", "forest"]
-        panel_top = SCREEN_HEIGHT - 8
+        panel_top = self.hud_h - 8
         row_h     = 24
 
         for i, res in enumerate(order):
@@ -542,8 +956,8 @@ class CatanWindow(arcade.Window):
             txt.draw()
 
     def _draw_dice_area(self):
-        dx = SCREEN_WIDTH - DICE_AREA_WIDTH - 10
-        dy = SCREEN_HEIGHT - DICE_AREA_HEIGHT - 10
+        dx = self.hud_w - DICE_AREA_WIDTH - 10
+        dy = self.hud_h - DICE_AREA_HEIGHT - 10
 
         fill_rect(dx, dy, DICE_AREA_WIDTH, DICE_AREA_HEIGHT, HUD_PANEL_BG)
         outline_rect(dx, dy, DICE_AREA_WIDTH, DICE_AREA_HEIGHT, TEXT_LIGHT_GRAY)
@@ -566,89 +980,129 @@ class CatanWindow(arcade.Window):
     # -----------------------------------------------------------------------
     def _draw_ports(self):
         # Ship sprites sit on the tile edge — drawn via SpriteList
+        # (labels and fallback markers for a missing ship image are in the board layer)
         if self._ship_ok:
             self.port_sprite_list.draw()
 
-        # Labels are pushed outward so they're never covered by the tile
-        for (ship_x, ship_y, angle, label, label_x, label_y) in self._port_render_data:
-            if not self._ship_ok:
-                arcade.draw_circle_filled(ship_x, ship_y, 10, (80, 60, 30))
-                arcade.draw_circle_outline(ship_x, ship_y, 10, TEXT_GOLD, 2)
-
-            arcade.draw_text(
-                label,
-                label_x, label_y,
-                TEXT_GOLD, 8, bold=True,
-                anchor_x="center", anchor_y="center",
-                font_name="MedievalSharp"
-            )
-
     # -----------------------------------------------------------------------
     # Board pieces (always drawn)
     # -----------------------------------------------------------------------
-    def _draw_placed_pieces(self):
-        for edge_id, edge_obj in self.board.edges.items():
+    def _build_pieces_layer(self):
+        self.road_shapes     = arcade.shape_list.ShapeElementList()
+        self.building_shapes = arcade.shape_list.ShapeElementList()
+        self._piece_shapes   = {}
+        topo = self.board.topology
+        self._update_pieces(range(topo.num_nodes), range(topo.num_edges))
+
+    def _update_pieces(self, nodes=(), edges=()):
+        """Redo the shapes of just these node and edge indexes from the board."""
+        if self.road_shapes is None:
+            return # not built yet, the first frame builds it from the board
+        for e in edges:
+            edge_obj = self.board.edge(e)
+            shapes   = self._replace_piece(self.road_shapes, ("edge", e))
             if edge_obj.player is not None:
-                mx, my, x1, y1, x2, y2 = self._edge_pixel_cache[edge_id]
-                draw_road(x1, y1, x2, y2, PLAYERS[edge_obj.player]["color"])
+                mx, my, x1, y1, x2, y2 = self._edge_pixel_cache[edge_obj.id]
+                add_road(shapes, x1, y1, x2, y2, PLAYERS[edge_obj.player]["color"])
+                self._add_piece(self.road_shapes, ("edge", e), shapes)
 
-        for node_id, node_obj in self.board.nodes.items():
+        for n in nodes:
+            node_obj = self.board.node(n)
+            shapes   = self._replace_piece(self.building_shapes, ("node", n))
             if node_obj.player is not None:
-                npx, npy = self._node_pixel_cache[node_id]
-                draw_settlement(npx, npy, 14, PLAYERS[node_obj.player]["color"])
+                npx, npy = self._node_pixel_cache[node_obj.id]
+                size = 20 if node_obj.building == "city" else 14
+                add_settlement(shapes, npx, npy, size, PLAYERS[node_obj.player]["color"])
+                self._add_piece(self.building_shapes, ("node", n), shapes)
+
+    def _replace_piece(self, layer, key):
+        # take a piece's old shapes out of the layer, returns a list for the new ones
+        for shape in self._piece_shapes.pop(key, ()):
+            layer.remove(shape)
+        return []
+
+    def _add_piece(self, layer, key, shapes):
+        for shape in shapes:
+            layer.append(shape)
+        self._piece_shapes[key] = shapes
 
     # -----------------------------------------------------------------------
     # Ghost highlights
     # -----------------------------------------------------------------------
-    def _draw_node_highlights(self):
+    def _build_highlight_layer(self):
+        shapes = arcade.shape_list.ShapeElementList()
+        if self.build_choice == BUILD_SETTLEMENT:
+            self._add_node_highlights(shapes)
+        elif self.build_choice == BUILD_ROAD:
+            self._add_edge_highlights(shapes)
+        self.highlight_shapes = shapes
+
+    def _add_node_highlights(self, shapes):
         player_color = PLAYERS[self.current_player_index]["color"]
-        for node_id, node_obj in self.board.nodes.items():
-            if node_obj.player is not None:
-                continue
-            npx, npy = self._node_pixel_cache[node_id]
-            if npy < HUD_BOTTOM_HEIGHT + 5:
-                continue
-            if npx < HUD_PANEL_WIDTH + 5 or npx > SCREEN_WIDTH - DICE_AREA_WIDTH - 15:
+        legal        = sorted(self._legal_targets())
+        if not legal:
+            return
+        # Skip spots hidden under the HUD (where they are depends on zoom / pan)
+        world = self.geometry.node_xy[legal]
+        hud   = self.world_to_hud(world)
+        shown = ((hud[:, 1] >= HUD_BOTTOM_HEIGHT + 5) & (hud[:, 0] >= HUD_PANEL_WIDTH + 5)
+                 & (hud[:, 0] <= self.hud_w - DICE_AREA_WIDTH - 15))
+        for n, (npx, npy), ok in zip(legal, world.tolist(), shown.tolist()):
+            if not ok:
                 continue
-            if node_obj is self.hovered_node:
-                arcade.draw_circle_filled(npx, npy, 12, (*player_color, 180))
-                arcade.draw_circle_outline(npx, npy, 14, player_color, 3)
+            node_obj = self.board.node(n)
+            if node_obj == self.hovered_node:
+                add_circle(shapes, npx, npy, 12, (*player_color, 180))
+                add_circle(shapes, npx, npy, 14, player_color, 3)
             else:
-                arcade.draw_circle_filled(npx, npy, 8, (255, 255, 255, 60))
-                arcade.draw_circle_outline(npx, npy, 8, (255, 255, 255, 120), 1)
+                add_circle(shapes, npx, npy, 8, (255, 255, 255, 60))
+                add_circle(shapes, npx, npy, 8, (255, 255, 255, 120), 1)
 
-    def _draw_edge_highlights(self):
+    def _add_edge_highlights(self, shapes):
         player_color = PLAYERS[self.current_player_index]["color"]
-        for edge_id, edge_obj in self.board.edges.items():
-            if edge_obj.player is not None:
-                continue
-            mx, my, x1, y1, x2, y2 = self._edge_pixel_cache[edge_id]
-            if my < HUD_BOTTOM_HEIGHT + 5:
+        legal        = sorted(self._legal_targets())
+        if not legal:
+            return
+        geo   = self.geometry
+        shown = self.world_to_hud(geo.edge_mid[legal])[:, 1] >= HUD_BOTTOM_HEIGHT + 5
+        for e, (mx, my), ((x1, y1), (x2, y2)), ok in zip(
+                legal, geo.edge_mid[legal].tolist(), geo.edge_ends[legal].tolist(), shown.tolist()):
+            if not ok:
                 continue
-            if edge_obj is self.hovered_edge:
-                arcade.draw_line(x1, y1, x2, y2, (*player_color, 200), 6)
-                arcade.draw_circle_filled(mx, my, 7, (*player_color, 220))
+            edge_obj = self.board.edge(e)
+            if edge_obj == self.hovered_edge:
+                shapes.append(arcade.shape_list.create_line(x1, y1, x2, y2, (*player_color, 200), 6))
+                add_circle(shapes, mx, my, 7, (*player_color, 220))
             else:
-                arcade.draw_line(x1, y1, x2, y2, (255, 255, 255, 50), 3)
+                shapes.append(arcade.shape_list.create_line(x1, y1, x2, y2, (255, 255, 255, 50), 3))
 
     # -----------------------------------------------------------------------
     # Confirmation popup
     # -----------------------------------------------------------------------
+    def _popup_anchor(self):
+        """HUD position of the popup's bottom center, just above the selected spot (or None)."""
+        if self.build_choice == BUILD_SETTLEMENT and self.selected_node:
+            world = self.geometry.node_xy[self.selected_node.index]
+        elif self.build_choice == BUILD_ROAD and self.selected_edge:
+            world = self.geometry.edge_mid[self.selected_edge.index]
+        else:
+            return None
+        cx, cy = self.world_to_hud(world[None, :])[0].tolist()
+        return cx, cy + 18
+
     def _draw_confirm_popup(self):
         if not self.show_confirm:
             return
-        if self.build_choice == BUILD_SETTLEMENT and self.selected_node:
-            cx, cy = self._node_pixel_cache[self.selected_node.id]
-            cy    += 18
-            can    = self._can_afford(SETTLEMENT_COST)
+        anchor = self._popup_anchor()
+        if anchor is None:
+            return
+        cx, cy = anchor
+        if self.build_choice == BUILD_SETTLEMENT:
+            can    = self._can_afford(BUILD_SETTLEMENT)
             label  = "Build Settlement?"
-        elif self.build_choice == BUILD_ROAD and self.selected_edge:
-            mx, my, *_ = self._edge_pixel_cache[self.selected_edge.id]
-            cx, cy = mx, my + 18
-            can    = self._can_afford(ROAD_COST)
-            label  = "Build Road?"
         else:
-            return
+            can    = self._can_afford(BUILD_ROAD)
+            label  = "Build Road?"
 
         popup_w  = 160
         popup_h  = 70
@@ -656,103 +1110,131 @@ class CatanWindow(arcade.Window):
 
         fill_rect(pop_left, cy, popup_w, popup_h, (20, 20, 40, 220))
         outline_rect(pop_left, cy, popup_w, popup_h, TEXT_GOLD, 2)
-        arcade.draw_text(label, cx, cy+popup_h-14, TEXT_GOLD, 10, bold=True,
-                         anchor_x="center", anchor_y="center", font_name="MedievalSharp")
+        self.text_cache.draw(label, cx, cy+popup_h-14, TEXT_GOLD, 10, bold=True,
+                             anchor_x="center", anchor_y="center")
 
         btn_col = (39, 174, 96) if can else (80, 80, 80)
         fill_rect(pop_left+8,          cy+8, 66, 30, btn_col)
-        arcade.draw_text("Confirm" if can else "No Res.",
-                         pop_left+41, cy+23, TEXT_WHITE, 9, bold=True,
-                         anchor_x="center", anchor_y="center", font_name="MedievalSharp")
+        self.text_cache.draw("Confirm" if can else "No Res.",
+                             pop_left+41, cy+23, TEXT_WHITE, 9, bold=True,
+                             anchor_x="center", anchor_y="center")
 
         fill_rect(pop_left+popup_w-74, cy+8, 66, 30, (180, 50, 50))
-        arcade.draw_text("Cancel",
-                         pop_left+popup_w-41, cy+23, TEXT_WHITE, 9, bold=True,
-                         anchor_x="center", anchor_y="center", font_name="MedievalSharp")
+        self.text_cache.draw("Cancel",
+                             pop_left+popup_w-41, cy+23, TEXT_WHITE, 9, bold=True,
+                             anchor_x="center", anchor_y="center")
 
     # -----------------------------------------------------------------------
     # on_draw
     # -----------------------------------------------------------------------
     def on_draw(self):
+        # Rebuild whatever was invalidated since the last frame
+        dirty, self._dirty = self._dirty, set()
+        if LAYER_BOARD in dirty:
+            self._board_layer_key = None
+        if LAYER_PIECES in dirty:
+            self._build_pieces_layer()
+        if LAYER_HIGHLIGHTS in dirty:
+            self._build_highlight_layer()
+        if LAYER_HUD in dirty:
+            self._update_player_texts()
+        self.frames_drawn += 1
+        if self.startup_seconds is None:
+            self._report_startup()
+
         self.clear()
 
-        # Background
+        # Background (window pixels)
+        self.default_camera.use()
         if self.bg_list:
             self.bg_list.draw()
 
-        # Hex tiles
-        for xyz, tile in self.board.tiles.items():
-            cx, cy, cz = xyz
-            px, py = cubic_to_pixel(cx, cz)
-            corners = get_hex_corners(px, py, HEX_SIZE)
-            arcade.draw_polygon_filled(corners, RESOURCE_COLORS[tile.resource])
-            arcade.draw_polygon_outline(corners, arcade.color.BLACK, 2)
+        # Everything on the board is in world space
+        self.world_camera.use()
 
-            # Number token (skip desert, which has number=0)
-            if tile.number > 0:
-                draw_number_token(px, py, tile.number)
+        # Hex tiles and number tokens (cached static layer)
+        self._draw_board_layer()
 
         # Ports drawn after tiles — ships sit on outer tile edges, labels clear outward
         self._draw_ports()
 
         # Ghost highlights
-        if self.build_choice == BUILD_SETTLEMENT:
-            self._draw_node_highlights()
-        elif self.build_choice == BUILD_ROAD:
-            self._draw_edge_highlights()
+        self.highlight_shapes.draw()
 
         # Placed pieces
-        self._draw_placed_pieces()
+        self.road_shapes.draw()
+        self.building_shapes.draw()
+
+        # HUD on top of everything
+        self.hud_camera.use()
 
         # Confirmation popup
         if self.show_confirm:
             self._draw_confirm_popup()
 
-        # HUD on top of everything
         self._draw_player_panel()
         self._draw_dice_area()
         self._draw_bottom_bar()
         self._draw_build_submenu()
 
+    def _report_startup(self):
+        self.startup_seconds = time.perf_counter() - START_TIME
+        over = " — over budget!" if self.startup_seconds > STARTUP_BUDGET else ""
+        print(f"First frame after {self.startup_seconds * 1000:.0f} ms "
+              f"(budget {STARTUP_BUDGET * 1000:.0f} ms){over}")
+
     # -----------------------------------------------------------------------
     # Mouse motion
     # -----------------------------------------------------------------------
     def on_mouse_motion(self, x, y, dx, dy):
         if self.show_confirm:
             return
+        x, y = self.screen_to_world(x, y)
         if self.build_choice == BUILD_SETTLEMENT:
-            closest, closest_dist = None, float("inf")
-            for node_id, (npx, npy) in self._node_pixel_cache.items():
-                d = math.hypot(x-npx, y-npy)
-                if d < NODE_SNAP_RADIUS and d < closest_dist:
-                    node = self.board.nodes[node_id]
-                    if node.player is None:
-                        closest, closest_dist = node, d
-            self.hovered_node = closest
+            node = self._node_at(x, y)
+            if node != self.hovered_node:
+                self.hovered_node = node
+                self.invalidate(LAYER_HIGHLIGHTS)
         elif self.build_choice == BUILD_ROAD:
-            closest, closest_dist = None, float("inf")
-            for edge_id, (mx, my, *_) in self._edge_pixel_cache.items():
-                d = math.hypot(x-mx, y-my)
-                if d < EDGE_SNAP_RADIUS and d < closest_dist:
-                    edge = self.board.edges[edge_id]
-                    if edge.player is None:
-                        closest, closest_dist = edge, d
-            self.hovered_edge = closest
+            edge = self._edge_at(x, y)
+            if edge != self.hovered_edge:
+                self.hovered_edge = edge
+                self.invalidate(LAYER_HIGHLIGHTS)
+
+    def _node_at(self, x, y):
+        """Closest legal node within NODE_SNAP_RADIUS of world point (x, y), or None."""
+        legal = self._legal_targets()
+        n = self._node_grid.nearest(x, y, NODE_SNAP_RADIUS, legal.__contains__)
+        return None if n is None else self.board.node(n)
+
+    def _edge_at(self, x, y):
+        """Closest legal edge (by midpoint) within EDGE_SNAP_RADIUS of world point (x, y), or None."""
+        legal = self._legal_targets()
+        e = self._edge_grid.nearest(x, y, EDGE_SNAP_RADIUS, legal.__contains__)
+        return None if e is None else self.board.edge(e)
 
     # -----------------------------------------------------------------------
     # Mouse press
     # -----------------------------------------------------------------------
     def on_mouse_press(self, x, y, button, modifiers):
+        # Any click may open or close a menu or popup, or pick a build
+        self.invalidate(LAYER_HIGHLIGHTS, LAYER_HUD)
+        wx, wy = self.screen_to_world(x, y)
+        x, y   = self.screen_to_hud(x, y)     # buttons, menus and the popup
+
         btn_w   = 130
         gap     = 15
         total_w = 3 * btn_w + 2 * gap
-        sx      = (SCREEN_WIDTH - total_w) / 2
+        sx      = (self.hud_w - total_w) / 2
 
         # End Turn
-        if (SCREEN_WIDTH-btn_w-15 <= x <= SCREEN_WIDTH-15) and (y <= HUD_BOTTOM_HEIGHT):
+        if (self.hud_w-btn_w-15 <= x <= self.hud_w-15) and (y <= HUD_BOTTOM_HEIGHT):
             self._end_turn()
             return
 
+        if self.engine.phase == PHASE_OVER or not self.my_turn:
+            return
+
         # Build button
         build_left = sx + btn_w + gap
         if (build_left <= x <= build_left + btn_w) and (y <= HUD_BOTTOM_HEIGHT):
@@ -769,33 +1251,31 @@ class CatanWindow(arcade.Window):
             by     = HUD_BOTTOM_HEIGHT
             menu_w = btn_w
             if (bx+8 <= x <= bx+menu_w-8) and (by+44 <= y <= by+72):
-                if self._can_afford(SETTLEMENT_COST):
+                if self._can_afford(BUILD_SETTLEMENT):
                     self.build_choice = BUILD_SETTLEMENT
+                    self._legal_targets_cache = None
                 return
             if (bx+8 <= x <= bx+menu_w-8) and (by+8 <= y <= by+36):
-                if self._can_afford(ROAD_COST):
+                if self._can_afford(BUILD_ROAD):
                     self.build_choice = BUILD_ROAD
+                    self._legal_targets_cache = None
                 return
 
         # Confirmation popup
         if self.show_confirm:
-            if self.build_choice == BUILD_SETTLEMENT and self.selected_node:
-                pcx, pcy = self._node_pixel_cache[self.selected_node.id]
-                pcy     += 18
-            elif self.build_choice == BUILD_ROAD and self.selected_edge:
-                mx, my, *_ = self._edge_pixel_cache[self.selected_edge.id]
-                pcx, pcy   = mx, my + 18
-            else:
+            anchor = self._popup_anchor()
+            if anchor is None:
                 self.show_confirm = False
                 return
+            pcx, pcy = anchor
 
             popup_w  = 160
             pop_left = pcx - popup_w / 2
 
             if (pop_left+8 <= x <= pop_left+74) and (pcy+8 <= y <= pcy+38):
-                if self.build_choice == BUILD_SETTLEMENT and self._can_afford(SETTLEMENT_COST):
+                if self.build_choice == BUILD_SETTLEMENT and self._can_afford(BUILD_SETTLEMENT):
                     self._place_settlement(self.selected_node)
-                elif self.build_choice == BUILD_ROAD and self._can_afford(ROAD_COST):
+                elif self.build_choice == BUILD_ROAD and self._can_afford(BUILD_ROAD):
                     self._place_road(self.selected_edge)
                 return
             if (pop_left+popup_w-74 <= x <= pop_left+popup_w-8) and (pcy+8 <= y <= pcy+38):
@@ -808,53 +1288,51 @@ class CatanWindow(arcade.Window):
             self.show_confirm  = False
             return
 
-        if self.build_choice == BUILD_SETTLEMENT and self.hovered_node:
-            self.selected_node = self.hovered_node
-            self.show_confirm  = True
+        # Hit-test the click itself, a press doesn't always follow a motion event
+        if self.build_choice == BUILD_SETTLEMENT:
+            node = self._node_at(wx, wy)
+            if node:
+                self.hovered_node  = node
+                self.selected_node = node
+                self.show_confirm  = True
             return
-        if self.build_choice == BUILD_ROAD and self.hovered_edge:
-            self.selected_edge = self.hovered_edge
-            self.show_confirm  = True
+        if self.build_choice == BUILD_ROAD:
+            edge = self._edge_at(wx, wy)
+            if edge:
+                self.hovered_edge  = edge
+                self.selected_edge = edge
+                self.show_confirm  = True
             return
 
     # -----------------------------------------------------------------------
     # Placement
     # -----------------------------------------------------------------------
     def _place_settlement(self, node):
-        player = PLAYERS[self.current_player_index]
-        for res, amt in SETTLEMENT_COST.items():
-            player["resources"][res] -= amt
-        node.player   = self.current_player_index
-        node.building = "settlement"
-        player["vp"] += 1
+        idx    = self.current_player_index
+        player = PLAYERS[idx]
+        if not self.engine.build_settlement(node.index):
+            print(f"{player['name']} — can't build a settlement there.")
+            self.show_confirm  = False
+            self.selected_node = None
+            return
+        self._send((MOVE_SETTLEMENT, node.index))
         self._cancel_build()
-        self._build_player_texts()
-        print(f"{player['name']} built a settlement! Victory Points: {player['vp']}")
+        self._update_pieces(nodes=[node.index])
+        self.invalidate(LAYER_HUD)
+        print(f"{player['name']} built a settlement! Victory Points: {self.engine.players[idx].victory_points}")
+        self._announce_winner()
 
     def _place_road(self, edge):
         player = PLAYERS[self.current_player_index]
-        idx    = self.current_player_index
-        connected = False
-        for node in edge.nodes:
-            if node.player == idx:
-                connected = True
-                break
-            for neighbour_edge in node.edges:
-                if neighbour_edge is not edge and neighbour_edge.player == idx:
-                    connected = True
-                    break
-            if connected:
-                break
-        if not connected:
+        if not self.engine.build_road(edge.index):
             print(f"{player['name']} — road must connect to your settlement or existing road.")
             self.show_confirm  = False
             self.selected_edge = None
             return
-        for res, amt in ROAD_COST.items():
-            player["resources"][res] -= amt
-        edge.player = self.current_player_index
+        self._send((MOVE_ROAD, edge.index))
         self._cancel_build()
-        self._build_player_texts()
+        self._update_pieces(edges=[edge.index])
+        self.invalidate(LAYER_HUD)
         print(f"{player['name']} built a road!")
 
     def _cancel_build(self):
@@ -865,20 +1343,166 @@ class CatanWindow(arcade.Window):
         self.selected_node = None
         self.selected_edge = None
         self.show_confirm  = False
+        self._legal_targets_cache = None
+        self.invalidate(LAYER_HIGHLIGHTS, LAYER_HUD)
+        self._sync_setup()
+
+    def _sync_setup(self):
+        """During the setup draft, go straight to the piece the engine expects."""
+        expects = self.engine.setup_expects()
+        if expects is not None and self.my_turn:
+            self.build_mode   = True
+            self.build_choice = expects
+
+    def _announce_winner(self):
+        if self.engine.phase == PHASE_OVER:
+            print(f"{PLAYERS[self.engine.winner]['name']} wins the game!")
 
     # -----------------------------------------------------------------------
     # End turn
     # -----------------------------------------------------------------------
     def _end_turn(self):
-        self.current_player_index = (self.current_player_index + 1) % len(PLAYERS)
+        if not self.my_turn:
+            return
+        if not self.engine.end_turn():
+            print("Finish the setup placements before ending the turn.")
+            return
+        self._send((MOVE_END_TURN,))
         self._cancel_build()
-        self._build_player_texts()
+        self.invalidate(LAYER_HUD)
         print(f"Turn ended. Now it's {PLAYERS[self.current_player_index]['name']}'s turn.")
 
+    # -----------------------------------------------------------------------
+    # Network
+    # -----------------------------------------------------------------------
+    def _send(self, move):
+        # a move the local engine has just made, for the server to confirm
+        if self.net is None:
+            return
+        self._move_seq += 1
+        self.in_flight.append((self._move_seq, move))
+        self.net.send_move(self._move_seq, move)
+
+    def on_update(self, delta_time):
+        if self.net is None:
+            return
+        for kind, payload in self.net.poll():
+            if kind == MSG_DELTA:
+                self._on_delta(payload)
+            elif kind == MSG_ACK:
+                # a move that is still in flight when its ack comes never
+                # showed up in a delta the way it was made here
+                seq, accepted = ACK.unpack(payload)
+                if any(s == seq for s, _ in self.in_flight):
+                    self.in_flight = [(s, move) for s, move in self.in_flight if s != seq]
+                    if not accepted:
+                        print("The server turned that move down.")
+                    self._resync()
+            elif kind == MSG_START:
+                self.started = True
+                self._sync_setup()
+                self.invalidate(LAYER_HIGHLIGHTS, LAYER_HUD)
+                print(f"Every seat is taken, the game starts. You are {PLAYERS[self.seat]['name']}.")
+            elif kind == MSG_CLOSED:
+                self.started = False
+                self.invalidate(LAYER_HIGHLIGHTS, LAYER_HUD)
+                print("Lost the connection to the server.")
+
+    def _on_delta(self, payload):
+        events   = [(kind, fields) for kind, fields, _ in iter_events(payload)]
+        was_mine = self.my_turn
+        for kind, fields in events:
+            apply_event(self.confirmed, kind, fields)
+
+        # The delta of our own move opens with that move, which the local
+        # engine has already made. What follows it (a roll when the turn
+        # passes, ...) is new here, payouts come along with their roll
+        start = 0
+        if self.in_flight and events and event_move(*events[0]) == (self.seat, self.in_flight[0][1]):
+            self.in_flight.pop(0)
+            start = 1
+        rest = [(kind, fields) for kind, fields in events[start:] if kind not in (EV_PAYOUT, EV_SNAPSHOT)]
+        if self.in_flight and (start == 0 or rest):
+            # moves were made here on top of a state the server has moved on from
+            self._resync()
+            return
+
+        before = self._piece_state()
+        for kind, fields in rest:
+            apply_event(self.engine, kind, fields)
+        if not self.in_flight and serialize.encode(self.engine) != serialize.encode(self.confirmed):
+            self._resync()
+            return
+        self._show_changes(before)
+
+        if start == 0:
+            self._announce_winner()
+        if self.my_turn and not was_mine:
+            print("Your turn.")
+
+    def _resync(self):
+        # back to the server's state, then the moves still in flight again
+        before = self._piece_state()
+        serialize.decode(serialize.encode(self.confirmed), self.engine)
+        for _, move in self.in_flight:
+            self.engine.apply(move)
+        self._cancel_build()
+        self._show_changes(before)
+
+    def _piece_state(self):
+        board = self.board
+        return board.node_owner.tobytes(), board.node_building.tobytes(), board.edge_owner.tobytes()
+
+    def _show_changes(self, before):
+        # redraw only the pieces that differ from before, then the HUD
+        owners, buildings, roads = before
+        now_owners, now_buildings, now_roads = self._piece_state()
+        nodes = [n for n in range(len(owners))
+                 if owners[n] != now_owners[n] or buildings[n] != now_buildings[n]]
+        edges = [e for e in range(len(roads)) if roads[e] != now_roads[e]]
+        self._update_pieces(nodes, edges)
+        self._legal_targets_cache = None
+        self._sync_setup()
+        self.invalidate(LAYER_HIGHLIGHTS, LAYER_HUD)
+
 
 def main():
-    window = CatanWindow()
+    parser = argparse.ArgumentParser(description="Coders of Catan")
+    parser.add_argument("--redraw-on-change", action="store_true",
+                        help="only repaint after the game or the UI changes (saves CPU while idle)")
+    parser.add_argument("--map", default=None,
+                        help="board map, a name from maps/ or a path to a map .json (default: standard board)")
+    parser.add_argument("--log", default=None,
+                        help="append the game's events to this log file (see eventlog.py)")
+    parser.add_argument("--connect", default=None, metavar="HOST:PORT",
+                        help="play a seat of a game on a server.py server")
+    parser.add_argument("--game", type=int, default=0, help="game id to join with --connect")
+    parser.add_argument("--local-server", action="store_true",
+                        help="play one seat against bots on a local stand-in server")
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="round trip the local stand-in server adds, in seconds")
+    args = parser.parse_args()
+
+    board_map = load_map(args.map) if args.map else None
+    log       = EventLog(args.log) if args.log else None
+    local = net = None
+    if args.local_server:
+        local = LocalServer(args.latency)
+        net   = NetClient(local.host, local.port, args.game, len(PLAYERS))
+        local.add_bots(args.game, len(PLAYERS), len(PLAYERS) - 1)
+    elif args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        net = NetClient(host, int(port), args.game, len(PLAYERS))
+    window    = CatanWindow(redraw_on_change=args.redraw_on_change, board_map=board_map, log=log, net=net)
     arcade.run()
+    if net is not None:
+        net.close()
+    if local is not None:
+        local.close()
+    if log is not None:
+        # an unfinished game is logged as it stands
+        log.end_game(window.engine if window.confirmed is None else window.confirmed)
+        log.close()
 
 
 if __name__ == "__main__":
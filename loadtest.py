@@ -0,0 +1,88 @@
+# Load test for server.py: simulated clients playing random games
+# usage: python loadtest.py --games 1000 --seats 4 --turns 40
+#        python loadtest.py --server 10.0.0.5:8765     against a running server
+#
+# Without --server a server is started in a child process on localhost.
+# Every seat of every game is its own TCP connection running a RandomBot on
+# a replica of the game kept in sync from the server's deltas. Up to
+# --concurrent games are open at a time. A move's latency is from sending it
+# to its ack, which the server sends after the move's delta
+import argparse
+import asyncio
+import multiprocessing
+import statistics
+import time
+
+from netclient import bot_seat
+from server import GameServer
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.rejected = 0
+        self.delta_bytes = 0
+        self.deltas = 0
+        self.games = 0
+
+
+async def run(host, port, games, seats, turns, concurrent, seed):
+    stats = Stats()
+    limit = asyncio.Semaphore(concurrent)
+
+    async def play_game(game_id):
+        async with limit:
+            await asyncio.gather(*(bot_seat(host, port, game_id, seats, seed + game_id * seats + s,
+                                            turns=turns, stats=stats)
+                                   for s in range(seats)))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(play_game(game_id) for game_id in range(games)))
+    return stats, time.perf_counter() - start
+
+
+def _serve(host, port, ready):
+    asyncio.run(GameServer(0).serve(host, port, ready))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the game server with simulated clients")
+    parser.add_argument("--server", default=None, help="host:port of a running server (default: start one)")
+    parser.add_argument("--port", type=int, default=8765, help="port for the server started here")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seats", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=40, help="turns played per game")
+    parser.add_argument("--concurrent", type=int, default=1000, help="games open at once")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = None
+    if args.server:
+        host, port = args.server.rsplit(":", 1)
+        port = int(port)
+    else:
+        host, port = "127.0.0.1", args.port
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(target=_serve, args=(host, port, ready), daemon=True)
+        server.start()
+        ready.wait(10)
+
+    try:
+        stats, elapsed = asyncio.run(run(host, port, args.games, args.seats, args.turns,
+                                         args.concurrent, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+
+    lat = sorted(stats.latencies)
+    moves = len(lat)
+    print(f"{stats.games} games, {args.games * args.seats} clients, {moves} moves in {elapsed:.2f}s "
+          f"({moves / elapsed:,.0f} moves/s), {stats.rejected} rejected")
+    if lat:
+        print(f"move latency p50 {statistics.median(lat) * 1000:.2f} ms, "
+              f"p99 {lat[int(moves * 0.99)] * 1000:.2f} ms, max {lat[-1] * 1000:.2f} ms")
+    print(f"deltas: {stats.deltas}, {stats.delta_bytes / max(stats.deltas, 1):.1f} bytes on average")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,38 @@
 # Runner file
+from backend import GameEngine, PHASE_SETUP, MOVE_SETTLEMENT, MOVE_ROAD
+from bots import SetupEvaluator
+from player import Player
 
-def setup():
-    pass
-    #NOTE: not exactly sure where to put this yet but here is the general idea
-    #loop through players
 
-    #get player selection of settlement 1
+def setup(engine, policies=None):
+    """
+    Play the setup draft on a fresh GameEngine.
 
-    #get player selection of road 1
+    The engine enforces the order: every seat places a settlement and a road,
+    then the same again in reverse seat order, and the second settlement pays
+    out its surrounding tiles. A seat with a policy in `policies` picks its own
+    moves through choose_move; every other seat (all of them by default) uses
+    the SetupEvaluator.
+    """
+    evaluator = SetupEvaluator(engine.board)
+    #loop through players, then through players in reverse
+    while engine.phase == PHASE_SETUP:
+        seat = engine.current
+        policy = policies[seat] if policies else None
+        if policy is not None:
+            engine.apply(policy.choose_move(engine, engine.legal_moves()))
+        elif engine.setup_node is None:
+            #get player selection of settlement
+            n = evaluator.best_settlement(seat, engine.legal_settlement_mask(seat))
+            engine.apply((MOVE_SETTLEMENT, n))
+        else:
+            #get player selection of road
+            e = evaluator.best_road(seat, engine.setup_node, engine.legal_road_mask(seat))
+            engine.apply((MOVE_ROAD, e))
+    return engine
 
-    #loop through players in reverse
 
-    #get player selection of settlement 2
-
-    #get player selection of road 2
-
-    #give players the resources from their settlement 2
+if __name__ == "__main__":
+    engine = setup(GameEngine([Player(None, f"Player {i + 1}") for i in range(4)]))
+    for p in engine.players:
+        print(p.name, p.resource_cards)
@@ -0,0 +1,193 @@
+# Network client for the window, and a local stand-in server to try it on
+#
+# The window runs pyglet's loop, not asyncio, so NetClient keeps its
+# connection on an asyncio loop in a background thread: moves go out through
+# call_soon_threadsafe and frames coming in wait in a queue until the window
+# polls for them once a frame. Joining blocks until the server's WELCOME,
+# the window can't draw anything before it has the state.
+#
+# LocalServer is server.py's GameServer on a thread of its own, reached
+# through a proxy that holds every chunk back for half the latency each way,
+# with RandomBots filling the seats a local player doesn't take.
+#
+#   python frontend.py --local-server --latency 0.2
+#   python frontend.py --connect 10.0.0.5:8765 --game 7
+import asyncio
+import queue
+import threading
+import time
+
+import serialize
+from backend import PHASE_OVER
+from bots import RandomBot
+from eventlog import apply_events
+from server import (GameServer, JOIN, WELCOME, ACK, MSG_JOIN, MSG_MOVE, MSG_WELCOME, MSG_START, MSG_DELTA,
+                    MSG_ACK, SEAT_FULL, frame, read_frame, encode_move)
+
+MSG_CLOSED = 0 # not on the wire, queued when the connection goes away
+
+JOIN_TIMEOUT = 10.0
+
+
+def _start_loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    return loop, thread
+
+
+class NetClient:
+    """One seat's connection to a server.py game."""
+
+    def __init__(self, host, port, game_id=0, seats=4):
+        self.inbox = queue.SimpleQueue()
+        self._loop, self._thread = _start_loop()
+        self._writer = None
+        self._receiver = None # the loop only keeps weak references to its tasks
+        # (seat, encoded state) from the WELCOME
+        self.seat, self.state = asyncio.run_coroutine_threadsafe(
+            self._join(host, port, game_id, seats), self._loop).result(JOIN_TIMEOUT)
+
+    async def _join(self, host, port, game_id, seats):
+        reader, self._writer = await asyncio.open_connection(host, port)
+        self._writer.write(frame(MSG_JOIN, JOIN.pack(game_id, seats)))
+        kind, payload = await read_frame(reader)
+        if kind != MSG_WELCOME or WELCOME.unpack_from(payload)[1] == SEAT_FULL:
+            self._writer.close()
+            raise ConnectionError(f"no seat in game {game_id}")
+        self._receiver = self._loop.create_task(self._receive(reader))
+        return WELCOME.unpack_from(payload)[1], payload[WELCOME.size:]
+
+    async def _receive(self, reader):
+        try:
+            while True:
+                self.inbox.put(await read_frame(reader))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.inbox.put((MSG_CLOSED, b""))
+
+    def send_move(self, seq, move):
+        self._loop.call_soon_threadsafe(self._writer.write, frame(MSG_MOVE, encode_move(seq, move)))
+
+    def poll(self):
+        # every (type, payload) received since the last call, oldest first
+        frames = []
+        while True:
+            try:
+                frames.append(self.inbox.get_nowait())
+            except queue.Empty:
+                return frames
+
+    def close(self):
+        if self._writer is not None:
+            self._loop.call_soon_threadsafe(self._writer.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(1.0)
+
+
+# ---------------------------------------------------------------------------
+# local stand-in server
+# ---------------------------------------------------------------------------
+async def bot_seat(host, port, game_id, seats, seed=None, think=0.0, turns=None, stats=None):
+    """
+    A RandomBot on one seat of a server game until it ends (or has played
+    `turns` turns), taking think seconds a move. stats (loadtest.Stats)
+    collects move latencies, send to ack, rejects and delta sizes. Raises
+    ConnectionError when the game has no seat left.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(frame(MSG_JOIN, JOIN.pack(game_id, seats)))
+        kind, payload = await read_frame(reader)
+        seat = WELCOME.unpack_from(payload)[1]
+        if kind != MSG_WELCOME or seat == SEAT_FULL:
+            raise ConnectionError(f"no seat in game {game_id}")
+        engine = serialize.decode(payload[WELCOME.size:])
+        engine.auto_roll = False
+        bot = RandomBot(seed=seed)
+        started = False
+        sent = None # when the move in flight was sent
+        seq = 0
+        while engine.phase != PHASE_OVER and (turns is None or engine.turn < turns):
+            if started and sent is None and engine.current == seat:
+                if think:
+                    await asyncio.sleep(think)
+                seq += 1
+                writer.write(frame(MSG_MOVE, encode_move(seq, bot.choose_move(engine, engine.legal_moves()))))
+                sent = time.perf_counter()
+            kind, payload = await read_frame(reader)
+            if kind == MSG_START:
+                started = True
+            elif kind == MSG_DELTA:
+                apply_events(engine, payload)
+                if stats is not None:
+                    stats.deltas += 1
+                    stats.delta_bytes += len(payload)
+            elif kind == MSG_ACK:
+                if stats is not None:
+                    stats.latencies.append(time.perf_counter() - sent)
+                    stats.rejected += not ACK.unpack(payload)[1]
+                sent = None
+        if stats is not None and seat == 0:
+            stats.games += 1
+    finally:
+        writer.close()
+
+
+class LocalServer:
+    """
+    A GameServer on a background thread for trying the networked window on
+    one machine. Connect to .port, which adds latency seconds to every round
+    trip (half on the way in, half on the way out).
+    """
+
+    def __init__(self, latency=0.2, seed=None, host="127.0.0.1"):
+        self.latency = latency
+        self.host = host
+        self.server = GameServer(seed)
+        self.bots = [] # futures of the bot seats, which also keep them alive
+        self._loop, self._thread = _start_loop()
+        self.server_port, self.port = asyncio.run_coroutine_threadsafe(self._start(), self._loop).result(JOIN_TIMEOUT)
+
+    async def _start(self):
+        server = await asyncio.start_server(self.server.handle, self.host, 0)
+        proxy = await asyncio.start_server(self._proxy, self.host, 0)
+        return server.sockets[0].getsockname()[1], proxy.sockets[0].getsockname()[1]
+
+    async def _proxy(self, reader, writer):
+        up_reader, up_writer = await asyncio.open_connection(self.host, self.server_port)
+        await asyncio.gather(self._pipe(reader, up_writer), self._pipe(up_reader, writer))
+
+    async def _pipe(self, reader, writer):
+        # forward everything half a round trip late, in the order it came
+        loop = asyncio.get_running_loop()
+        held = asyncio.Queue()
+
+        async def deliver():
+            while True:
+                due, data = await held.get()
+                if data is None:
+                    writer.close()
+                    return
+                await asyncio.sleep(max(0.0, due - loop.time()))
+                writer.write(data)
+
+        task = loop.create_task(deliver())
+        try:
+            while data := await reader.read(65536):
+                held.put_nowait((loop.time() + self.latency / 2, data))
+        except ConnectionError:
+            pass
+        finally:
+            held.put_nowait((0.0, None))
+            await task
+
+    def add_bots(self, game_id, seats, count, seed=None, think=0.5):
+        # bots go straight to the server, the latency is the local player's
+        for i in range(count):
+            self.bots.append(asyncio.run_coroutine_threadsafe(
+                bot_seat(self.host, self.server_port, game_id, seats,
+                         None if seed is None else seed + i, think), self._loop))
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(1.0)
@@ -1,59 +1,290 @@
-import arcade.color
+from collections import namedtuple
+
+# development card kinds, the index is what serialized states store
+DEV_CARDS = ('KNIGHT', 'VICTORY_POINT', 'ROAD_BUILDING', 'YEAR_OF_PLENTY', 'MONOPOLY')
+
+# board resource name -> resource card it pays out
+CARD_FOR_RESOURCE = {'brick': 'BRICK', 'ore': 'ORE', 'wheat': 'WHEAT', 'sheep': 'SHEEP', 'forest': 'WOOD'}
+# resource cards in the board's resource order (backend.RESOURCES)
+CARDS = tuple(CARD_FOR_RESOURCE.values())
+
+
+# ---------------------------------------------------------------------------
+# Resource vectors
+# ---------------------------------------------------------------------------
+# A hand or a cost is one int with a FIELD bit count per resource, CARDS
+# order from the low bits up. Paying and collecting are then a single add or
+# subtract for all five counts, and so is checking a cost: the top bit of
+# every field is a guard, (hand | GUARDS) - cost can't borrow across fields
+# and leaves a field's guard set exactly when the hand has enough of that
+# resource. Counts go up to 32767 a resource: nothing takes cards away from
+# a hand yet (no robber, no discards), long games pile up hundreds.
+FIELD  = 16                         # bits per resource
+MASK   = (1 << FIELD) - 1
+LANE   = FIELD * len(CARDS)         # bits per hand
+GUARDS = sum(1 << FIELD * i + FIELD - 1 for i in range(len(CARDS)))
+_SHIFTS = tuple(FIELD * i for i in range(len(CARDS)))
+
+# every way of naming a resource -> its field
+_INDEX = {**{card: i for i, card in enumerate(CARDS)},
+          **{resource: CARDS.index(card) for resource, card in CARD_FOR_RESOURCE.items()},
+          **{i: i for i in range(len(CARDS))}}
+
+
+class ResourceVector:
+    """
+    Resource counts packed in one int (.bits, see above). Reads like the dict
+    it replaces: hand['WOOD'], hand['forest'] and hand[4] are the same count,
+    and keys(), values() and items() go in CARDS order.
+
+    ResourceVector(counts) takes packed bits (an int), a mapping of card or
+    resource names to counts, or the five counts in CARDS order.
+    """
+    __slots__ = ("bits",)
+
+    def __init__(self, counts=0):
+        if isinstance(counts, int):
+            self.bits = counts
+        elif hasattr(counts, "items"):
+            self.bits = sum(n << FIELD * _INDEX[key] for key, n in counts.items())
+        else:
+            self.bits = sum(n << FIELD * i for i, n in enumerate(counts))
+
+    def __getitem__(self, key):
+        return self.bits >> FIELD * _INDEX[key] & MASK
+
+    def __setitem__(self, key, count):
+        shift = FIELD * _INDEX[key]
+        self.bits += (count - (self.bits >> shift & MASK)) << shift
+
+    def __iter__(self):
+        return iter(CARDS)
+
+    def __len__(self):
+        return len(CARDS)
+
+    def keys(self):
+        return CARDS
+
+    def values(self):
+        bits = self.bits
+        return tuple(bits >> shift & MASK for shift in _SHIFTS)
+
+    def items(self):
+        return tuple(zip(CARDS, self.values()))
+
+    def total(self):
+        return sum(self.values())
+
+    def covers(self, cost):
+        # at least cost's count of every resource, in one subtraction
+        return ((self.bits | GUARDS) - cost.bits) & GUARDS == GUARDS
+
+    def affordable(self):
+        # bit b set when this hand covers BUILD_COSTS[b]
+        return affordable((self,))
+
+    # adding and removing cards in place (a ResourceVector or packed bits);
+    # only take away what covers() said is there
+    def __iadd__(self, other):
+        self.bits += other if isinstance(other, int) else other.bits
+        return self
+
+    def __isub__(self, other):
+        self.bits -= other if isinstance(other, int) else other.bits
+        return self
+
+    def __add__(self, other):
+        return ResourceVector(self.bits).__iadd__(other)
+
+    def __sub__(self, other):
+        return ResourceVector(self.bits).__isub__(other)
+
+    def __eq__(self, other):
+        if isinstance(other, ResourceVector):
+            return self.bits == other.bits
+        return NotImplemented
+
+    __hash__ = None # hands change in place
+
+    def copy(self):
+        return ResourceVector(self.bits)
+
+    def __repr__(self):
+        return f"ResourceVector({dict(self.items())})"
+
+
+def resource_bits(resource, amount=1):
+    # packed bits of amount cards of one resource (any name _INDEX knows)
+    return amount << FIELD * _INDEX[resource]
+
+
+# build costs
+ROAD_COST       = ResourceVector({'WOOD': 1, 'BRICK': 1})
+SETTLEMENT_COST = ResourceVector({'WOOD': 1, 'BRICK': 1, 'WHEAT': 1, 'SHEEP': 1})
+CITY_COST       = ResourceVector({'WHEAT': 2, 'ORE': 3})
+DEV_CARD_COST   = ResourceVector({'WHEAT': 1, 'SHEEP': 1, 'ORE': 1})
+
+BUILDS      = ("road", "settlement", "city", "dev_card")
+BUILD_COSTS = (ROAD_COST, SETTLEMENT_COST, CITY_COST, DEV_CARD_COST)
+HAND_STRIDE = LANE * len(BUILDS) # one hand's room in a packed batch, a lane per build
+
+# seat offers partner (a seat, None for the bank) give_amount cards of
+# resource give for get_amount of get, resources as indexes into CARDS
+TradeOffer = namedtuple("TradeOffer", "seat partner give give_amount get get_amount")
+TRADE_LIMIT = 255 # most cards on either side of a trade (the event log stores a byte)
+
+_SPREAD = sum(1 << LANE * b for b in range(len(BUILDS))) # a hand -> one copy per build
+_SHORT  = bytes.maketrans(b"\x00\x80", b"10")             # lane top byte -> affordable bit
+_afford_tables = {} # hand count -> (costs, guards, lane fill, lane tops)
+
+
+def _afford_table(hands):
+    # every build cost once per hand, a LANE each, and the guards and the
+    # lane constants of the zero test, tiled over as many lanes
+    if hands not in _afford_tables:
+        lanes = hands * len(BUILDS)
+        tile = lambda value: sum(value << LANE * i for i in range(lanes))
+        costs = 0
+        for h in range(hands):
+            for b, cost in enumerate(BUILD_COSTS):
+                costs |= cost.bits << LANE * (h * len(BUILDS) + b)
+        _afford_tables[hands] = (costs, tile(GUARDS), tile((1 << LANE - 1) - 1), tile(1 << LANE - 1))
+    return _afford_tables[hands]
+
+
+def affordable(hands):
+    """
+    Which builds every hand can pay for, from a single subtraction: bit
+    h * len(BUILDS) + b of the result is set when hands[h] covers
+    BUILD_COSTS[b].
+    """
+    packed = 0
+    for h, hand in enumerate(hands):
+        packed |= hand.bits << HAND_STRIDE * h
+    return affordable_packed(packed, len(hands))
+
+
+def affordable_packed(packed, count):
+    # affordable() for count hands already packed into one int, hand h's
+    # bits at HAND_STRIDE * h
+    costs, guards, fill, tops = _afford_table(count)
+    # each hand once per build, a lane each, minus that build's cost
+    short = ((packed * _SPREAD | guards) - costs) & guards ^ guards
+    # a lane's short resources are at most 5 low bits, adding fill carries
+    # into the lane's top bit if there are any
+    short = (short >> FIELD - 1) + fill & tops
+    # the top bytes read from the last lane down are the result's bits
+    return int(short.to_bytes(count * HAND_STRIDE // 8, "big")[::LANE // 8].translate(_SHORT), 2)
 
 
 class Player:
-    def __init__(self, color):
+    def __init__(self, color, name=""):
+        self.color = color
+        self.name = name
+        self.seat = None # index on the board's ownership arrays, set by the GameEngine
+        self.reset()
+
+    def reset(self):
+        # per-game state, so one Player can be reused across games
         self.victory_points = 0
-        self.resource_cards = {'WOOD':0, 'WHEAT':0, 'BRICK': 0, 'SHEEP': 0, 'ORE':0}
+        self.resource_cards = ResourceVector()
         self.development_cards = [] # we'll come back to this
         self.total_roads = 15
         self.total_settlements = 5
         self.total_cities = 4
-        self.color = color
 
-    def accept_trade(self): #option to accept a trade from a player
-        pass
+    # per-game state as a tuple and back, used by GameEngine.snapshot/restore
+    def snapshot(self):
+        return (self.victory_points, self.resource_cards.bits, tuple(self.development_cards),
+                self.total_roads, self.total_settlements, self.total_cities)
 
-    def offer_trade(self): #offer a trade to another player
-        pass
+    def restore(self, state):
+        self.victory_points, cards, dev_cards, \
+            self.total_roads, self.total_settlements, self.total_cities = state
+        # cards: packed bits (snapshot) or counts in CARDS order (serialize)
+        self.resource_cards = ResourceVector(cards)
+        self.development_cards = list(dev_cards)
+
+    def can_afford(self, cost):
+        return self.resource_cards.covers(cost)
+
+    def pay(self, cost):
+        self.resource_cards -= cost
+
+    def collect(self, card, amount=1):
+        # card: any resource name, amount may be negative (cards given away)
+        self.resource_cards += resource_bits(card, amount)
+
+    def offer_trade(self, partner, give, give_amount, get, get_amount):
+        # a TradeOffer to partner (a seat, None for the bank), None when it
+        # isn't a trade or this hand doesn't hold what it offers
+        if give not in range(len(CARDS)) or get not in range(len(CARDS)) or give == get:
+            return None
+        if not (0 < give_amount <= TRADE_LIMIT and 0 < get_amount <= TRADE_LIMIT) \
+                or self.resource_cards[give] < give_amount:
+            return None
+        return TradeOffer(self.seat, partner, give, give_amount, get, get_amount)
+
+    def accept_trade(self, offer, offerer):
+        # take an offer made to this player by the Player offerer, moving
+        # both sides at once; False if either hand no longer holds its side
+        if self.resource_cards[offer.get] < offer.get_amount or \
+                offerer.resource_cards[offer.give] < offer.give_amount:
+            return False
+        cards = resource_bits(offer.give, offer.give_amount) - resource_bits(offer.get, offer.get_amount)
+        offerer.resource_cards -= cards
+        self.resource_cards += cards
+        return True
 
     def buy_dev_card(self): #buy dev cards
-        if (self.resource_cards['WHEAT'] > 0 and self.resource_cards['SHEEP'] > 0
-         and self.resource_cards['ORE'] > 0):
+        if self.can_afford(DEV_CARD_COST):
             pass
         pass
 
-    def build_road(self, board, edge):
+    # the build methods take the board and a node/edge index and return
+    # whether the piece was placed. free=True skips the cost (setup phase),
+    # the caller is responsible for the setup placement rules in that case
+    def build_road(self, board, edge, free=False):
 
-        #check if player has sufficient resources
-        if self.resource_cards['WOOD'] > 0 and self.resource_cards['BRICK'] > 0:
-            # if a road can be placed, deduct resources and 1 from total_road, then place
-            if edge.is_valid_road_placement(board):
-                self.resource_cards['WOOD'] -= 1
-                self.resource_cards['BRICK'] -= 1
-                self.total_roads -= 1
-                edge.place_road(board)
+        #check if player has sufficient resources and a road left
+        if self.total_roads <= 0 or not (free or self.can_afford(ROAD_COST)):
+            return False
+        # if a road can be placed, deduct resources and 1 from total_road, then place
+        if not free and not board.is_valid_road_placement(edge, self.seat):
+            return False
+        if not free:
+            self.pay(ROAD_COST)
+        self.total_roads -= 1
+        board.place_road(edge, self.seat)
+        return True
 
-        pass
+    def build_settlement(self, board, node, free=False):
 
-    def build_settlement(self, board, node):
-
-        # check if player has sufficient resources
-        if (self.resource_cards['WOOD'] > 0 and self.resource_cards['BRICK'] > 0
-                and self.resource_cards['WHEAT'] > 0 and self.resource_cards['SHEEP'] > 0):
-            # if a settlement can be placed, deduct resources and 1 from total_settlements, then place
-            if node.is_valid_settlement_placement(board):
-                self.resource_cards['WOOD'] -= 1
-                self.resource_cards['BRICK'] -= 1
-                self.resource_cards['SHEEP'] -= 1
-                self.resource_cards['WHEAT'] -= 1
-                self.total_settlements -= 1
-                node.place_settlement(board)
-        pass
+        # check if player has sufficient resources and a settlement left
+        if self.total_settlements <= 0 or not (free or self.can_afford(SETTLEMENT_COST)):
+            return False
+        # if a settlement can be placed, deduct resources and 1 from total_settlements, then place
+        if not free and not board.is_valid_settlement_placement(node, self.seat):
+            return False
+        if not free:
+            self.pay(SETTLEMENT_COST)
+        self.total_settlements -= 1
+        self.victory_points += 1
+        board.place_settlement(node, self.seat)
+        return True
 
-    def build_city(self, settlement):
+    def build_city(self, board, node):
 
-        # check if player has sufficient resources
-        if self.resource_cards['WHEAT'] >= 2 and self.resource_cards['ORE'] >= 3:
-            pass
-        pass
+        # check if player has sufficient resources and owns a settlement there
+        if self.total_cities <= 0 or not self.can_afford(CITY_COST):
+            return False
+        if board.node_owner[node] != self.seat or board.node_building[node] != 1:
+            return False
+        self.pay(CITY_COST)
+        # the settlement piece goes back to the player's supply
+        self.total_cities -= 1
+        self.total_settlements += 1
+        self.victory_points += 1
+        board.place_city(node, self.seat)
+        return True
@@ -0,0 +1,275 @@
+# Compact binary game states
+#
+# encode(engine) packs everything a game needs to continue, the dealt board,
+# the pieces on it, the players' hands and pieces and the turn state, into a
+# few hundred bytes (about 170 for 4 players on the standard board);
+# decode(data) turns it back into a GameEngine. A pickle of the engine is
+# around 15KB mid game, which adds up for checkpoints, network sync and
+# training sets of billions of positions.
+#
+# StateView reads single fields straight out of an encoded state (bytes,
+# bytearray, memoryview, an mmap) without copying or decoding the rest, for
+# scanning stored positions.
+#
+# Layout, version 1, little endian:
+#
+#   header      HEADER below
+#   layout      only with FLAG_LAYOUT (not the standard board): one "<3h"
+#               cube coordinate per tile, the topology is rebuilt from them
+#   tiles       1 byte per tile, resource << 4 | number
+#   nodes       1 nibble per node (low nibble first), 0 empty, otherwise
+#               1 + seat * 2 + (building - 1)
+#   edges       1 nibble per edge, 0 empty, otherwise 1 + seat
+#   ports       1 byte per port, resource index or GENERIC_PORT, in the
+#               order set_ports() got them (their edges follow from the layout)
+#   players     per seat PLAYER below, then one byte per dev card (DEV_CARDS)
+#
+# Not stored: player names and colors (the seat is the identity) and the
+# dice generator, a decoded game rolls fresh dice.
+import argparse
+import struct
+import time
+
+from backend import (CatanBoard, GameEngine, BoardTopology, RESOURCES, GENERIC_PORT,
+                     PHASE_SETUP, PHASE_MAIN, PHASE_OVER, NO_PLAYER, STANDARD_HEXES,
+                     standard_topology)
+from player import Player, CARDS, DEV_CARDS
+
+MAGIC   = b"CS"
+VERSION = 1
+
+FLAG_LAYOUT = 1 # tile coordinates follow the header
+
+PHASES = (PHASE_SETUP, PHASE_MAIN, PHASE_OVER)
+
+# magic, version, flags, seats, phase, current, turn, dice (d1 << 4 | d2, 0
+# before the first roll), winner, longest road, setup step, setup node
+# (NO_INDEX for None), vp to win, tiles, nodes, edges, ports
+HEADER = struct.Struct("<2sBBBBBHBbbBHBHHHH")
+NO_INDEX = 0xffff # so boards can have up to 0xfffe tiles, nodes and edges
+# victory points, cards (in WIRE_CARDS order), roads, settlements, cities
+# left, dev cards
+PLAYER = struct.Struct("<B5HBBBB")
+# the order hands were stored in before they became player.ResourceVectors,
+# kept so version 1 states stay readable
+WIRE_CARDS = ('WOOD', 'WHEAT', 'BRICK', 'SHEEP', 'ORE')
+_FROM_WIRE = tuple(WIRE_CARDS.index(card) for card in CARDS)
+COORD  = struct.Struct("<3h")
+
+# byte -> byte lookup tables, so packing and unpacking whole arrays is a
+# handful of bytes.translate() calls instead of a python loop per entry
+_LOW_NIBBLE  = bytes(b & 15 for b in range(256))
+_HIGH_NIBBLE = bytes(b >> 4 for b in range(256))
+_TILE_RESOURCE = _HIGH_NIBBLE
+_TILE_NUMBER   = _LOW_NIBBLE
+_NODE_OWNER    = bytes(0xff if not c else (c - 1) // 2 for c in range(16)) + bytes(240)
+_NODE_BUILDING = bytes(0 if not c else (c - 1) % 2 + 1 for c in range(16)) + bytes(240)
+_EDGE_OWNER    = bytes(0xff if not c else c - 1 for c in range(16)) + bytes(240)
+_EDGE_CODE     = bytes((b + 1) & 0xff if b < 16 or b == 0xff else 0 for b in range(256))
+
+_topologies = {} # layout bytes -> frozen topology, shared like standard_topology()
+
+
+def _pack_nibbles(codes):
+    # codes: bytes of values 0-15
+    if len(codes) % 2:
+        codes += b"\0"
+    return bytes(lo | hi << 4 for lo, hi in zip(codes[0::2], codes[1::2]))
+
+
+def _unpack_nibbles(packed, count):
+    out = bytearray(len(packed) * 2)
+    out[0::2] = packed.translate(_LOW_NIBBLE)
+    out[1::2] = packed.translate(_HIGH_NIBBLE)
+    return bytes(out[:count])
+
+
+def _is_standard(topo):
+    return topo is standard_topology() or topo.tile_ids == STANDARD_HEXES
+
+
+def _topology(layout):
+    # topology for the layout section of a state, built once per layout
+    if layout not in _topologies:
+        hexes = [COORD.unpack_from(layout, i) for i in range(0, len(layout), COORD.size)]
+        _topologies[layout] = BoardTopology(hexes).freeze()
+    return _topologies[layout]
+
+
+# ---------------------------------------------------------------------------
+# encoding
+# ---------------------------------------------------------------------------
+def encode(engine):
+    """Pack a GameEngine's state, see the layout above."""
+    board = engine.board
+    topo = board.topology
+    if max(topo.num_tiles, topo.num_nodes, topo.num_edges) >= NO_INDEX:
+        raise ValueError(f"boards of more than {NO_INDEX - 1} tiles, nodes or edges can't be encoded")
+    standard = _is_standard(topo)
+    dice = engine.dice[0] << 4 | engine.dice[1] if engine.dice else 0
+    none = lambda v, null=-1: null if v is None else v
+    out = [HEADER.pack(MAGIC, VERSION, 0 if standard else FLAG_LAYOUT, len(engine.players),
+                       PHASES.index(engine.phase), engine.current, engine.turn, dice,
+                       none(engine.winner), none(engine.longest_road), engine.setup_step,
+                       none(engine.setup_node, NO_INDEX), engine.vp_to_win,
+                       topo.num_tiles, topo.num_nodes, topo.num_edges, len(board.ports))]
+    if not standard:
+        out.extend(COORD.pack(*xyz) for xyz in topo.tile_ids)
+
+    out.append(bytes(r << 4 | n for r, n in zip(board.tile_resource, board.tile_number)))
+    out.append(_pack_nibbles(bytes(0 if owner == NO_PLAYER else 1 + owner * 2 + building - 1
+                                   for owner, building in zip(board.node_owner, board.node_building))))
+    out.append(_pack_nibbles(board.edge_owner.tobytes().translate(_EDGE_CODE)))
+    out.append(bytes(GENERIC_PORT if resource is None else RESOURCES.index(resource)
+                     for _, resource in board.ports))
+
+    for p in engine.players:
+        out.append(PLAYER.pack(p.victory_points, *(p.resource_cards[card] for card in WIRE_CARDS), p.total_roads,
+                               p.total_settlements, p.total_cities, len(p.development_cards)))
+        out.append(bytes(DEV_CARDS.index(card) for card in p.development_cards))
+    return b"".join(out)
+
+
+# ---------------------------------------------------------------------------
+# decoding
+# ---------------------------------------------------------------------------
+class StateView:
+    """
+    Read-only view of an encoded state. Only the header is unpacked up
+    front, everything else is read from the buffer when asked for.
+    """
+
+    def __init__(self, data):
+        buf = memoryview(data)
+        if buf.nbytes < HEADER.size or bytes(buf[:2]) != MAGIC:
+            raise ValueError("not an encoded game state")
+        (_, version, self.flags, self.seats, phase, self.current, self.turn, dice,
+         winner, longest, self.setup_step, setup_node, self.vp_to_win,
+         self.num_tiles, self.num_nodes, self.num_edges, self.num_ports) = HEADER.unpack_from(buf)
+        if version != VERSION:
+            raise ValueError(f"unsupported state version {version}")
+        self.phase = PHASES[phase]
+        self.dice = (dice >> 4, dice & 15) if dice else None
+        self.winner = None if winner < 0 else winner
+        self.longest_road = None if longest < 0 else longest
+        self.setup_node = None if setup_node == NO_INDEX else setup_node
+
+        # section offsets
+        offset = HEADER.size
+        self._layout = offset
+        if self.flags & FLAG_LAYOUT:
+            offset += self.num_tiles * COORD.size
+        self._tiles = offset
+        self._nodes = offset = offset + self.num_tiles
+        self._edges = offset = offset + (self.num_nodes + 1) // 2
+        self._ports = offset = offset + (self.num_edges + 1) // 2
+        offset += self.num_ports
+        self._players = []
+        for _ in range(self.seats):
+            self._players.append(offset)
+            if offset + PLAYER.size > buf.nbytes:
+                raise ValueError("truncated game state")
+            offset += PLAYER.size + buf[offset + PLAYER.size - 1]
+        if offset > buf.nbytes:
+            raise ValueError("truncated game state")
+        self.size = offset
+        self._buf = buf
+
+    @property
+    def topology(self):
+        if not self.flags & FLAG_LAYOUT:
+            return standard_topology()
+        return _topology(bytes(self._buf[self._layout:self._tiles]))
+
+    def tile(self, t):
+        # (resource index into TERRAINS, number)
+        b = self._buf[self._tiles + t]
+        return b >> 4, b & 15
+
+    def node(self, n):
+        # (seat or NO_PLAYER, building index into BUILDINGS)
+        code = self._buf[self._nodes + n // 2] >> (n % 2 * 4) & 15
+        return (NO_PLAYER, 0) if not code else ((code - 1) // 2, (code - 1) % 2 + 1)
+
+    def edge(self, e):
+        code = self._buf[self._edges + e // 2] >> (e % 2 * 4) & 15
+        return code - 1 if code else NO_PLAYER
+
+    def player(self, seat):
+        # (victory points, cards in CARDS order, dev cards, roads, settlements, cities left),
+        # the tuple Player.restore() takes
+        offset = self._players[seat]
+        vp, *cards, roads, settlements, cities, devs = PLAYER.unpack_from(self._buf, offset)
+        dev_cards = tuple(DEV_CARDS[d] for d in self._buf[offset + PLAYER.size:offset + PLAYER.size + devs])
+        return vp, tuple(cards[i] for i in _FROM_WIRE), dev_cards, roads, settlements, cities
+
+    def board_arrays(self):
+        # (tile resources, tile numbers, node owners, node buildings, edge
+        # owners, port types) as CatanBoard.load_state() takes them
+        buf = self._buf
+        tiles = bytes(buf[self._tiles:self._nodes])
+        nodes = _unpack_nibbles(bytes(buf[self._nodes:self._edges]), self.num_nodes)
+        edges = _unpack_nibbles(bytes(buf[self._edges:self._ports]), self.num_edges)
+        ports = [None if k == GENERIC_PORT else RESOURCES[k]
+                 for k in buf[self._ports:self._ports + self.num_ports]]
+        return (tiles.translate(_TILE_RESOURCE), tiles.translate(_TILE_NUMBER),
+                nodes.translate(_NODE_OWNER), nodes.translate(_NODE_BUILDING),
+                edges.translate(_EDGE_OWNER), ports)
+
+
+def decode(data, engine=None):
+    """
+    Rebuild a game from encode()'s output. With an engine the state is
+    loaded into it in place (it must have the same number of players),
+    otherwise a new GameEngine with placeholder players is made.
+    """
+    view = StateView(data)
+    topology = view.topology
+    if engine is None:
+        players = [Player(None, f"Player {seat + 1}") for seat in range(view.seats)]
+        engine = GameEngine(players, board=CatanBoard(topology))
+    elif len(engine.players) != view.seats:
+        raise ValueError(f"state has {view.seats} players, the engine {len(engine.players)}")
+
+    engine.board.load_state(topology, *view.board_arrays())
+    for seat, p in enumerate(engine.players):
+        p.restore(view.player(seat))
+    engine.phase, engine.current, engine.turn, engine.dice = view.phase, view.current, view.turn, view.dice
+    engine.winner, engine.longest_road = view.winner, view.longest_road
+    engine.setup_step, engine.setup_node = view.setup_step, view.setup_node
+    engine.vp_to_win = view.vp_to_win
+    return engine
+
+
+# ---------------------------------------------------------------------------
+# size / speed report
+# ---------------------------------------------------------------------------
+def main():
+    import pickle
+    from bots import RandomBot
+    from main import setup
+
+    parser = argparse.ArgumentParser(description="Encoded state size and speed")
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    engine = GameEngine([Player(None, f"Bot {i + 1}") for i in range(args.players)], seed=0)
+    setup(engine)
+    bot = RandomBot(seed=0)
+    while engine.turn < args.turns and engine.phase != PHASE_OVER:
+        engine.apply(bot.choose_move(engine, engine.legal_moves()))
+
+    data = encode(engine)
+    for name, fn in (("encode", lambda: encode(engine)), ("decode", lambda: decode(data, engine)),
+                     ("view", lambda: StateView(data).player(0))):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            fn()
+        print(f"{name}: {(time.perf_counter() - start) / args.repeat * 1e6:.1f} us")
+    print(f"{len(data)} bytes, pickle of the engine {len(pickle.dumps(engine))} bytes")
+
+
+if __name__ == "__main__":
+    main()
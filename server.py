@@ -0,0 +1,208 @@
+# Multiplayer game server
+#
+# One asyncio process hosts any number of games, each with its own
+# GameEngine (board, hands and turn state). Clients connect over TCP, join a
+# game by id and get a seat. The server checks every move against the
+# engine's legal masks before applying it, the client's word is never taken
+# for anything.
+#
+# After the full state once on joining (serialize.encode), a client only
+# gets deltas: the events the move produced (eventlog's format: the road,
+# the roll and payouts when a turn ends, ...). A client keeps a replica
+# engine with auto_roll off and plays them onto it (eventlog.apply_events),
+# which is a few bytes per move instead of a board.
+#
+#   python server.py --port 8765
+#   python loadtest.py --games 1000      simulated clients against a local server
+#
+# Wire format: every message is a frame, FRAME (payload size including the
+# type byte, type) then the payload.
+#
+#   client -> server
+#     MSG_JOIN     JOIN: game id, seats (used when the game is created)
+#     MSG_MOVE     MOVE: client sequence number, move kind (MOVE_KINDS), node/edge
+#   server -> client
+#     MSG_WELCOME  WELCOME: game id, seat (SEAT_FULL when there was none), then
+#                  the encoded state
+#     MSG_START    every seat is taken, moves are accepted from now on
+#     MSG_DELTA    events, sent to every seat after each accepted move
+#     MSG_ACK      ACK: sequence number, whether the move was accepted. The
+#                  delta of an accepted move is always sent before its ack
+import argparse
+import asyncio
+import random
+import struct
+
+import serialize
+from backend import (GameEngine, MAX_SEATS, PHASE_OVER, MOVE_SETTLEMENT, MOVE_ROAD, MOVE_CITY,
+                     MOVE_END_TURN)
+from eventlog import EventLog
+from player import Player
+
+FRAME   = struct.Struct("<IB")
+JOIN    = struct.Struct("<IB")
+MOVE    = struct.Struct("<IBH")
+WELCOME = struct.Struct("<IB")
+ACK     = struct.Struct("<IB")
+
+MSG_JOIN, MSG_MOVE = 1, 2
+MSG_WELCOME, MSG_START, MSG_DELTA, MSG_ACK = 16, 17, 18, 19
+
+MOVE_KINDS = (MOVE_SETTLEMENT, MOVE_ROAD, MOVE_CITY, MOVE_END_TURN)
+SEAT_FULL = 0xff
+# a client with this much still unsent is dropped rather than buffered for
+# without limit (broadcasts can't wait on one slow seat)
+MAX_BACKLOG = 1 << 20
+
+
+def frame(kind, payload=b""):
+    return FRAME.pack(len(payload) + 1, kind) + payload
+
+
+async def read_frame(reader):
+    # (type, payload), raises asyncio.IncompleteReadError when the peer is gone
+    size, kind = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return kind, await reader.readexactly(size - 1)
+
+
+def encode_move(seq, move):
+    return MOVE.pack(seq, MOVE_KINDS.index(move[0]), move[1] if len(move) > 1 else 0)
+
+
+def decode_move(payload):
+    seq, kind, index = MOVE.unpack(payload)
+    move = (MOVE_KINDS[kind],) if MOVE_KINDS[kind] == MOVE_END_TURN else (MOVE_KINDS[kind], index)
+    return seq, move
+
+
+class HostedGame:
+    """One game on the server: the engine and the connection of each seat."""
+
+    def __init__(self, game_id, seats, seed=None):
+        self.game_id = game_id
+        self.log = EventLog(snapshot_every=0) # only streamed, no need for snapshots
+        self.engine = GameEngine([Player(None, f"Seat {i + 1}") for i in range(seats)],
+                                 seed=seed, log=self.log)
+        self.log.pending() # the opening snapshot, joiners get the state itself
+        self.clients = [None] * seats
+        self.started = False
+
+    def join(self, writer):
+        # seat for a new connection, None when the game is full
+        for seat, client in enumerate(self.clients):
+            if client is None:
+                self.clients[seat] = writer
+                return seat
+        return None
+
+    def leave(self, seat):
+        self.clients[seat] = None
+
+    @property
+    def full(self):
+        return all(client is not None for client in self.clients)
+
+    @property
+    def empty(self):
+        return all(client is None for client in self.clients)
+
+    def is_legal(self, seat, move):
+        # the same checks legal_moves() makes, without building the list
+        engine = self.engine
+        if not self.started or engine.phase == PHASE_OVER or seat != engine.current:
+            return False
+        kind = move[0]
+        if kind == MOVE_END_TURN:
+            return engine.setup_expects() is None
+        mask = {MOVE_SETTLEMENT: engine.legal_settlement_mask,
+                MOVE_ROAD: engine.legal_road_mask,
+                MOVE_CITY: engine.legal_city_mask}[kind](seat)
+        return bool(mask >> move[1] & 1)
+
+    def play(self, seat, move):
+        # apply a client's move, returns the delta to send or None if illegal
+        if not self.is_legal(seat, move) or not self.engine.apply(move):
+            return None
+        return self.log.pending()
+
+    def broadcast(self, message):
+        for writer in self.clients:
+            if writer is not None and not writer.is_closing():
+                writer.write(message)
+                if writer.transport.get_write_buffer_size() > MAX_BACKLOG:
+                    writer.close() # its handler sees the connection go and frees the seat
+
+
+class GameServer:
+    def __init__(self, seed=None):
+        self.games = {}
+        self.rng = random.Random(seed)
+        self.connections = 0
+        self.moves = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        game = seat = None
+        try:
+            kind, payload = await read_frame(reader)
+            if kind != MSG_JOIN:
+                return
+            game_id, seats = JOIN.unpack(payload)
+            game = self.games.get(game_id)
+            if game is None and not 1 <= seats <= MAX_SEATS:
+                return
+            if game is None:
+                game = self.games[game_id] = HostedGame(game_id, seats, self.rng.getrandbits(63))
+            seat = game.join(writer)
+            writer.write(frame(MSG_WELCOME, WELCOME.pack(game_id, SEAT_FULL if seat is None else seat)
+                               + serialize.encode(game.engine)))
+            if seat is None:
+                return
+            if game.full and not game.started:
+                game.started = True
+                game.broadcast(frame(MSG_START))
+            await writer.drain()
+
+            while True:
+                kind, payload = await read_frame(reader)
+                if kind != MSG_MOVE:
+                    continue
+                seq, move = decode_move(payload)
+                delta = game.play(seat, move)
+                if delta is not None:
+                    self.moves += 1
+                    game.broadcast(frame(MSG_DELTA, delta))
+                writer.write(frame(MSG_ACK, ACK.pack(seq, delta is not None)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, struct.error, IndexError):
+            pass # gone, or sent something that isn't the protocol
+        finally:
+            self.connections -= 1
+            if seat is not None:
+                game.leave(seat)
+                if game.empty:
+                    del self.games[game.game_id]
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, ready=None):
+        server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catan game server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    try:
+        asyncio.run(GameServer(args.seed).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
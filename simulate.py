@@ -0,0 +1,149 @@
+# Batched headless self-play
+# usage: python simulate.py --games 1000 --workers 8 --seed 42
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from collections import namedtuple
+
+from backend import GameEngine, PHASE_OVER
+from player import Player
+from bots import RandomBot, GreedyBot, TraderBot, MCTSBot
+from main import setup
+
+# one finished game. vp is the VP trajectory, one byte per seat per turn:
+# vp[turn * seats + seat]. winner is None when the game hit max_turns.
+# events is the game's eventlog block when games are logged
+GameRecord = namedtuple("GameRecord", "game seed winner turns vp events", defaults=(None,))
+
+SEAT_COLORS = [(231, 76, 60), (39, 174, 96), (219, 118, 51), (142, 68, 173)]
+
+
+def game_seed(master_seed, game):
+    # every game's seed depends only on the master seed and the game number,
+    # so results don't change with the number of workers or the scheduling
+    return random.Random(f"{master_seed}:{game}").getrandbits(63)
+
+
+# ---------------------------------------------------------------------------
+# worker side: one engine (and so one board) per process, reused every game
+# ---------------------------------------------------------------------------
+_worker = None
+
+def _init_worker(policies, master_seed, max_turns, vp_to_win, balanced=False, logged=False):
+    global _worker
+    players = [Player(SEAT_COLORS[i % len(SEAT_COLORS)], f"Bot {i + 1}") for i in range(len(policies))]
+    balancer = None
+    if balanced:
+        from balance import BoardBalancer # needs numpy, only load it when asked
+        balancer = BoardBalancer()
+    engine = GameEngine(players, vp_to_win=vp_to_win, balancer=balancer)
+    if logged:
+        from eventlog import EventLog
+        engine.log = EventLog() # in memory, blocks go back with the records
+    _worker = (engine, policies, master_seed, max_turns)
+
+
+def _play_game(game):
+    engine, policies, master_seed, max_turns = _worker
+    seed = game_seed(master_seed, game)
+    engine.reset(seed)
+    for i, policy in enumerate(policies):
+        policy.reset(seed + i)
+    # every seat drafts its starting spots with the setup evaluator
+    setup(engine)
+
+    vp = bytearray()
+    last_turn = 0
+    while engine.phase != PHASE_OVER and engine.turn < max_turns:
+        policy = policies[engine.current]
+        engine.apply(policy.choose_move(engine, engine.legal_moves()))
+        if engine.turn != last_turn:
+            last_turn = engine.turn
+            vp.extend(p.victory_points for p in engine.players)
+    # final standings close the trajectory
+    vp.extend(p.victory_points for p in engine.players)
+    events = None
+    if engine.log is not None:
+        engine.log.end_game(engine)
+        events = engine.log.last_block
+    return GameRecord(game, seed, engine.winner, engine.turn, bytes(vp), events)
+
+
+# ---------------------------------------------------------------------------
+# entry point
+# ---------------------------------------------------------------------------
+def simulate(n_games, policies, seed=0, workers=None, max_turns=500, vp_to_win=10, chunksize=None,
+             balanced=False, logged=False):
+    """
+    Play n_games of self-play between policies (one per seat) and yield a
+    GameRecord per game, in game order, as soon as it is available.
+
+    Games are spread over a pool of `workers` processes (default: every
+    core); workers=1 plays them in this process. The same seed always gives
+    the same records, whatever the worker count. balanced=True deals every
+    board with balance.BoardBalancer instead of a plain shuffle.
+    logged=True records every game and returns its eventlog block in
+    GameRecord.events.
+    """
+    initargs = (list(policies), seed, max_turns, vp_to_win, balanced, logged)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(*initargs)
+        for game in range(n_games):
+            yield _play_game(game)
+        return
+
+    # large chunks keep the inter-process traffic small next to the games
+    chunksize = chunksize or max(1, min(64, n_games // (workers * 8)))
+    with multiprocessing.Pool(workers, _init_worker, initargs) as pool:
+        yield from pool.imap(_play_game, range(n_games), chunksize)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Catan self-play")
+    parser.add_argument("--games",     type=int, default=1000)
+    parser.add_argument("--workers",   type=int, default=None)
+    parser.add_argument("--seed",      type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=500)
+    parser.add_argument("--bots",      default="greedy,greedy,random,random",
+                        help="comma separated seat list of random/greedy/trader/mcts")
+    parser.add_argument("--mcts-iterations", type=int, default=200)
+    parser.add_argument("--balanced",  action="store_true",
+                        help="deal balanced boards (see balance.py)")
+    parser.add_argument("--log",       default=None,
+                        help="append every game's events to this log file (see eventlog.py)")
+    args = parser.parse_args()
+
+    kinds    = {"random": RandomBot, "greedy": GreedyBot, "trader": TraderBot,
+                "mcts": lambda: MCTSBot(iterations=args.mcts_iterations)}
+    policies = [kinds[name]() for name in args.bots.split(",")]
+
+    log = None
+    if args.log:
+        from eventlog import EventLog
+        log = EventLog(args.log)
+
+    wins  = [0] * len(policies)
+    turns = 0
+    start = time.perf_counter()
+    for record in simulate(args.games, policies, args.seed, args.workers, args.max_turns,
+                           balanced=args.balanced, logged=log is not None):
+        turns += record.turns
+        if log is not None:
+            log.write_block(record.events)
+        if record.winner is not None:
+            wins[record.winner] += 1
+    elapsed = time.perf_counter() - start
+    if log is not None:
+        log.close()
+
+    print(f"{args.games} games, {turns} turns in {elapsed:.2f}s "
+          f"({args.games / elapsed:.1f} games/s, {turns / elapsed:.0f} turns/s)")
+    for seat, name in enumerate(args.bots.split(",")):
+        print(f"  seat {seat + 1} ({name}): {wins[seat]} wins")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Random games for the tests to check positions of
+import copy
+
+from backend import GameEngine, PHASE_MAIN, PHASE_OVER, load_map
+from bots import RandomBot
+from player import Player, ResourceVector, CARDS
+
+# (map name, None for the standard board; seats)
+BOARDS = [(None, 4), (None, 3), ("islands", 4), ("extension_5_6", 6)]
+BOARD_IDS = [f"{name or 'standard'}-{seats}" for name, seats in BOARDS]
+
+ONE_OF_EACH = ResourceVector({card: 1 for card in CARDS})
+
+
+def new_game(name=None, seats=4, seed=0, log=None):
+    players = [Player(None, f"Player {seat + 1}") for seat in range(seats)]
+    return GameEngine(players, seed=seed, board_map=load_map(name) if name else None, log=log)
+
+
+def positions(engine, seed=0, max_turns=100, handout=True):
+    """
+    Play random moves (building whenever it can) from the setup draft on,
+    yielding the engine before every move, and then once more at the end.
+    With handout each seat also gets one card of every resource at the start
+    of its turns, so the board fills up long before max_turns. That is
+    outside the rules, leave it off for games that go through the event log.
+    """
+    bot = RandomBot(seed=seed, build_chance=0.99)
+    turn = None
+    while engine.phase != PHASE_OVER and engine.turn < max_turns:
+        if handout and engine.phase == PHASE_MAIN and engine.turn != turn:
+            engine.current_player.resource_cards += ONE_OF_EACH
+            turn = engine.turn
+        yield engine
+        engine.apply(bot.choose_move(engine, engine.legal_moves()))
+    yield engine
+
+
+def game_state(engine):
+    """
+    Everything per game on the engine, its board and players, copied out of
+    their attributes so it can be compared with a later state. The board
+    layout, the log, the dice generator and the players' names are left out.
+    """
+    board = {k: v for k, v in vars(engine.board).items()
+             if k not in ("topology", "board_map", "balancer", "_views")}
+    # the production index and road parts are sets kept as tuples, in an
+    # order that depends on what was built when
+    for key in ("production", "payouts", "gains", "seat_road_parts"):
+        board[key] = [sorted(entries) for entries in board[key]]
+    players = [{k: v for k, v in vars(p).items() if k not in ("color", "name", "seat")}
+               for p in engine.players]
+    turn = {k: v for k, v in vars(engine).items() if k not in ("board", "players", "log", "rng")}
+    return copy.deepcopy((board, players, turn))
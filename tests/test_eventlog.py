@@ -0,0 +1,57 @@
+# Games played back from the event log come out as they were played
+import pytest
+
+import serialize
+from backend import PHASE_OVER
+from eventlog import EventLog, LogReader, replay, apply_events
+from games import BOARDS, BOARD_IDS, new_game, positions
+
+GAMES = 3
+
+
+def play(engine, seed):
+    # {turn: encoded state before that turn ended}, the final state
+    states = {}
+    for engine in positions(engine, seed, max_turns=120, handout=False):
+        states[engine.turn] = serialize.encode(engine)
+    final = serialize.encode(engine)
+    if engine.phase == PHASE_OVER:
+        del states[engine.turn] # the game ended in the middle of it
+    return states, final
+
+
+@pytest.mark.parametrize("board", BOARDS, ids=BOARD_IDS)
+@pytest.mark.parametrize("given", ["constructor", "attached"])
+def test_replay_matches_every_turn(tmp_path, board, given):
+    name, seats = board
+    path = tmp_path / "games.log"
+    played = []
+    with EventLog(str(path), snapshot_every=7) as log:
+        engine = new_game(name, seats, log=log if given == "constructor" else None)
+        engine.log = log
+        for game in range(GAMES):
+            # reset() closes a game left unfinished before dealing the next
+            engine.reset(game)
+            played.append((play(engine, game), engine.turn, engine.winner))
+        log.end_game(engine)
+
+    with LogReader(str(path)) as reader:
+        games = list(reader)
+        assert len(games) == GAMES
+        for logged, ((states, final), turns, winner) in zip(games, played):
+            assert (logged.seats, logged.turns, logged.winner) == (seats, turns, winner)
+            for turn, state in states.items():
+                assert serialize.encode(replay(logged, turn)) == state, turn
+            assert serialize.encode(replay(logged)) == final
+
+
+def test_pending_streams_the_game():
+    # what the server sends as the game goes, played onto a copy of the start
+    log = EventLog()
+    engine = new_game(seed=1, log=log)
+    remote = serialize.decode(serialize.encode(engine))
+    remote.auto_roll = False
+    log.pending() # the opening snapshot, the copy has it already
+    for step, engine in enumerate(positions(engine, 1, max_turns=60, handout=False)):
+        apply_events(remote, log.pending())
+        assert serialize.encode(remote) == serialize.encode(engine), step
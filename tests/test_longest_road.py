@@ -0,0 +1,53 @@
+# The incrementally kept longest road against a search of every trail
+import pytest
+
+from backend import NO_PLAYER, LONGEST_ROAD_MIN, LONGEST_ROAD_VP
+from games import BOARDS, BOARD_IDS, new_game, positions
+
+
+def longest_trail(board, seat):
+    # longest run of distinct roads, which can't go on through a node
+    # someone else has built on
+    topo = board.topology
+    best = 0
+
+    def walk(n, used):
+        nonlocal best
+        best = max(best, len(used))
+        if used and board.node_owner[n] not in (NO_PLAYER, seat):
+            return
+        for e in topo.edges_of_node(n):
+            if board.edge_owner[e] == seat and e not in used:
+                a, b = topo.nodes_of_edge(e)
+                walk(b if a == n else a, used | {e})
+
+    for e in range(topo.num_edges):
+        if board.edge_owner[e] == seat:
+            for n in topo.nodes_of_edge(e):
+                walk(n, frozenset())
+    return best
+
+
+@pytest.mark.parametrize("board", BOARDS, ids=BOARD_IDS)
+@pytest.mark.parametrize("seed", range(3))
+def test_longest_road_matches_search(board, seed):
+    name, seats = board
+    awarded = False
+    for engine in positions(new_game(name, seats, seed), seed):
+        lengths = [longest_trail(engine.board, seat) for seat in range(seats)]
+        assert engine.board.seat_longest[:seats] == lengths, engine.turn
+
+        # the card goes to the only longest road of at least the minimum, and
+        # stays with its holder through ties
+        best = max(lengths)
+        holder = engine.longest_road
+        if holder is None:
+            assert best < LONGEST_ROAD_MIN or lengths.count(best) > 1
+        else:
+            assert lengths[holder] == best >= LONGEST_ROAD_MIN
+            awarded = True
+
+        for seat, p in enumerate(engine.players):
+            built = (5 - p.total_settlements) + 2 * (4 - p.total_cities)
+            assert p.victory_points == built + LONGEST_ROAD_VP * (holder == seat)
+    assert awarded # the card changed hands at least once
@@ -0,0 +1,91 @@
+# legal_moves() and the per-seat legal masks against a brute force walk of
+# the board graph
+import pytest
+
+from backend import (PHASE_SETUP, PHASE_MAIN, PHASE_OVER, NO_PLAYER, MOVE_SETTLEMENT, MOVE_CITY,
+                     MOVE_ROAD, MOVE_END_TURN)
+from player import ROAD_COST, SETTLEMENT_COST, CITY_COST
+from games import BOARDS, BOARD_IDS, new_game, positions
+
+
+def clear(board, n):
+    # free node with no building next to it
+    topo = board.topology
+    return all(board.node_owner[m] == NO_PLAYER
+               for e in topo.edges_of_node(n) for m in topo.nodes_of_edge(e))
+
+
+def connected_node(board, seat, n):
+    # a settlement on n would be on one of seat's roads
+    return any(board.edge_owner[e] == seat for e in board.topology.edges_of_node(n))
+
+
+def connected_edge(board, seat, e):
+    # a road on e would touch seat's building, or seat's road at a node no
+    # one else has built on
+    topo = board.topology
+    for n in topo.nodes_of_edge(e):
+        if board.node_owner[n] == seat:
+            return True
+        if board.node_owner[n] == NO_PLAYER and any(board.edge_owner[f] == seat
+                                                    for f in topo.edges_of_node(n) if f != e):
+            return True
+    return False
+
+
+def reference(engine, seat):
+    # (settlements, cities, roads) seat could build right now
+    board, topo, p = engine.board, engine.board.topology, engine.players[seat]
+    nodes, edges = range(topo.num_nodes), range(topo.num_edges)
+    if engine.phase == PHASE_SETUP:
+        if seat != engine.current:
+            return [], [], []
+        if engine.setup_node is None:
+            return [n for n in nodes if clear(board, n)], [], []
+        return [], [], [e for e in topo.edges_of_node(engine.setup_node) if board.edge_owner[e] == NO_PLAYER]
+    if engine.phase != PHASE_MAIN:
+        return [], [], []
+    settlements = cities = roads = []
+    if p.total_settlements and p.can_afford(SETTLEMENT_COST):
+        settlements = [n for n in nodes if clear(board, n) and connected_node(board, seat, n)]
+    if p.total_cities and p.can_afford(CITY_COST):
+        cities = [n for n in nodes if board.node_owner[n] == seat and board.node_building[n] == 1]
+    if p.total_roads and p.can_afford(ROAD_COST):
+        roads = [e for e in edges if board.edge_owner[e] == NO_PLAYER and connected_edge(board, seat, e)]
+    return settlements, cities, roads
+
+
+@pytest.mark.parametrize("board", BOARDS, ids=BOARD_IDS)
+@pytest.mark.parametrize("seed", range(3))
+def test_legal_moves_match_brute_force(board, seed):
+    name, seats = board
+    checked = 0
+    for engine in positions(new_game(name, seats, seed), seed):
+        for seat in range(seats):
+            expected = reference(engine, seat)
+            assert (engine.legal_settlements(seat), engine.legal_cities(seat), engine.legal_roads(seat)) \
+                == expected, (engine.phase, engine.turn, seat)
+        settlements, cities, roads = reference(engine, engine.current)
+        expected = ([(MOVE_SETTLEMENT, n) for n in settlements] + [(MOVE_CITY, n) for n in cities]
+                    + [(MOVE_ROAD, e) for e in roads])
+        if engine.phase == PHASE_MAIN:
+            expected.append((MOVE_END_TURN,))
+        assert engine.legal_moves() == expected
+        checked += engine.phase == PHASE_MAIN
+    assert checked # the game got past the setup draft
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_illegal_moves_are_refused(seed):
+    for engine in positions(new_game(seed=seed), seed, max_turns=40):
+        if engine.phase == PHASE_OVER:
+            break
+        topo = engine.board.topology
+        legal = set(engine.legal_moves())
+        before = engine.snapshot(with_rng=True)
+        for move in [(MOVE_SETTLEMENT, n) for n in range(topo.num_nodes)] \
+                + [(MOVE_CITY, n) for n in range(topo.num_nodes)] \
+                + [(MOVE_ROAD, e) for e in range(topo.num_edges)]:
+            if move not in legal:
+                assert engine.apply(move) is False, move
+        assert engine.snapshot(with_rng=True) == before
@@ -0,0 +1,56 @@
+# serialize.decode(serialize.encode(engine)) gives the same game back
+import pytest
+
+import serialize
+from backend import GameEngine
+from player import Player
+from games import BOARDS, BOARD_IDS, new_game, positions, game_state
+
+
+@pytest.mark.parametrize("board", BOARDS + [("stress_2k", 4)], ids=BOARD_IDS + ["stress_2k-4"])
+@pytest.mark.parametrize("seed", range(3))
+def test_round_trip(board, seed):
+    name, seats = board
+    max_turns = 10 if name == "stress_2k" else 100 # that one is slow to play
+    for step, engine in enumerate(positions(new_game(name, seats, seed), seed, max_turns)):
+        if step % 3:
+            continue
+        if step % 9 == 0:
+            engine.current_player.development_cards.append("KNIGHT") # moves the next seat's section
+        data = serialize.encode(engine)
+        decoded = serialize.decode(data)
+        assert decoded.board.topology.tile_ids == engine.board.topology.tile_ids
+        assert game_state(decoded) == game_state(engine), step
+        assert decoded.legal_moves() == engine.legal_moves()
+        assert serialize.encode(decoded) == data
+
+        # decoding into an engine in place, from a memoryview
+        other = new_game(name, seats, seed + 100)
+        serialize.decode(memoryview(bytearray(data)), other)
+        assert game_state(other) == game_state(engine), step
+
+
+def test_state_view_reads_fields():
+    for engine in positions(new_game("islands", 4, 1), 1):
+        data = serialize.encode(engine)
+        view = serialize.StateView(data)
+        board, topo = engine.board, engine.board.topology
+        assert view.size == len(data)
+        assert (view.turn, view.current, view.phase, view.setup_node) == \
+            (engine.turn, engine.current, engine.phase, engine.setup_node)
+        assert [view.tile(t) for t in range(topo.num_tiles)] == \
+            list(zip(board.tile_resource, board.tile_number))
+        assert [view.node(n) for n in range(topo.num_nodes)] == \
+            list(zip(board.node_owner, board.node_building))
+        assert [view.edge(e) for e in range(topo.num_edges)] == list(board.edge_owner)
+
+
+def test_rejects_bad_data():
+    data = serialize.encode(new_game(seed=0))
+    wrong_version = bytearray(data)
+    wrong_version[2] = serialize.VERSION + 1
+    for bad in (b"", b"XX" + bytes(40), data[:-3], bytes(wrong_version)):
+        with pytest.raises(ValueError):
+            serialize.decode(bad)
+    with pytest.raises(ValueError):
+        serialize.decode(data, GameEngine([Player(None) for _ in range(3)]))
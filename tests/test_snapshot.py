@@ -0,0 +1,50 @@
+# GameEngine.snapshot() / restore() put back every bit of the game
+import random
+
+import pytest
+
+from backend import PHASE_OVER
+from bots import RandomBot
+from games import BOARDS, BOARD_IDS, new_game, positions, game_state
+
+
+def play(engine, moves, seed):
+    # up to `moves` random moves, the game_state() after each of them
+    bot = RandomBot(seed=seed, build_chance=0.99)
+    trail = []
+    for _ in range(moves):
+        if engine.phase == PHASE_OVER:
+            break
+        engine.apply(bot.choose_move(engine, engine.legal_moves()))
+        trail.append(game_state(engine))
+    return trail
+
+
+@pytest.mark.parametrize("board", BOARDS, ids=BOARD_IDS)
+@pytest.mark.parametrize("seed", range(2))
+def test_restore_undoes_moves(board, seed):
+    name, seats = board
+    rng = random.Random(seed)
+    for step, engine in enumerate(positions(new_game(name, seats, seed), seed)):
+        if step % 5:
+            continue
+        before = game_state(engine)
+        moves = engine.legal_moves()
+        snap = engine.snapshot()
+        for attempt in range(2): # the same snapshot can be restored again
+            play(engine, rng.randrange(1, 30), rng.getrandbits(32))
+            engine.restore(snap)
+            assert game_state(engine) == before, (step, attempt)
+            assert engine.legal_moves() == moves
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_restore_with_rng_replays_the_same_dice(seed):
+    for step, engine in enumerate(positions(new_game(seed=seed), seed)):
+        if step % 10 or engine.phase == PHASE_OVER:
+            continue
+        snap = engine.snapshot(with_rng=True)
+        first = play(engine, 40, seed)
+        engine.restore(snap)
+        assert play(engine, 40, seed) == first, step
+        engine.restore(snap)